@@ -0,0 +1,19 @@
+"""
+Celery application for background jobs (document ingestion, etc.).
+
+Workers are started with:
+    celery -A app worker -l info
+"""
+import os
+
+from celery import Celery
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.settings")
+
+celery_app = Celery("niva_app")
+
+# Read all CELERY_* settings from Django settings
+celery_app.config_from_object("django.conf:settings", namespace="CELERY")
+
+# Discover tasks.py modules in installed apps
+celery_app.autodiscover_tasks()
@@ -51,6 +51,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "corsheaders",
     "rest_framework",
     "rest_framework.authtoken",
@@ -206,10 +207,128 @@ CACHES = {
             "CONNECTION_POOL_KWARGS": {"max_connections": 100, "retry_on_timeout": True},
             "COMPRESSOR": "django_redis.compressors.zlib.ZlibCompressor",
         },
-    }
+    },
+    # Buffered ingestion uploads (niva_app.services.upload_buffer). Kept out of
+    # the default cache so multi-MB PDFs don't evict cached contexts and
+    # embeddings; point INGESTION_BUFFER_REDIS_URL at a separate instance to
+    # also isolate memory limits and eviction.
+    "ingestion_buffer": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": get_env_var(
+            "INGESTION_BUFFER_REDIS_URL", f"redis://{REDIS_HOST}:{REDIS_PORT}/{get_env_var('INGESTION_BUFFER_REDIS_DB', '2')}"
+        ),
+        "TIMEOUT": 3600,
+        "OPTIONS": {
+            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            "PARSER_CLASS": "redis.connection.HiredisParser",
+            "CONNECTION_POOL_KWARGS": {"max_connections": 20, "retry_on_timeout": True},
+        },
+    },
+}
+
+
+# Celery (background jobs)
+CELERY_REDIS_DB = get_env_var("CELERY_REDIS_DB", "0")
+CELERY_BROKER_URL = get_env_var("CELERY_BROKER_URL", f"redis://{REDIS_HOST}:{REDIS_PORT}/{CELERY_REDIS_DB}")
+CELERY_TASK_SERIALIZER = "json"
+CELERY_ACCEPT_CONTENT = ["json"]
+CELERY_TASK_ACKS_LATE = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_TASK_ROUTES = {
+    "niva_app.tasks.ingest_document": {"queue": "ingestion"},
 }
 
 
+# Embeddings
+# "gemini", or "fake" for the deterministic offline embedder (benchmarks, local runs)
+EMBEDDING_BACKEND = get_env_var("EMBEDDING_BACKEND", "gemini")
+EMBEDDING_BATCH_SIZE = int(get_env_var("EMBEDDING_BATCH_SIZE", "50"))
+EMBEDDING_MAX_CONCURRENCY = int(get_env_var("EMBEDDING_MAX_CONCURRENCY", "4"))
+EMBEDDING_MAX_RETRIES = int(get_env_var("EMBEDDING_MAX_RETRIES", "5"))
+# Chunks held in memory at once while streaming a document into the index
+EMBEDDING_STREAM_WINDOW = int(get_env_var("EMBEDDING_STREAM_WINDOW", "400"))
+# How long query embeddings stay in the Redis query cache (seconds)
+QUERY_EMBEDDING_CACHE_TTL = int(get_env_var("QUERY_EMBEDDING_CACHE_TTL", str(24 * 3600)))
+# Query embeddings are on the request path: retries on transient errors and
+# HTTP timeout per request (ingestion keeps EMBEDDING_MAX_RETRIES)
+QUERY_EMBEDDING_MAX_RETRIES = int(get_env_var("QUERY_EMBEDDING_MAX_RETRIES", "1"))
+QUERY_EMBEDDING_TIMEOUT_MS = int(get_env_var("QUERY_EMBEDDING_TIMEOUT_MS", "5000"))
+# HNSW candidate list size for vector search (pgvector default is 40)
+HNSW_EF_SEARCH = int(get_env_var("HNSW_EF_SEARCH", "100"))
+# Keep scanning the HNSW index until filtered searches (one course or memory)
+# find enough rows: "relaxed_order", "strict_order" or "" to disable. Only
+# applied with pgvector 0.8+
+HNSW_ITERATIVE_SCAN = get_env_var("HNSW_ITERATIVE_SCAN", "relaxed_order")
+# Cached agent system instructions: entry lifetime, how long the build lock is
+# held at most and how long other workers wait for it when no previous version exists
+AGENT_CONTEXT_CACHE_TTL = int(get_env_var("AGENT_CONTEXT_CACHE_TTL", str(24 * 3600)))
+AGENT_CONTEXT_LOCK_TIMEOUT = int(get_env_var("AGENT_CONTEXT_LOCK_TIMEOUT", "60"))
+AGENT_CONTEXT_LOCK_WAIT = float(get_env_var("AGENT_CONTEXT_LOCK_WAIT", "15"))
+# Seconds a precomputed course context refresh waits after the first change,
+# so the changes of one upload are extracted once
+COURSE_CONTEXT_REFRESH_DELAY = int(get_env_var("COURSE_CONTEXT_REFRESH_DELAY", "30"))
+# Gemini generation calls (niva_app.lib.llm_gateway): seconds per attempt,
+# retries on transient errors and concurrent requests per model, with per-model
+# overrides as "model=limit,model=limit"
+LLM_TIMEOUT_SECONDS = float(get_env_var("LLM_TIMEOUT_SECONDS", "60"))
+LLM_MAX_RETRIES = int(get_env_var("LLM_MAX_RETRIES", "3"))
+LLM_MAX_CONCURRENCY = int(get_env_var("LLM_MAX_CONCURRENCY", "8"))
+LLM_MODEL_CONCURRENCY = get_env_var("LLM_MODEL_CONCURRENCY", "")
+# Course-material lookups during live calls: results per lookup and the total
+# latency budget (query embedding + vector search)
+RETRIEVAL_TOP_K = int(get_env_var("RETRIEVAL_TOP_K", "5"))
+RETRIEVAL_TIMEOUT_MS = int(get_env_var("RETRIEVAL_TIMEOUT_MS", "1500"))
+# Tokens of course material returned to the interview LLM per lookup_course_material call
+LOOKUP_TOOL_TOKEN_BUDGET = int(get_env_var("LOOKUP_TOOL_TOKEN_BUDGET", "600"))
+# Course context extraction: chunks most similar to the extraction query that
+# are considered, and the tokens of them packed into the analysis prompt
+CONTEXT_PACK_CANDIDATES = int(get_env_var("CONTEXT_PACK_CANDIDATES", "50"))
+CONTEXT_PACK_TOKEN_BUDGET = int(get_env_var("CONTEXT_PACK_TOKEN_BUDGET", "2000"))
+# Hybrid (full-text + vector) retrieval: candidates fetched from each retriever
+# before reciprocal-rank fusion, and the fusion constant
+HYBRID_CANDIDATES = int(get_env_var("HYBRID_CANDIDATES", "20"))
+HYBRID_RRF_K = int(get_env_var("HYBRID_RRF_K", "60"))
+# Diversification of retrieved chunks (Maximal Marginal Relevance): relevance vs
+# diversity trade-off, candidates considered by the in-process course index and
+# the embedding / word-shingle similarity above which a chunk is a near-duplicate
+MMR_LAMBDA = float(get_env_var("MMR_LAMBDA", "0.7"))
+MMR_CANDIDATES = int(get_env_var("MMR_CANDIDATES", "20"))
+DEDUP_EMBEDDING_THRESHOLD = float(get_env_var("DEDUP_EMBEDDING_THRESHOLD", "0.95"))
+DEDUP_TEXT_THRESHOLD = float(get_env_var("DEDUP_TEXT_THRESHOLD", "0.8"))
+# In-process per-course embedding index for live-call lookups (float16 matrix
+# memory-mapped from COURSE_INDEX_DIR), used instead of hybrid Postgres search
+# when enabled
+COURSE_INDEX_ENABLED = get_env_var("COURSE_INDEX_ENABLED", "False").lower() == "true"
+COURSE_INDEX_DIR = get_env_var("COURSE_INDEX_DIR", os.path.join(BASE_DIR, "storage", "course_index"))
+COURSE_INDEX_DIMENSIONS = int(get_env_var("COURSE_INDEX_DIMENSIONS", "1536"))
+# How often a worker checks whether its loaded course indexes went stale
+COURSE_INDEX_REFRESH_SECONDS = float(get_env_var("COURSE_INDEX_REFRESH_SECONDS", "5"))
+# How document embeddings are stored and searched: "full" (float32, searched
+# through the 1536-dim reduced index), "halfvec" (float16) or "binary" (1 bit per
+# dimension, rescored against halfvec / full precision). Run
+# `manage.py backfill_reduced_embeddings --mode <mode>` before switching modes
+EMBEDDING_STORAGE_MODE = get_env_var("EMBEDDING_STORAGE_MODE", "full")
+# Keep the float32 embedding alongside the quantized one (used for rescoring)
+EMBEDDING_KEEP_FULL_PRECISION = get_env_var("EMBEDDING_KEEP_FULL_PRECISION", "True").lower() == "true"
+# Rescore this many candidates per requested result with the original vectors
+# (0 disables rescoring)
+EMBEDDING_RESCORE_FACTOR = int(get_env_var("EMBEDDING_RESCORE_FACTOR", "4"))
+
+# Chunking (token counts estimated by niva_app.lib.tokens)
+CHUNK_TOKENS = int(get_env_var("CHUNK_TOKENS", "384"))
+CHUNK_OVERLAP_TOKENS = int(get_env_var("CHUNK_OVERLAP_TOKENS", "48"))
+
+# PDF extraction
+PDF_PROCESS_POOL_MIN_PAGES = int(get_env_var("PDF_PROCESS_POOL_MIN_PAGES", "200"))
+PDF_EXTRACTION_WORKERS = int(get_env_var("PDF_EXTRACTION_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_PAGES_PER_TASK = int(get_env_var("PDF_PAGES_PER_TASK", "25"))
+
+# Uploads up to this size are handed to the ingestion worker through Redis and
+# extracted from memory while the S3 upload runs; larger ones go through S3
+INGESTION_BUFFER_MAX_BYTES = int(get_env_var("INGESTION_BUFFER_MAX_BYTES", str(25 * 1024 * 1024)))
+INGESTION_BUFFER_TTL = int(get_env_var("INGESTION_BUFFER_TTL", "3600"))
+
+
 # importing local settings
 try:
     from .settings_dev import *
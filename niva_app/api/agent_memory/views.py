@@ -5,11 +5,12 @@ from django.db.models.functions import Length
 from rest_framework import serializers, status
 from rest_framework.response import Response
 from rest_framework.pagination import LimitOffsetPagination
-from rest_framework.status import HTTP_200_OK
+from rest_framework.status import HTTP_200_OK, HTTP_202_ACCEPTED
 from rest_framework.parsers import MultiPartParser, FormParser
 
-from niva_app.models import Memory, Course, Agent, Document
+from niva_app.models import Memory, Course, Agent, Document, IngestionJob, IngestionOperation, IngestionStatus
 from niva_app.services.agent_memory import MemoryService
+from niva_app.services.embedding_cache import EmbeddingCache, QueryEmbeddingCache
 from niva_app.api.common.views import BaseAPI
 import threading
 import logging
@@ -51,22 +52,17 @@ class AddMemory(BaseAPI):
                 )
             
             try:
-                # Upload file to S3
-                s3_key = memory_service.upload_file(file, data["name"])
-                
-                # Add memory with S3 key
-                memory_service.add_memory(
-                    memory_type=data["type"],
-                    url=s3_key,
-                    name=data["name"] 
-                )
+                # Queue background processing (small PDFs are uploaded to S3 by the worker)
+                job = memory_service.start_document_ingestion(file, data["name"])
                 
                 return Response(
                     {
-                        "message": "Document uploaded and processed successfully",
-                        "s3_key": s3_key
+                        "message": "Document received and queued for processing",
+                        "job_id": str(job.id),
+                        "status": job.status,
+                        "s3_key": job.s3_key or None
                     },
-                    status=HTTP_200_OK,
+                    status=HTTP_202_ACCEPTED,
                 )
                 
             except Exception as e:
@@ -137,23 +133,18 @@ class UploadDocument(BaseAPI):
             file = data["file"]
             name = data["name"]
             
-            # Upload file to S3
-            s3_key = memory_service.upload_file(file, name)
-            
-            # Add memory with S3 key
-            memory_service.add_memory(
-                memory_type="document",
-                url=s3_key,
-                name=name
-            )
+            # Queue background processing (small PDFs are uploaded to S3 by the worker)
+            job = memory_service.start_document_ingestion(file, name)
             
             return Response(
                 {
-                    "message": "Document uploaded and processed successfully",
-                    "s3_key": s3_key,
+                    "message": "Document received and queued for processing",
+                    "job_id": str(job.id),
+                    "status": job.status,
+                    "s3_key": job.s3_key or None,
                     "name": name
                 },
-                status=HTTP_200_OK,
+                status=HTTP_202_ACCEPTED,
             )
             
         except Exception as e:
@@ -163,6 +154,107 @@ class UploadDocument(BaseAPI):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+class UpdateMemory(BaseAPI):
+    """
+    Replace the document of an existing memory, re-embedding only changed chunks
+    """
+    parser_classes = [MultiPartParser, FormParser]
+
+    class InputSerializer(serializers.Serializer):
+        file = serializers.FileField()
+        name = serializers.CharField(required=False)
+
+    input_serializer_class = InputSerializer
+
+    def post(self, request, *args, **kwargs):
+        data = self.validate_input_data()
+        course_id = self.kwargs.get("course_id")
+        memory_id = self.kwargs.get("memory_id")
+        course = get_object_or_404(Course, id=course_id)
+
+        if not course.is_active:
+            self.set_response_message("This course is not active")
+            return self.get_response_400()
+
+        memory_service = MemoryService(course)
+
+        try:
+            job = memory_service.start_memory_update(memory_id, data["file"], data.get("name"))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(
+            {
+                "message": "Document received and queued for update",
+                "job_id": str(job.id),
+                "memory_id": str(memory_id),
+                "status": job.status,
+                "s3_key": job.s3_key or None
+            },
+            status=HTTP_202_ACCEPTED,
+        )
+
+class IngestionJobStatus(BaseAPI):
+    """
+    Report per-stage progress of a background document-ingestion job
+    """
+    def get(self, request, *args, **kwargs):
+        course_id = self.kwargs.get("course_id")
+        job_id = self.kwargs.get("job_id")
+
+        job = get_object_or_404(IngestionJob, id=job_id, course_id=course_id)
+
+        # Extraction is streamed alongside embedding, so it is complete once
+        # every page has been read (a failed job keeps its last counters)
+        extracted = job.status == IngestionStatus.INDEXED or (
+            job.total_pages > 0 and job.processed_pages >= job.total_pages
+        )
+
+        response = {
+            "job_id": job.id,
+            "memory_id": job.memory_id,
+            "operation": job.operation,
+            "name": job.name,
+            "status": job.status,
+            "stages": {
+                "uploaded": bool(job.s3_key),
+                "extracted": extracted,
+                "pages": {
+                    "done": job.processed_pages,
+                    "total": job.total_pages,
+                },
+                "embedded": {
+                    "done": job.embedded_chunks,
+                    "total": job.total_chunks,
+                },
+                "indexed": job.status == IngestionStatus.INDEXED,
+            },
+            "error": job.error or None,
+            "created_at": job.created_at,
+            "started_at": job.started_at,
+            "finished_at": job.finished_at,
+        }
+
+        if job.operation == IngestionOperation.UPDATE:
+            # Work skipped by reusing unchanged chunks of the previous version
+            response["diff"] = {
+                "reused": job.reused_chunks,
+                "added": job.embedded_chunks - job.reused_chunks,
+                "deleted": job.deleted_chunks,
+                "embedding_saved": round(job.reused_chunks / job.total_chunks, 4) if job.total_chunks else 0.0,
+            }
+
+        return Response(response, status=status.HTTP_200_OK)
+
+class EmbeddingCacheStats(BaseAPI):
+    """
+    Report embedding cache and query embedding cache hit/miss counters and estimated savings
+    """
+    def get(self, request, *args, **kwargs):
+        stats = EmbeddingCache.get_stats()
+        stats["query_cache"] = QueryEmbeddingCache.get_stats()
+        return Response(stats, status=status.HTTP_200_OK)
+
 class MemoryDelete(BaseAPI):
     def delete(self, request, *args, **kwargs):
         user = self.get_user()
@@ -194,12 +286,21 @@ class MemoryContent(BaseAPI):
         
         # Get content based on memory type
         if memory.type == "document":
-            # Get document chunks
-            documents = Document.objects.filter(memory=memory).order_by('created_at')
+            # Get document chunks in document order (legacy rows without offsets last)
+            documents = (
+                Document.objects
+                .filter(memory=memory)
+                .only('content', 'page_number', 'start_offset', 'end_offset', 'token_count', 'created_at')
+                .order_by(models.F('start_offset').asc(nulls_last=True), 'created_at')
+            )
             content_data = [
                 {
                     "content": doc.content,
                     "chunk_index": idx,
+                    "page_number": doc.page_number,
+                    "start_offset": doc.start_offset,
+                    "end_offset": doc.end_offset,
+                    "token_count": doc.token_count,
                     "created_at": doc.created_at
                 }
                 for idx, doc in enumerate(documents)
@@ -263,6 +364,10 @@ class MemorySummary(BaseAPI):
 class MemoryContentSerializer(serializers.Serializer):
     content = serializers.CharField()
     chunk_index = serializers.IntegerField()
+    page_number = serializers.IntegerField(allow_null=True)
+    start_offset = serializers.IntegerField(allow_null=True)
+    end_offset = serializers.IntegerField(allow_null=True)
+    token_count = serializers.IntegerField(allow_null=True)
     created_at = serializers.DateTimeField()
 
 class MemoryOutputSerializer(serializers.ModelSerializer):
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class NivaAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'niva_app'
+
+    def ready(self):
+        # Connects the signals that invalidate in-process course indexes and
+        # regenerate precomputed course contexts
+        from niva_app.services import course_context, course_index  # noqa: F401
@@ -0,0 +1,135 @@
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import numpy as np
+
+from niva_app.lib.tokens import count_tokens
+
+WORD_PATTERN = re.compile(r"\w+")
+
+# Words per shingle when comparing chunk texts
+SHINGLE_SIZE = 3
+
+def _shingles(text: str) -> set:
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) <= SHINGLE_SIZE:
+        return {tuple(words)}
+    return {tuple(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+def _text_similarity(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+@dataclass
+class MMRSelection:
+    # Indices of the selected candidates, in selection order
+    selected: List[int] = field(default_factory=list)
+    # Indices of the candidates dropped as near-duplicates of a selected one
+    duplicates: List[int] = field(default_factory=list)
+
+def normalize_rows(vectors) -> np.ndarray:
+    """
+    Stack vectors into a float32 matrix of unit-length rows (missing vectors become zero rows).
+
+    Args:
+        vectors: Embeddings (lists, numpy arrays or None), all of the same length
+
+    Returns:
+        np.ndarray: (len(vectors), dimensions) matrix
+    """
+    dimensions = next((len(vector) for vector in vectors if vector is not None), 0)
+    matrix = np.zeros((len(vectors), dimensions), dtype=np.float32)
+    for i, vector in enumerate(vectors):
+        if vector is not None:
+            matrix[i] = vector
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+def mmr_select(
+    relevance,
+    embeddings: np.ndarray,
+    texts: List[str],
+    k: int,
+    lambda_mult: float = 0.7,
+    embedding_threshold: Optional[float] = 0.95,
+    text_threshold: Optional[float] = 0.8,
+) -> MMRSelection:
+    """
+    Pick up to k candidates by Maximal Marginal Relevance, skipping near-duplicates.
+
+    Each step selects the candidate maximizing
+    lambda_mult * relevance - (1 - lambda_mult) * max similarity to the chunks
+    already selected. Candidates whose embedding cosine similarity or word
+    shingle (Jaccard) similarity to a selected chunk exceeds its threshold
+    are dropped, so fewer than k may be returned.
+
+    Args:
+        relevance: Relevance of each candidate to the query, higher is better
+        embeddings (np.ndarray): Unit-length candidate embeddings, one row per candidate
+        texts (List[str]): Candidate texts
+        k (int): Number of candidates to select
+        lambda_mult (float): Trade-off between relevance (1) and diversity (0)
+        embedding_threshold (float): Embedding similarity above which a candidate
+            is a duplicate (None to disable)
+        text_threshold (float): Text similarity above which a candidate is a
+            duplicate (None to disable)
+
+    Returns:
+        MMRSelection: Indices of the selected candidates and of the dropped duplicates
+    """
+    result = MMRSelection()
+    relevance = np.asarray(relevance, dtype=np.float32)
+    count = len(relevance)
+    if not count or k <= 0:
+        return result
+
+    # Relevance scores come from different retrievers, so rescale them to
+    # [0, 1] to be comparable with cosine similarity
+    spread = relevance.max() - relevance.min()
+    relevance = (relevance - relevance.min()) / spread if spread > 0 else np.ones(count, dtype=np.float32)
+
+    similarity = embeddings @ embeddings.T
+    shingles = [_shingles(text) for text in texts] if text_threshold is not None else None
+
+    available = np.ones(count, dtype=bool)
+    max_similarity = np.zeros(count, dtype=np.float32)
+
+    while len(result.selected) < k and available.any():
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        result.selected.append(best)
+        available[best] = False
+
+        max_similarity = np.maximum(max_similarity, similarity[best])
+        duplicate = np.zeros(count, dtype=bool)
+        if embedding_threshold is not None:
+            duplicate |= available & (similarity[best] > embedding_threshold)
+        if shingles is not None:
+            for i in np.flatnonzero(available & ~duplicate):
+                if _text_similarity(shingles[best], shingles[i]) > text_threshold:
+                    duplicate[i] = True
+        result.duplicates.extend(int(i) for i in np.flatnonzero(duplicate))
+        available &= ~duplicate
+
+    return result
+
+def duplicate_tokens_avoided(texts: List[str], selection: MMRSelection, k: int) -> int:
+    """
+    Tokens of the plain top-k (by candidate order) that were near-duplicates
+    of a selected chunk.
+
+    Candidates left out only because MMR preferred a more diverse one are not
+    counted, as they were not duplicates.
+
+    Args:
+        texts (List[str]): Candidate texts, most relevant first
+        selection (MMRSelection): Result of mmr_select
+        k (int): Number of results requested
+
+    Returns:
+        int: Token count of the top-k candidates dropped as duplicates
+    """
+    return sum(count_tokens(texts[i]) for i in selection.duplicates if i < k)
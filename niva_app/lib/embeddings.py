@@ -0,0 +1,367 @@
+import hashlib
+import logging
+import random
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+
+import httpx
+import numpy as np
+from django.conf import settings
+from google.genai import errors as genai_errors
+from google.genai import types
+
+from niva_app.lib.llm import gemini_client
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = "gemini-embedding-exp-03-07"
+EMBEDDING_DIMENSIONS = 3072
+# Dimensionality of the indexed (Matryoshka-truncated) embedding. pgvector can
+# only build HNSW indexes on `vector` columns of up to 2000 dimensions.
+EMBEDDING_INDEX_DIMENSIONS = 1536
+
+# HTTP status codes worth retrying: timeouts, rate limits and server errors
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+def normalize_chunk(text: str) -> str:
+    """
+    Normalize chunk text for content addressing (Unicode NFC, collapsed whitespace).
+
+    Args:
+        text (str): Chunk text
+
+    Returns:
+        str: Normalized text
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+def content_hash(text: str) -> str:
+    """
+    SHA-256 hex digest of the normalized chunk text.
+
+    Args:
+        text (str): Chunk text
+
+    Returns:
+        str: 64-character hex digest
+    """
+    return hashlib.sha256(normalize_chunk(text).encode("utf-8")).hexdigest()
+
+def reduce_embedding(embedding, dimensions: int = EMBEDDING_INDEX_DIMENSIONS) -> List[float]:
+    """
+    Truncate an embedding to its first `dimensions` values and re-normalize it.
+
+    Gemini embeddings are trained with Matryoshka representation learning, so
+    a prefix of the vector is itself a usable (slightly less precise) embedding
+    once it is scaled back to unit length.
+
+    Args:
+        embedding: Full embedding (list or numpy array)
+        dimensions (int): Number of leading dimensions to keep
+
+    Returns:
+        List[float]: Unit-length reduced embedding
+    """
+    vector = np.asarray(embedding, dtype=np.float32)[:dimensions]
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector = vector / norm
+    return vector.tolist()
+
+def quantize_binary(embedding) -> str:
+    """
+    Binary-quantize an embedding (1 bit per dimension, set where the value is positive).
+
+    Args:
+        embedding: Embedding (list or numpy array)
+
+    Returns:
+        str: Bit string accepted by pgvector's `bit` type
+    """
+    return "".join("1" if value > 0 else "0" for value in np.asarray(embedding, dtype=np.float32))
+
+class BaseEmbedder:
+    """
+    Base class for embedding backends used by the EmbeddingEngine.
+
+    Subclasses implement `embed` for a single batch of texts and return one
+    vector per input text, in order.
+    """
+
+    model = EMBEDDING_MODEL
+
+    def embed(self, texts: List[str], task_type: Optional[str] = None) -> List[List[float]]:
+        raise NotImplementedError
+
+class GeminiEmbedder(BaseEmbedder):
+    """
+    Embedder backed by the Gemini embedding API.
+
+    Args:
+        client: Gemini client (defaults to the shared one)
+        model (str): Embedding model name
+        timeout_ms (int): HTTP timeout per request (None for the client default)
+    """
+
+    def __init__(self, client=None, model: str = EMBEDDING_MODEL, timeout_ms: Optional[int] = None):
+        self.client = client or gemini_client
+        self.model = model
+        self.timeout_ms = timeout_ms
+
+    def embed(self, texts: List[str], task_type: Optional[str] = None) -> List[List[float]]:
+        options = {}
+        if task_type:
+            options["task_type"] = task_type
+        if self.timeout_ms:
+            options["http_options"] = types.HttpOptions(timeout=int(self.timeout_ms))
+        config = types.EmbedContentConfig(**options) if options else None
+        response = self.client.models.embed_content(
+            model=self.model,
+            contents=texts,
+            config=config
+        )
+        return [embedding.values for embedding in response.embeddings]
+
+class FakeEmbedder(BaseEmbedder):
+    """
+    Deterministic offline embedder for tests and benchmarks.
+
+    Each text maps to a unit vector seeded from its SHA-256, so the same text
+    always gets the same embedding. Optional per-call latency and failure rate
+    simulate the network behaviour of a real provider.
+
+    Args:
+        dimensions (int): Size of the generated vectors
+        latency (float): Seconds to sleep per call
+        failure_rate (float): Probability (0-1) that a call raises a retryable error
+    """
+
+    model = "fake-embedder"
+
+    def __init__(self, dimensions: int = EMBEDDING_DIMENSIONS, latency: float = 0.0, failure_rate: float = 0.0):
+        self.dimensions = dimensions
+        self.latency = latency
+        self.failure_rate = failure_rate
+
+    def embed(self, texts: List[str], task_type: Optional[str] = None) -> List[List[float]]:
+        if self.latency:
+            time.sleep(self.latency)
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise TransientEmbeddingError("Simulated transient embedding failure")
+        return [self.embed_one(text).tolist() for text in texts]
+
+    def embed_one(self, text: str) -> np.ndarray:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dimensions).astype(np.float32)
+        return vector / np.linalg.norm(vector)
+
+def get_embedder(model: str = EMBEDDING_MODEL, timeout_ms: Optional[int] = None) -> BaseEmbedder:
+    """
+    Embedding backend selected by EMBEDDING_BACKEND ("gemini", or "fake" to run offline).
+    """
+    if settings.EMBEDDING_BACKEND == "fake":
+        return FakeEmbedder()
+    return GeminiEmbedder(model=model, timeout_ms=timeout_ms)
+
+class TransientEmbeddingError(Exception):
+    """Raised for embedding failures that are safe to retry."""
+
+@dataclass
+class EmbeddingStats:
+    """Counters collected over one EmbeddingEngine.embed call."""
+    texts: int = 0
+    batches: int = 0
+    retries: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    elapsed: float = 0.0
+    batch_latencies: List[float] = field(default_factory=list)
+
+    @property
+    def texts_per_second(self) -> float:
+        return self.texts / self.elapsed if self.elapsed else 0.0
+
+class EmbeddingEngine:
+    """
+    Embeds large lists of texts in batches with bounded concurrency.
+
+    Texts are split into batches of `batch_size` and sent through a thread pool
+    of `max_concurrency` workers. Each batch is retried with exponential backoff
+    and full jitter on transient errors. `on_batch` is called (on the calling
+    thread) as soon as each batch lands, so callers can persist results
+    incrementally instead of holding the whole document in memory.
+
+    Args:
+        embedder (BaseEmbedder): Embedding backend (defaults to `get_embedder()`)
+        batch_size (int): Maximum texts per provider request
+        max_concurrency (int): Maximum in-flight provider requests
+        max_retries (int): Retries per batch before giving up
+        base_delay (float): Initial backoff delay in seconds
+        max_delay (float): Upper bound for a single backoff delay in seconds
+        cache: Optional content-addressed cache (see niva_app.services.embedding_cache)
+    """
+
+    def __init__(
+        self,
+        embedder: BaseEmbedder = None,
+        batch_size: int = None,
+        max_concurrency: int = None,
+        max_retries: int = None,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        cache=None,
+    ):
+        self.embedder = embedder or get_embedder()
+        self.cache = cache
+        self.batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+        self.max_concurrency = max_concurrency or settings.EMBEDDING_MAX_CONCURRENCY
+        self.max_retries = settings.EMBEDDING_MAX_RETRIES if max_retries is None else max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stats = EmbeddingStats()
+        self._stats_lock = threading.Lock()
+
+    @property
+    def model(self) -> str:
+        return self.embedder.model
+
+    def embed(
+        self,
+        texts: List[str],
+        task_type: Optional[str] = None,
+        on_batch: Callable[[int, List[str], List[List[float]]], None] = None,
+    ) -> List[List[float]]:
+        """
+        Embed all texts and return their vectors in input order.
+
+        When the engine has a cache, texts whose normalized content hash is
+        already cached are not sent to the provider.
+
+        Args:
+            texts (List[str]): Texts to embed
+            task_type (str): Optional provider task type (e.g. RETRIEVAL_QUERY)
+            on_batch (Callable): Called with (start_index, batch_texts, batch_vectors)
+                as each batch completes
+
+        Returns:
+            List[List[float]]: One embedding per input text
+        """
+        self.stats = EmbeddingStats(texts=len(texts))
+        if not texts:
+            return []
+
+        started = time.perf_counter()
+        hashes = [content_hash(text) for text in texts]
+        cached = self.cache.get_many(self.model, task_type, hashes) if self.cache else {}
+
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        batches = [
+            (start, texts[start:start + self.batch_size], hashes[start:start + self.batch_size])
+            for start in range(0, len(texts), self.batch_size)
+        ]
+
+        # Batches complete out of order; hand them to on_batch in input order
+        # so persisted rows keep the document's chunk order.
+        completed = {}
+        next_batch = 0
+
+        def flush_completed():
+            nonlocal next_batch
+            while next_batch in completed:
+                start, batch, _ = batches[next_batch]
+                vectors = completed.pop(next_batch)
+                results[start:start + len(batch)] = vectors
+                if on_batch:
+                    on_batch(start, batch, vectors)
+                next_batch += 1
+
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as pool:
+            futures = {}
+            for index, (_, batch, batch_hashes) in enumerate(batches):
+                missing = [i for i, h in enumerate(batch_hashes) if h not in cached]
+                self.stats.cache_hits += len(batch) - len(missing)
+                self.stats.cache_misses += len(missing)
+                if missing:
+                    future = pool.submit(self._embed_batch_with_retry, [batch[i] for i in missing], task_type)
+                    futures[future] = (index, missing)
+                else:
+                    completed[index] = [cached[h] for h in batch_hashes]
+
+            try:
+                flush_completed()
+                for future in as_completed(futures):
+                    index, missing = futures[future]
+                    batch_hashes = batches[index][2]
+                    embedded = future.result()
+                    self.stats.batches += 1
+
+                    vectors = [cached.get(h) for h in batch_hashes]
+                    for i, vector in zip(missing, embedded):
+                        vectors[i] = vector
+                    if self.cache:
+                        self.cache.set_many(
+                            self.model,
+                            task_type,
+                            {batch_hashes[i]: vector for i, vector in zip(missing, embedded)}
+                        )
+
+                    completed[index] = vectors
+                    flush_completed()
+            except Exception:
+                # Don't start batches that are still queued once one has failed
+                for pending in futures:
+                    pending.cancel()
+                raise
+
+        self.stats.elapsed = time.perf_counter() - started
+        if self.cache:
+            self.cache.record_usage(
+                hits=self.stats.cache_hits,
+                misses=self.stats.cache_misses,
+                embed_seconds=sum(self.stats.batch_latencies),
+                saved_chars=sum(len(text) for text, h in zip(texts, hashes) if h in cached)
+            )
+        logger.info(
+            f"Embedded {self.stats.texts} texts in {self.stats.batches} batches "
+            f"({self.stats.cache_hits} cache hits, {self.stats.retries} retries) in {self.stats.elapsed:.2f}s "
+            f"({self.stats.texts_per_second:.1f} texts/s)"
+        )
+        return results
+
+    def _embed_batch_with_retry(self, batch: List[str], task_type: Optional[str]) -> List[List[float]]:
+        attempt = 0
+        while True:
+            batch_started = time.perf_counter()
+            try:
+                vectors = self.embedder.embed(batch, task_type=task_type)
+                if len(vectors) != len(batch):
+                    raise TransientEmbeddingError(
+                        f"Embedder returned {len(vectors)} vectors for {len(batch)} texts"
+                    )
+                self.stats.batch_latencies.append(time.perf_counter() - batch_started)
+                return vectors
+            except Exception as e:
+                if attempt >= self.max_retries or not self._is_retryable(e):
+                    raise
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+                attempt += 1
+                with self._stats_lock:
+                    self.stats.retries += 1
+                logger.warning(
+                    f"Embedding batch of {len(batch)} failed ({e}); "
+                    f"retry {attempt}/{self.max_retries} in {delay:.2f}s"
+                )
+                time.sleep(delay)
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        if isinstance(error, TransientEmbeddingError):
+            return True
+        if isinstance(error, genai_errors.APIError):
+            return error.code in RETRYABLE_STATUS_CODES
+        # Network-level failures (connection resets, read timeouts, ...)
+        return isinstance(error, (httpx.TransportError, ConnectionError, TimeoutError))
@@ -18,22 +18,21 @@ def get_similarity(text1, text2):
         return 0.0
 
 def create_embedding(input, model="gemini-embedding-exp-03-07"):
+    # Import here to avoid circular import
+    from niva_app.services.embedding_cache import embed_query
+
     try:
-        embedding = gemini_client.models.embed_content(
-            model=model,
-            contents=[input]
-        )
-        # Extract values from ContentEmbedding object
-        if embedding and embedding.embeddings:
-            return embedding.embeddings[0].values
-        return None
+        return embed_query(input, model=model)
     except Exception as e:
         print(f"Error creating embedding: {e} for input: {input}")
         return None
 
 
 def llm(messages, _class: BaseModel, max_tokens: int = None, model: str = "gemini-2.0-flash"):
-    response = gemini_client.models.generate_content(
+    # Import here to avoid circular import
+    from niva_app.lib.llm_gateway import generate_content
+
+    response = generate_content(
         model=model,
         contents=[messages[0]["content"]],
         config={
@@ -62,7 +61,10 @@ def summarize_conversation(messages: list[dict], agent_name: str) -> str:
     class Summary(BaseModel):
         summary: str
 
-    response = gemini_client.models.generate_content(
+    # Import here to avoid circular import
+    from niva_app.lib.llm_gateway import generate_content
+
+    response = generate_content(
         model="gemini-2.5-flash-lite",
         contents=[prompt],
         config={
@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+from typing import Dict, Optional
+
+import httpx
+from django.conf import settings
+from google import genai
+from google.genai import errors as genai_errors
+from google.genai import types
+
+from app import config
+from niva_app.lib.embeddings import RETRYABLE_STATUS_CODES
+
+logger = logging.getLogger(__name__)
+
+# Backoff between retries (full jitter), in seconds
+BASE_DELAY = 0.5
+MAX_DELAY = 8.0
+
+class _Gateway:
+    """
+    Event loop thread owning the async Gemini client and per-model semaphores.
+
+    Every LLM call in the process runs on this one loop, so the client's
+    connection pool is reused across calls and the concurrency limits hold
+    for all callers (request handlers, call runners, Celery tasks, threads).
+    """
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.client = genai.Client(
+            api_key=config.GOOGLE_GEMINI_API_KEY,
+            http_options=types.HttpOptions(timeout=int(settings.LLM_TIMEOUT_SECONDS * 1000)),
+        )
+        self.semaphores: Dict[str, asyncio.Semaphore] = {}
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="llm-gateway", daemon=True)
+        self.thread.start()
+
+    def semaphore(self, model: str) -> asyncio.Semaphore:
+        # Only called on the gateway loop, so no lock is needed
+        if model not in self.semaphores:
+            self.semaphores[model] = asyncio.Semaphore(model_concurrency(model))
+        return self.semaphores[model]
+
+_gateway: Optional[_Gateway] = None
+_gateway_lock = threading.Lock()
+
+def _get_gateway() -> _Gateway:
+    global _gateway
+    with _gateway_lock:
+        # Forked workers (e.g. Celery prefork) start their own loop thread
+        if _gateway is None or _gateway.pid != os.getpid():
+            _gateway = _Gateway()
+        return _gateway
+
+def model_concurrency(model: str) -> int:
+    """
+    Maximum concurrent requests to a model: its LLM_MODEL_CONCURRENCY entry
+    ("model=limit,model=limit"), or LLM_MAX_CONCURRENCY.
+    """
+    for entry in settings.LLM_MODEL_CONCURRENCY.split(","):
+        name, _, limit = entry.partition("=")
+        if name.strip() == model and limit.strip():
+            return int(limit)
+    return settings.LLM_MAX_CONCURRENCY
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, genai_errors.APIError):
+        return error.code in RETRYABLE_STATUS_CODES
+    # Per-attempt timeouts and network-level failures
+    return isinstance(error, (asyncio.TimeoutError, httpx.TransportError, ConnectionError, TimeoutError))
+
+async def _generate(gateway: _Gateway, model: str, contents, config, timeout: float) -> types.GenerateContentResponse:
+    attempt = 0
+    async with gateway.semaphore(model):
+        while True:
+            try:
+                return await asyncio.wait_for(
+                    gateway.client.aio.models.generate_content(model=model, contents=contents, config=config),
+                    timeout
+                )
+            except Exception as e:
+                if attempt >= settings.LLM_MAX_RETRIES or not _is_retryable(e):
+                    raise
+                delay = random.uniform(0, min(MAX_DELAY, BASE_DELAY * (2 ** attempt)))
+                attempt += 1
+                logger.warning(
+                    f"{model} request failed ({type(e).__name__}: {e}); "
+                    f"retry {attempt}/{settings.LLM_MAX_RETRIES} in {delay:.2f}s"
+                )
+                await asyncio.sleep(delay)
+
+def _submit(model: str, contents, config, timeout: Optional[float]):
+    gateway = _get_gateway()
+    if threading.current_thread() is gateway.thread:
+        raise RuntimeError("LLM gateway calls cannot be made from the gateway loop itself")
+    return asyncio.run_coroutine_threadsafe(
+        _generate(gateway, model, contents, config, timeout or settings.LLM_TIMEOUT_SECONDS),
+        gateway.loop
+    )
+
+async def agenerate_content(model: str, contents, config=None,
+                            timeout: Optional[float] = None) -> types.GenerateContentResponse:
+    """
+    Generate content with a Gemini model without blocking the caller's event loop.
+
+    The request runs on the gateway loop: it waits for a slot under the model's
+    concurrency limit, and each attempt is bounded by `timeout`. Timeouts, rate
+    limits, server errors and network failures are retried up to LLM_MAX_RETRIES
+    times with exponential backoff.
+
+    Args:
+        model (str): Gemini model name
+        contents: Prompt contents, as accepted by `generate_content` in the SDK
+        config: Generation config (GenerateContentConfig or dict)
+        timeout (float): Seconds per attempt (defaults to LLM_TIMEOUT_SECONDS)
+
+    Returns:
+        GenerateContentResponse: SDK response
+    """
+    return await asyncio.wrap_future(_submit(model, contents, config, timeout))
+
+def generate_content(model: str, contents, config=None,
+                     timeout: Optional[float] = None) -> types.GenerateContentResponse:
+    """
+    Blocking variant of `agenerate_content` for synchronous code (management
+    commands, Celery tasks, sync service methods). Only the calling thread
+    waits; the request shares the gateway's connections and limits.
+    """
+    return _submit(model, contents, config, timeout).result()
@@ -0,0 +1,66 @@
+from dataclasses import dataclass, field
+from typing import List
+
+import numpy as np
+
+from niva_app.lib.tokens import count_tokens
+
+@dataclass
+class PackStats:
+    """Token accounting of a `pack_chunks` call."""
+    budget: int = 0
+    candidates: int = 0
+    packed: int = 0
+    dropped: int = 0
+    packed_tokens: int = 0
+    dropped_tokens: int = 0
+
+@dataclass
+class PackResult:
+    # Indices of the packed chunks, most similar first
+    selected: List[int] = field(default_factory=list)
+    text: str = ""
+    stats: PackStats = field(default_factory=PackStats)
+
+def pack_chunks(texts: List[str], similarities, budget: int, separator: str = "\n") -> PackResult:
+    """
+    Pack the chunks most similar to a query into a token budget.
+
+    Chunks are ranked by embedding similarity to the query and added greedily:
+    a chunk that does not fit in what is left of the budget is skipped and
+    smaller, less similar chunks are still tried, so the budget is filled as
+    far as whole chunks allow. Token counts are exact for the
+    `niva_app.lib.tokens` estimate and include the separators.
+
+    Args:
+        texts (List[str]): Candidate chunk texts
+        similarities: Embedding similarity of each chunk to the query, higher is better
+        budget (int): Maximum tokens of the packed text
+        separator (str): Text placed between packed chunks
+
+    Returns:
+        PackResult: Selected chunk indices, the packed text and token stats
+    """
+    result = PackResult(stats=PackStats(budget=budget, candidates=len(texts)))
+    if not texts:
+        return result
+
+    separator_tokens = count_tokens(separator)
+    # Stable, so equally similar chunks keep their candidate order
+    order = np.argsort(-np.asarray(similarities, dtype=np.float32), kind="stable")
+
+    used = 0
+    for i in order:
+        tokens = count_tokens(texts[i])
+        cost = tokens + (separator_tokens if result.selected else 0)
+        if used + cost <= budget:
+            result.selected.append(int(i))
+            used += cost
+            result.stats.packed_tokens += tokens
+        else:
+            result.stats.dropped_tokens += tokens
+
+    result.text = separator.join(texts[i] for i in result.selected)
+    result.stats.packed = len(result.selected)
+    result.stats.dropped = len(texts) - result.stats.packed
+    return result
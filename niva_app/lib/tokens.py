@@ -0,0 +1,65 @@
+import re
+import sys
+import unicodedata
+from typing import Iterator, Match
+
+def _combining_marks() -> str:
+    """
+    Character class body of the combining marks (Unicode categories Mn, Mc
+    and Me) in the Basic Multilingual Plane, e.g. Indic vowel signs and viramas.
+    """
+    ranges = []
+    for code in range(min(sys.maxunicode, 0xFFFF) + 1):
+        if unicodedata.category(chr(code)) in ("Mn", "Mc", "Me"):
+            if ranges and ranges[-1][1] == code - 1:
+                ranges[-1][1] = code
+            else:
+                ranges.append([code, code])
+    return "".join(
+        re.escape(chr(start)) if start == end else f"{re.escape(chr(start))}-{re.escape(chr(end))}"
+        for start, end in ranges
+    )
+
+# Combining marks are not word characters to `re`, so each letter absorbs the
+# marks that follow it instead of every vowel sign counting as punctuation
+_LETTER = rf"[^\W\d_][{_combining_marks()}]*"
+
+# Approximates the subword tokenization of the Gemini models offline, without
+# loading a vocabulary: common Latin-script words are a single token (longer
+# ones are split every 10 letters), numbers are split into groups of up to 3
+# digits, other scripts take a few letters (with their combining marks) per
+# token and every punctuation mark or symbol is its own token. Whitespace is
+# folded into the next token.
+TOKEN_PATTERN = re.compile(
+    r"[A-Za-z]{1,10}"
+    r"|\d{1,3}"
+    rf"|(?:{_LETTER}){{1,3}}"
+    r"|[^\w\s]"
+)
+
+SENTENCE_END_TOKENS = {".", "!", "?", ";", ":"}
+
+def iter_tokens(text: str) -> Iterator[Match]:
+    """
+    Iterate over the tokens of a text.
+
+    Args:
+        text (str): Text to tokenize
+
+    Returns:
+        Iterator[Match]: One regex match per token; `start()`/`end()` give its
+            character offsets in `text`
+    """
+    return TOKEN_PATTERN.finditer(text)
+
+def count_tokens(text: str) -> int:
+    """
+    Estimate the number of model tokens in a text.
+
+    Args:
+        text (str): Text to measure
+
+    Returns:
+        int: Token count
+    """
+    return sum(1 for _ in iter_tokens(text))
@@ -0,0 +1,76 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from niva_app.models import Document
+from niva_app.services.retrieval import (
+    CANDIDATE_FIELDS,
+    STORAGE_FULL,
+    STORAGE_MODES,
+    document_embedding_fields,
+    get_storage_mode,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Backfill the compact embedding columns searched by the HNSW indexes '
+        '(reduced, halfvec or binary) from the full embeddings'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Documents updated per batch')
+        parser.add_argument('--memory', type=str, default=None, help='Only backfill documents of this memory ID')
+        parser.add_argument('--mode', choices=STORAGE_MODES, default=None,
+                            help='Storage mode to backfill (defaults to EMBEDDING_STORAGE_MODE)')
+        parser.add_argument('--all', action='store_true', help='Recompute rows that were already backfilled')
+        parser.add_argument('--drop-full-precision', action='store_true',
+                            help='Clear the float32 embedding once the quantized columns are filled (irreversible)')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        mode = get_storage_mode(options['mode'])
+        drop_full_precision = options['drop_full_precision'] and mode != STORAGE_FULL
+        target_field = CANDIDATE_FIELDS[mode]
+
+        documents = Document.objects.filter(embedding__isnull=False)
+        if options['memory']:
+            documents = documents.filter(memory_id=options['memory'])
+        if not options['all']:
+            documents = documents.filter(**{f"{target_field}__isnull": True})
+
+        total = documents.count()
+        self.stdout.write(f"Backfilling {target_field} for {total} documents ({mode} mode)")
+
+        started = time.perf_counter()
+        updated = 0
+        last_id = None
+
+        # Keyset pagination on the primary key so each batch is an index range
+        # scan, and rows updated by earlier batches are never revisited
+        while True:
+            batch_query = documents.order_by('id')
+            if last_id is not None:
+                batch_query = batch_query.filter(id__gt=last_id)
+            batch = list(batch_query.only('id', 'embedding')[:batch_size])
+            if not batch:
+                break
+
+            update_fields = set()
+            for document in batch:
+                fields = document_embedding_fields(document.embedding, mode=mode)
+                fields.pop('embedding', None)
+                if drop_full_precision:
+                    fields['embedding'] = None
+                for name, value in fields.items():
+                    setattr(document, name, value)
+                update_fields.update(fields)
+            Document.objects.bulk_update(batch, sorted(update_fields))
+
+            updated += len(batch)
+            last_id = batch[-1].id
+            self.stdout.write(f"  {updated}/{total} ({updated / (time.perf_counter() - started):.0f} docs/s)")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Backfilled {updated} documents in {time.perf_counter() - started:.1f}s"
+        ))
@@ -0,0 +1,80 @@
+import random
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from niva_app.lib.tokens import count_tokens
+from niva_app.services.rag import iter_chunks, iter_pdf_pages
+
+WORDS = (
+    "the of and to in is that for it as with was on be by this are from at or an which "
+    "photosynthesis mitochondria constitution parliament amendment equilibrium derivative "
+    "integral economy inflation monetary policy 1947 2024 3.14 % , . ; ( ) - interview"
+).split()
+
+
+class Command(BaseCommand):
+    help = 'Micro-benchmark chunking throughput: token-aware chunker vs the per-page character splitter'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pdf', type=str, default=None, help='PDF to chunk (defaults to synthetic pages)')
+        parser.add_argument('--pages', type=int, default=500, help='Synthetic pages to generate')
+        parser.add_argument('--words-per-page', type=int, default=450, help='Words per synthetic page')
+        parser.add_argument('--chunk-tokens', type=int, default=None, help='Tokens per chunk (defaults to CHUNK_TOKENS)')
+        parser.add_argument('--overlap-tokens', type=int, default=None,
+                            help='Overlap tokens (defaults to CHUNK_OVERLAP_TOKENS)')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per chunker (best is reported)')
+
+    def handle(self, *args, **options):
+        if options['pdf']:
+            pages = list(iter_pdf_pages(options['pdf']))
+        else:
+            rng = random.Random(42)
+            pages = [
+                (number, " ".join(rng.choice(WORDS) for _ in range(options['words_per_page'])))
+                for number in range(1, options['pages'] + 1)
+            ]
+
+        characters = sum(len(text) for _, text in pages)
+        self.stdout.write(f"{len(pages)} pages, {characters / 1_000_000:.2f}M characters")
+        self.stdout.write(
+            f"{'chunker':<12} {'chunks':>7} {'seconds':>8} {'pages/s':>9} {'MB/s':>7} "
+            f"{'tokens avg':>11} {'tokens sd':>10} {'max':>6}"
+        )
+
+        chunk_tokens = options['chunk_tokens'] or settings.CHUNK_TOKENS
+        overlap_tokens = settings.CHUNK_OVERLAP_TOKENS if options['overlap_tokens'] is None else options['overlap_tokens']
+
+        def token_chunker():
+            chunks = iter_chunks(pages, chunk_tokens=chunk_tokens, overlap_tokens=overlap_tokens)
+            return [chunk.token_count for chunk in chunks]
+
+        splitter = RecursiveCharacterTextSplitter(chunk_size=1500, chunk_overlap=200, length_function=len)
+
+        def character_splitter():
+            # Previous behaviour: each page split on its own by character count
+            return [len(chunk) for _, text in pages for chunk in splitter.split_text(text)]
+
+        for name, chunker in (('token', token_chunker), ('character', character_splitter)):
+            best = None
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                sizes = chunker()
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+
+            # Token counts are measured the same way for both chunkers
+            if name == 'character':
+                sizes = [
+                    count_tokens(chunk)
+                    for _, text in pages for chunk in splitter.split_text(text)
+                ]
+
+            self.stdout.write(
+                f"{name:<12} {len(sizes):>7} {best:>8.3f} {len(pages) / best:>9.0f} "
+                f"{characters / best / 1_000_000:>7.2f} {statistics.mean(sizes) if sizes else 0:>11.1f} "
+                f"{statistics.pstdev(sizes) if sizes else 0:>10.1f} {max(sizes, default=0):>6}"
+            )
@@ -0,0 +1,105 @@
+import statistics
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from niva_app.lib.embeddings import reduce_embedding
+from niva_app.models import Document
+from niva_app.services.course_index import CourseEmbeddingIndex, get_index_version
+from niva_app.services.embedding_cache import embed_query
+from niva_app.services.retrieval import exact_search_documents, search_documents
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark recall@k and latency of the in-process course index against '
+        'the pgvector search and an exact full-precision scan'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('course_id', type=str, help='Course whose memories are searched')
+        parser.add_argument('--k', type=int, default=5, help='Results per query')
+        parser.add_argument('--queries', type=int, default=50,
+                            help='Number of stored chunk embeddings to sample as queries')
+        parser.add_argument('--query', type=str, nargs='*', default=[],
+                            help='Text queries to embed and use instead of sampled chunks')
+
+    def handle(self, *args, **options):
+        k = options['k']
+        course_id = options['course_id']
+        documents = Document.objects.filter(course_id=course_id)
+
+        if options['query']:
+            query_embeddings = [embed_query(text, task_type="RETRIEVAL_QUERY") for text in options['query']]
+        else:
+            query_embeddings = list(
+                documents.filter(embedding__isnull=False)
+                .order_by('?')
+                .values_list('embedding', flat=True)[:options['queries']]
+            )
+
+        if not query_embeddings:
+            self.stdout.write(self.style.WARNING("No documents with full-precision embeddings to benchmark against"))
+            return
+
+        started = time.perf_counter()
+        index = CourseEmbeddingIndex.load(course_id, get_index_version(course_id))
+        self.stdout.write(
+            f"Loaded course index: {len(index.rows)} chunks, {index.matrix.nbytes / (1024 * 1024):.1f} MB, "
+            f"{(time.perf_counter() - started) * 1000:.0f}ms"
+        )
+
+        truths = []
+        for query_embedding in query_embeddings:
+            rows = exact_search_documents(documents, query_embedding, k=k, fields=('id',))
+            truths.append({str(row['id']) for row in rows})
+
+        self.stdout.write(f"\n{len(query_embeddings)} queries, k={k}")
+        self.stdout.write(f"{'search':<12} {'recall@k':>9} {'p50 ms':>9} {'p95 ms':>9}")
+
+        searches = {
+            'pgvector': lambda query_embedding: search_documents(documents, query_embedding, k=k, fields=('id',)),
+            'in-process': lambda query_embedding: index.search(query_embedding, k=k),
+        }
+        for name, search in searches.items():
+            recalls = []
+            latencies = []
+            for query_embedding, truth in zip(query_embeddings, truths):
+                started = time.perf_counter()
+                rows = search(query_embedding)
+                latencies.append(time.perf_counter() - started)
+                if truth:
+                    recalls.append(len(truth & {str(row['id']) for row in rows}) / len(truth))
+            self._write_row(name, statistics.mean(recalls) if recalls else 0.0, latencies)
+
+        # Similarity scoring alone, per call: the float32 blocked product the
+        # index uses against a direct product on the float16 matrix
+        self.stdout.write(f"\nScoring {len(index.rows)} chunks per call")
+        self.stdout.write(f"{'scoring':<12} {'p50 ms':>9} {'p95 ms':>9}")
+        scorers = {
+            'float32': index.score,
+            'float16': lambda query_embedding: index.matrix @ np.asarray(
+                reduce_embedding(query_embedding, index.matrix.shape[1]), dtype=np.float16
+            ),
+        }
+        for name, score in scorers.items():
+            latencies = []
+            for query_embedding in query_embeddings:
+                started = time.perf_counter()
+                score(query_embedding)
+                latencies.append(time.perf_counter() - started)
+            latencies_ms = sorted(latency * 1000 for latency in latencies)
+            self.stdout.write(
+                f"{name:<12} {statistics.median(latencies_ms):>9.3f} {self._p95(latencies_ms):>9.3f}"
+            )
+
+    @staticmethod
+    def _p95(latencies_ms):
+        return latencies_ms[min(len(latencies_ms) - 1, int(len(latencies_ms) * 0.95))]
+
+    def _write_row(self, name, recall, latencies):
+        latencies_ms = sorted(latency * 1000 for latency in latencies)
+        self.stdout.write(
+            f"{name:<12} {recall:>9.3f} {statistics.median(latencies_ms):>9.3f} {self._p95(latencies_ms):>9.3f}"
+        )
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+
+from niva_app.lib.embeddings import EmbeddingEngine, FakeEmbedder
+
+
+class Command(BaseCommand):
+    help = 'Benchmark EmbeddingEngine throughput offline using the fake embedder'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunks', type=int, default=2000, help='Number of chunks to embed')
+        parser.add_argument('--chunk-size', type=int, default=1500, help='Characters per synthetic chunk')
+        parser.add_argument('--batch-size', type=int, nargs='+', default=[50], help='Batch sizes to compare')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4], help='Concurrency levels to compare')
+        parser.add_argument('--latency', type=float, default=0.2, help='Simulated seconds per provider call')
+        parser.add_argument('--failure-rate', type=float, default=0.0, help='Simulated transient failure rate (0-1)')
+        parser.add_argument('--dimensions', type=int, default=3072, help='Embedding dimensions')
+
+    def handle(self, *args, **options):
+        chunks = [
+            f"chunk {i} " + ("lorem ipsum " * (options['chunk_size'] // 12))
+            for i in range(options['chunks'])
+        ]
+        embedder = FakeEmbedder(
+            dimensions=options['dimensions'],
+            latency=options['latency'],
+            failure_rate=options['failure_rate'],
+        )
+
+        self.stdout.write(
+            f"Embedding {len(chunks)} chunks (latency={options['latency']}s/call, "
+            f"failure_rate={options['failure_rate']})"
+        )
+        self.stdout.write(f"{'batch':>6} {'conc':>5} {'batches':>8} {'retries':>8} {'seconds':>9} {'chunks/s':>10}")
+
+        for batch_size in options['batch_size']:
+            for concurrency in options['concurrency']:
+                engine = EmbeddingEngine(
+                    embedder=embedder,
+                    batch_size=batch_size,
+                    max_concurrency=concurrency,
+                    base_delay=0.05,
+                    max_delay=1.0,
+                )
+                engine.embed(chunks)
+                stats = engine.stats
+                self.stdout.write(
+                    f"{batch_size:>6} {concurrency:>5} {stats.batches:>8} {stats.retries:>8} "
+                    f"{stats.elapsed:>9.2f} {stats.texts_per_second:>10.1f}"
+                )
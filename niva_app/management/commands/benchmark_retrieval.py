@@ -0,0 +1,237 @@
+import asyncio
+import random
+import statistics
+import time
+import uuid
+from collections import deque
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from niva_app.lib.embeddings import FakeEmbedder
+from niva_app.models import Course, Document, Memory, MemoryType
+from niva_app.services.course_index import CourseEmbeddingIndex, get_index_version
+from niva_app.services.retrieval import (
+    document_embedding_fields,
+    exact_search_documents,
+    search_course,
+    search_documents,
+    search_memory,
+    update_search_vectors,
+)
+
+WORDS = (
+    "constitution parliament amendment article fundamental rights directive principles judiciary "
+    "federalism panchayat election commission budget inflation monetary fiscal policy reserve bank "
+    "gdp agriculture monsoon irrigation climate biodiversity ecology pollution renewable energy "
+    "defence army navy air force officer leadership teamwork ssb oir ppdt gto interview psychology "
+    "history mughal maratha colonial freedom struggle gandhi nehru partition 1857 1947 1950 1991 "
+    "geography himalaya peninsula river ganga brahmaputra plateau coastal trade export import"
+).split()
+
+PATHS = ("vector", "hybrid", "query_memory", "agent_context", "course_index")
+
+# Cumulative statistics flush from other backends at most about once a second
+STATS_FLUSH_SECONDS = 1.1
+
+
+class Command(BaseCommand):
+    help = (
+        'Offline retrieval benchmark: builds a synthetic course corpus with the fake embedder and '
+        'reports latency, recall@k against an exact scan and Postgres buffer hits per retrieval path'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunks', type=int, default=1000, help='Synthetic chunks to generate (1k-1M)')
+        parser.add_argument('--words-per-chunk', type=int, default=120, help='Words per synthetic chunk')
+        parser.add_argument('--duplicate-rate', type=float, default=0.1,
+                            help='Fraction of chunks that are near-duplicates of an earlier chunk')
+        parser.add_argument('--course', type=str, default=None,
+                            help='Benchmark an existing (e.g. kept synthetic) course instead of generating one')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated course for later runs')
+        parser.add_argument('--queries', type=int, default=100, help='Queries per path')
+        parser.add_argument('--k', type=int, default=5, help='Results per query')
+        parser.add_argument('--paths', choices=PATHS, nargs='+', default=list(PATHS), help='Retrieval paths to run')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for corpus and queries')
+        parser.add_argument('--timeout-ms', type=int, default=60000,
+                            help='Lookup budget of the agent_context path (instead of RETRIEVAL_TIMEOUT_MS); '
+                                 'lookups exceeding it are reported as timeouts, not recall misses')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        # Query embeddings inside the retrieval paths come from the fake
+        # embedder too, so nothing leaves the machine
+        with override_settings(EMBEDDING_BACKEND="fake"):
+            if options['course']:
+                try:
+                    course = Course.objects.get(id=options['course'])
+                except Course.DoesNotExist:
+                    raise CommandError(f"Course '{options['course']}' does not exist")
+            else:
+                course = self._build_corpus(rng, options)
+
+            try:
+                self._run(course, rng, options)
+            finally:
+                if not options['course'] and not options['keep']:
+                    course.delete()
+                elif not options['course']:
+                    self.stdout.write(f"Kept synthetic course {course.id} (rerun with --course {course.id})")
+
+    def _build_corpus(self, rng: random.Random, options) -> Course:
+        chunks = options['chunks']
+        started = time.perf_counter()
+
+        course = Course.objects.create(name=f"Retrieval benchmark {uuid.uuid4().hex[:8]}", language="en")
+        memory = Memory.objects.create(
+            course=course,
+            name="Synthetic corpus",
+            type=MemoryType.DOCUMENT,
+            url="https://example.com/benchmark.pdf"
+        )
+        embedder = FakeEmbedder()
+
+        # Duplicates are drawn from the last 1000 chunks only, so only those are kept
+        texts = deque(maxlen=1000)
+        batch = []
+        for i in range(chunks):
+            if texts and rng.random() < options['duplicate_rate']:
+                # Same passage uploaded again, with a slightly different chunk boundary
+                words = rng.choice(texts).split()[1:]
+                words.append(rng.choice(WORDS))
+            else:
+                words = [rng.choice(WORDS) for _ in range(options['words_per_chunk'])]
+            # The chunk number keeps every text (and so every embedding) distinct
+            text = f"{i} " + " ".join(words)
+            texts.append(text)
+
+            batch.append(Document(
+                content=text,
+                page_number=i // 4 + 1,
+                memory=memory,
+                course=course,
+                **document_embedding_fields(embedder.embed_one(text))
+            ))
+            if len(batch) == 1000 or i == chunks - 1:
+                Document.objects.bulk_create(batch)
+                batch = []
+                self.stdout.write(f"\rInserted {i + 1}/{chunks} chunks", ending="")
+                self.stdout.flush()
+
+        self.stdout.write("")
+        update_search_vectors(Document.objects.filter(memory=memory), course.language)
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {Document._meta.db_table}")
+
+        self.stdout.write(f"Built corpus of {chunks} chunks in {time.perf_counter() - started:.1f}s")
+        return course
+
+    def _run(self, course: Course, rng: random.Random, options):
+        k = options['k']
+        documents = Document.objects.filter(course_id=course.id)
+        memory = Memory.objects.filter(course=course).first()
+        embedder = FakeEmbedder()
+
+        # Queries are word runs taken from stored chunks, so lexical search has
+        # something to match; their embeddings are unrelated to the chunk's, as
+        # with any query, and the exact scan defines the ground truth
+        samples = list(documents.order_by('?').values_list('content', flat=True)[:options['queries']])
+        if not samples:
+            raise CommandError("The course has no documents to benchmark")
+        queries = []
+        for content in samples:
+            words = content.split()[1:]
+            start = rng.randrange(max(1, len(words) - 6))
+            queries.append(" ".join(words[start:start + 6]))
+        query_embeddings = [embedder.embed_one(query) for query in queries]
+
+        truths = [
+            {row['content'] for row in exact_search_documents(documents, embedding, k=k, fields=('content',))}
+            for embedding in query_embeddings
+        ]
+
+        index = None
+        if 'course_index' in options['paths']:
+            started = time.perf_counter()
+            index = CourseEmbeddingIndex.load(course.id, get_index_version(course.id))
+            self.stdout.write(f"Loaded course index in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+        searches = {
+            'vector': lambda query, embedding: search_documents(documents, embedding, k=k, fields=('content',)),
+            'hybrid': lambda query, embedding: search_course(
+                course.id, query, embedding, language=course.language, k=k, fields=('content',)
+            ),
+            # Retrieval half of query_memory (the answer itself is generated by the LLM)
+            'query_memory': lambda query, embedding: search_memory(
+                memory.id, query, embedding, language=course.language, k=k
+            ),
+            'agent_context': lambda query, embedding: asyncio.run(
+                self._agent_context(course.id, query, k, options['timeout_ms'])
+            ),
+            'course_index': lambda query, embedding: index.search(embedding, k=k),
+        }
+
+        self.stdout.write(f"\n{documents.count()} chunks, {len(queries)} queries, k={k}")
+        self.stdout.write(
+            f"{'path':<14} {'recall@k':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+            f"{'hit ratio':>10} {'blks/query':>11} {'timeouts':>9}"
+        )
+        for path in options['paths']:
+            recalls = []
+            latencies = []
+            timeouts = 0
+            before = self._buffer_stats()
+            for query, embedding, truth in zip(queries, query_embeddings, truths):
+                started = time.perf_counter()
+                try:
+                    rows = searches[path](query, embedding)
+                except asyncio.TimeoutError:
+                    # Kept out of recall: an empty result here says nothing about ranking
+                    timeouts += 1
+                    continue
+                finally:
+                    latencies.append(time.perf_counter() - started)
+                if truth:
+                    recalls.append(len(truth & {row['content'] for row in rows}) / len(truth))
+            hits, reads = (after - start for after, start in zip(self._buffer_stats(), before))
+            self._write_row(
+                path, statistics.mean(recalls) if recalls else 0.0, latencies, hits, reads, len(queries), timeouts
+            )
+
+    @staticmethod
+    async def _agent_context(course_id, query: str, k: int, timeout_ms: int):
+        # Imported here: the pipecat agents app is only needed for this path
+        from pipecat_agents.services.agent_context import AgentContextService
+
+        # The live lookup without its empty-result fallback, so timeouts are counted
+        return await AgentContextService.search_course_chunks(str(course_id), query, k, timeout_ms)
+
+    @staticmethod
+    def _buffer_stats():
+        """Shared buffer hits and reads on the documents table, its indexes and TOAST."""
+        time.sleep(STATS_FLUSH_SECONDS)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_stat_clear_snapshot()")
+            cursor.execute(
+                "SELECT coalesce(heap_blks_hit, 0) + coalesce(idx_blks_hit, 0) "
+                "+ coalesce(toast_blks_hit, 0) + coalesce(tidx_blks_hit, 0), "
+                "coalesce(heap_blks_read, 0) + coalesce(idx_blks_read, 0) "
+                "+ coalesce(toast_blks_read, 0) + coalesce(tidx_blks_read, 0) "
+                "FROM pg_statio_user_tables WHERE relname = %s",
+                [Document._meta.db_table]
+            )
+            return cursor.fetchone() or (0, 0)
+
+    def _write_row(self, path, recall, latencies, hits, reads, queries, timeouts):
+        latencies_ms = sorted(latency * 1000 for latency in latencies)
+
+        def percentile(fraction):
+            return latencies_ms[min(len(latencies_ms) - 1, int(len(latencies_ms) * fraction))]
+
+        accessed = hits + reads
+        self.stdout.write(
+            f"{path:<14} {recall:>9.3f} {percentile(0.5):>9.2f} {percentile(0.95):>9.2f} {percentile(0.99):>9.2f} "
+            f"{hits / accessed if accessed else 0.0:>10.3f} {accessed / queries:>11.1f} {timeouts:>9}"
+        )
@@ -0,0 +1,163 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count
+
+from niva_app.models import Document
+from niva_app.services.embedding_cache import embed_query
+from niva_app.services.retrieval import (
+    CANDIDATE_FIELDS,
+    STORAGE_MODES,
+    exact_search_documents,
+    search_documents,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark recall@k and latency of the quantized/indexed vector search modes '
+        'against an exact full-precision scan'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--memory', type=str, default=None, help='Restrict the search to this memory ID')
+        parser.add_argument('--k', type=int, default=10, help='Results per query')
+        parser.add_argument('--queries', type=int, default=50,
+                            help='Number of stored chunk embeddings to sample as queries')
+        parser.add_argument('--query', type=str, nargs='*', default=[],
+                            help='Text queries to embed and use instead of sampled chunks')
+        parser.add_argument('--modes', choices=STORAGE_MODES, nargs='+', default=list(STORAGE_MODES),
+                            help='Storage modes to compare')
+        parser.add_argument('--filtered-memory', type=str, default=None,
+                            help='Memory for the filtered-search check (defaults to the smallest with at least k chunks)')
+
+    def handle(self, *args, **options):
+        k = options['k']
+        documents = Document.objects.all()
+        if options['memory']:
+            documents = documents.filter(memory_id=options['memory'])
+
+        if options['query']:
+            query_embeddings = [embed_query(text, task_type="RETRIEVAL_QUERY") for text in options['query']]
+        else:
+            query_embeddings = list(
+                documents.filter(embedding__isnull=False)
+                .order_by('?')
+                .values_list('embedding', flat=True)[:options['queries']]
+            )
+
+        if not query_embeddings:
+            self.stdout.write(self.style.WARNING("No documents with full-precision embeddings to benchmark against"))
+            return
+
+        self._report_storage()
+
+        truths = []
+        exact_latencies = []
+        for query_embedding in query_embeddings:
+            started = time.perf_counter()
+            rows = exact_search_documents(documents, query_embedding, k=k, fields=('id',))
+            exact_latencies.append(time.perf_counter() - started)
+            truths.append({row['id'] for row in rows})
+
+        self.stdout.write(f"\n{len(query_embeddings)} queries, k={k}")
+        self.stdout.write(f"{'mode':<10} {'rescore':>8} {'recall@k':>9} {'p50 ms':>9} {'p95 ms':>9}")
+        self._write_row('exact', '-', 1.0, exact_latencies)
+
+        for mode in options['modes']:
+            field = CANDIDATE_FIELDS[mode]
+            if not documents.filter(**{f"{field}__isnull": False}).exists():
+                self.stdout.write(self.style.WARNING(
+                    f"{mode:<10} skipped: {field} is empty, run backfill_reduced_embeddings --mode {mode}"
+                ))
+                continue
+
+            for rescore in (False, True):
+                recalls = []
+                latencies = []
+                for query_embedding, truth in zip(query_embeddings, truths):
+                    started = time.perf_counter()
+                    rows = search_documents(documents, query_embedding, k=k, fields=('id',), mode=mode, rescore=rescore)
+                    latencies.append(time.perf_counter() - started)
+                    if truth:
+                        recalls.append(len(truth & {row['id'] for row in rows}) / len(truth))
+                self._write_row(mode, 'yes' if rescore else 'no', statistics.mean(recalls) if recalls else 0.0, latencies)
+
+        if not options['memory']:
+            self._filtered_recall(options)
+
+    def _filtered_recall(self, options):
+        """
+        Recall of searches restricted to one memory. The HNSW index covers the
+        whole table, so a memory holding a small share of it is where filtered
+        searches lose rows.
+        """
+        k = options['k']
+        memory_id = options['filtered_memory']
+        if not memory_id:
+            memory_id = (
+                Document.objects.filter(embedding__isnull=False)
+                .values('memory_id')
+                .annotate(chunks=Count('id'))
+                .filter(chunks__gte=k)
+                .order_by('chunks')
+                .values_list('memory_id', flat=True)
+                .first()
+            )
+        if not memory_id:
+            self.stdout.write(self.style.WARNING(f"\nNo memory with {k} chunks for the filtered-search check"))
+            return
+
+        documents = Document.objects.filter(memory_id=memory_id)
+        query_embeddings = list(
+            documents.filter(embedding__isnull=False)
+            .order_by('?')
+            .values_list('embedding', flat=True)[:options['queries']]
+        )
+        truths = [
+            {row['id'] for row in exact_search_documents(documents, query_embedding, k=k, fields=('id',))}
+            for query_embedding in query_embeddings
+        ]
+
+        share = documents.count() / max(Document.objects.count(), 1)
+        self.stdout.write(f"\nFiltered to memory {memory_id} ({share:.2%} of documents), {len(query_embeddings)} queries")
+        self.stdout.write(f"{'mode':<10} {'short':>8} {'recall@k':>9} {'p50 ms':>9} {'p95 ms':>9}")
+        for mode in options['modes']:
+            if not documents.filter(**{f"{CANDIDATE_FIELDS[mode]}__isnull": False}).exists():
+                continue
+            recalls = []
+            latencies = []
+            short = 0
+            for query_embedding, truth in zip(query_embeddings, truths):
+                started = time.perf_counter()
+                rows = search_documents(documents, query_embedding, k=k, fields=('id',), mode=mode)
+                latencies.append(time.perf_counter() - started)
+                short += len(rows) < len(truth)
+                if truth:
+                    recalls.append(len(truth & {row['id'] for row in rows}) / len(truth))
+            # "short" counts queries that returned fewer rows than exist
+            self._write_row(mode, str(short), statistics.mean(recalls) if recalls else 0.0, latencies)
+
+    def _write_row(self, mode, rescore, recall, latencies):
+        latencies_ms = sorted(latency * 1000 for latency in latencies)
+        p95 = latencies_ms[min(len(latencies_ms) - 1, int(len(latencies_ms) * 0.95))]
+        self.stdout.write(
+            f"{mode:<10} {rescore:>8} {recall:>9.3f} {statistics.median(latencies_ms):>9.1f} {p95:>9.1f}"
+        )
+
+    def _report_storage(self):
+        columns = ['embedding', *CANDIDATE_FIELDS.values()]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT count(*), "
+                + ", ".join(f"avg(pg_column_size({column}))" for column in columns)
+                + f", pg_total_relation_size('{Document._meta.db_table}') FROM {Document._meta.db_table}"
+            )
+            row = cursor.fetchone()
+
+        self.stdout.write(f"{row[0]} documents, table size {row[-1] / (1024 * 1024):.1f} MB (including TOAST and indexes)")
+        for column, avg_size in zip(columns, row[1:-1]):
+            if avg_size:
+                self.stdout.write(f"  {column:<20} {float(avg_size):>8.0f} bytes/row")
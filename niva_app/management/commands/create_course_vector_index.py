@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from niva_app.models import Course, Document
+from niva_app.services.retrieval import (
+    CANDIDATE_FIELDS,
+    CANDIDATE_OPCLASSES,
+    STORAGE_MODES,
+    get_storage_mode,
+)
+
+
+def course_index_name(course_id, mode: str) -> str:
+    # Postgres identifiers are limited to 63 characters
+    return f"documents_hnsw_{mode}_{str(course_id).replace('-', '')}"
+
+
+class Command(BaseCommand):
+    help = (
+        "Create (or drop) a partial HNSW index over one course's documents, so course-scoped "
+        "vector searches only traverse that course's rows"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('course_id', type=str, help='Course to index')
+        parser.add_argument('--mode', choices=STORAGE_MODES, default=None,
+                            help='Storage mode whose candidate column is indexed (defaults to EMBEDDING_STORAGE_MODE)')
+        parser.add_argument('--drop', action='store_true', help='Drop the course index instead')
+
+    def handle(self, *args, **options):
+        try:
+            course = Course.objects.get(id=options['course_id'])
+        except (Course.DoesNotExist, ValueError):
+            raise CommandError(f"Course '{options['course_id']}' does not exist")
+
+        mode = get_storage_mode(options['mode'])
+        name = course_index_name(course.id, mode)
+        table = Document._meta.db_table
+
+        # CONCURRENTLY keeps the table writable while the index is built; it
+        # cannot run inside a transaction, which management commands are not
+        with connection.cursor() as cursor:
+            if options['drop']:
+                cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+                self.stdout.write(self.style.SUCCESS(f"Dropped {name}"))
+                return
+
+            cursor.execute(
+                f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" ON "{table}" '
+                f'USING hnsw ("{CANDIDATE_FIELDS[mode]}" {CANDIDATE_OPCLASSES[mode]}) '
+                f'WITH (m = 16, ef_construction = 64) '
+                f"WHERE course_id = '{course.id}'"
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {name} over {Document.objects.filter(course=course).count()} documents of {course.name}"
+        ))
@@ -0,0 +1,221 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from niva_app.lib.utils import FileType, FileTypeInfo
+from niva_app.models import Course, IngestionJob, IngestionStatus, Memory
+from niva_app.services.agent_memory import MemoryService
+from niva_app.services.embedding_cache import get_embedding_engine
+from niva_app.services.s3_storage import S3StorageService
+from niva_app.services.upload_buffer import BufferedUpload
+
+S3_SCHEME = "s3://"
+# Statuses a job leaves only by finishing; any other means its run was interrupted
+FINISHED_STATUSES = (IngestionStatus.INDEXED, IngestionStatus.FAILED)
+
+
+class Checkpoint:
+    """
+    Per-file progress of a corpus ingestion run, persisted as JSON after every file.
+
+    Entries are keyed by the file's path (relative to the source directory) or
+    S3 key, and hold its status, memory id and throughput figures.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)
+
+    def get(self, key: str) -> dict:
+        return self.entries.get(key, {})
+
+    def update(self, key: str, **values):
+        with self.lock:
+            self.entries.setdefault(key, {}).update(values)
+            # Write-then-rename so an interrupted run never leaves a truncated file
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump(self.entries, f, indent=2)
+            os.replace(temp_path, self.path)
+
+
+class Command(BaseCommand):
+    help = (
+        'Ingest every PDF in a local directory or S3 prefix (s3://<prefix>) into a course, '
+        'with parallel workers and a resumable checkpoint'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('course_id', type=str, help='UUID of the course to ingest into')
+        parser.add_argument('source', type=str, help='Local directory, or s3://<prefix> in the configured bucket')
+        parser.add_argument('--workers', type=int, default=4, help='Files ingested in parallel')
+        parser.add_argument('--embedding-concurrency', type=int, default=None,
+                            help='Concurrent embedding requests per file (defaults to EMBEDDING_MAX_CONCURRENCY)')
+        parser.add_argument('--checkpoint', type=str, default=None,
+                            help='Checkpoint file (defaults to .ingest-<course_id>.json in the current directory)')
+        parser.add_argument('--retry-failed', action='store_true', help='Retry files that failed in a previous run')
+
+    def handle(self, *args, **options):
+        try:
+            course = Course.objects.get(id=options['course_id'])
+        except (Course.DoesNotExist, ValueError):
+            raise CommandError(f"Course with ID '{options['course_id']}' does not exist.")
+
+        source = options['source']
+        self.storage_service = S3StorageService()
+        self.embedding_concurrency = options['embedding_concurrency']
+        files = self._list_files(source)
+
+        checkpoint = Checkpoint(options['checkpoint'] or f".ingest-{course.id}.json")
+        skip_statuses = {IngestionStatus.INDEXED} if options['retry_failed'] else {
+            IngestionStatus.INDEXED, IngestionStatus.FAILED
+        }
+        pending = [key for key in files if checkpoint.get(key).get('status') not in skip_statuses]
+
+        self.stdout.write(
+            f"{len(files)} PDFs found, {len(files) - len(pending)} already done, "
+            f"{len(pending)} to ingest with {options['workers']} workers (checkpoint: {checkpoint.path})"
+        )
+
+        started = time.perf_counter()
+        totals = {'files': 0, 'failed': 0, 'pages': 0, 'chunks': 0}
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            futures = {
+                pool.submit(self._ingest_file, course, source, key, checkpoint): key
+                for key in pending
+            }
+            for future in as_completed(futures):
+                key = futures[future]
+                entry = future.result()
+                if entry['status'] == IngestionStatus.INDEXED:
+                    totals['files'] += 1
+                    totals['pages'] += entry['pages']
+                    totals['chunks'] += entry['chunks']
+                    seconds = entry['seconds']
+                    self.stdout.write(
+                        f"  {key}: {entry['pages']} pages, {entry['chunks']} chunks in {seconds:.1f}s "
+                        f"({entry['pages'] / seconds:.1f} pages/s, {entry['chunks'] / seconds:.1f} chunks/s)"
+                    )
+                else:
+                    totals['failed'] += 1
+                    self.stdout.write(self.style.ERROR(f"  {key}: failed - {entry['error']}"))
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Ingested {totals['files']} files ({totals['failed']} failed): {totals['pages']} pages, "
+            f"{totals['chunks']} chunks in {elapsed:.1f}s "
+            f"({totals['pages'] / elapsed if elapsed else 0:.1f} pages/s, "
+            f"{totals['chunks'] / elapsed if elapsed else 0:.1f} chunks/s)"
+        ))
+
+    def _list_files(self, source: str) -> list:
+        if source.startswith(S3_SCHEME):
+            keys = self.storage_service.list_files(prefix=source[len(S3_SCHEME):])
+        elif os.path.isdir(source):
+            keys = [
+                os.path.relpath(os.path.join(root, filename), source)
+                for root, _, filenames in os.walk(source)
+                for filename in filenames
+            ]
+        else:
+            raise CommandError(f"Source '{source}' is not a directory or an s3:// prefix")
+
+        return sorted(key for key in keys if FileTypeInfo.get_file_type(key) == FileType.PDF)
+
+    def _discard_interrupted_job(self, service: MemoryService, job_id: str, key: str):
+        """
+        Delete the incomplete memory and S3 object left by an interrupted run
+        of a file. The memory's chunks are still in the embedding cache, so
+        redoing the file does not re-embed them.
+        """
+        job = (
+            IngestionJob.objects
+            .filter(id=job_id, course=service.course)
+            .exclude(status__in=FINISHED_STATUSES)
+            .select_related('memory')
+            .first()
+        )
+        if job is None:
+            return
+
+        memory = job.memory
+        if memory and memory.url == key:
+            # Ingested before corpus objects were copied: the memory references
+            # the source object itself, which must survive
+            Memory.objects.filter(id=memory.id).delete()
+        elif memory:
+            service.delete_memory(memory.id)
+        elif job.s3_key and job.s3_key != key:
+            # Copied or uploaded, but interrupted before its memory was created
+            service.storage_service.delete_file(job.s3_key)
+
+    def _ingest_file(self, course: Course, source: str, key: str, checkpoint: Checkpoint) -> dict:
+        """
+        Ingest one file through an IngestionJob and record the outcome in the checkpoint.
+        """
+        try:
+            name = os.path.splitext(os.path.basename(key))[0]
+            service = MemoryService(
+                course,
+                embedding_engine=get_embedding_engine(max_concurrency=self.embedding_concurrency)
+            )
+
+            previous_job_id = checkpoint.get(key).get('job_id')
+            if previous_job_id:
+                self._discard_interrupted_job(service, previous_job_id, key)
+
+            upload = None
+            if source.startswith(S3_SCHEME):
+                # Already in S3: copy it server-side rather than re-uploading it.
+                # The memory owns (and on deletion removes) its object, so it
+                # must not point at the corpus itself
+                job = IngestionJob.objects.create(
+                    course=course, name=name, s3_key=service.copy_s3_file(key), status=IngestionStatus.UPLOADED
+                )
+            else:
+                job = IngestionJob.objects.create(course=course, name=name, status=IngestionStatus.QUEUED)
+                with open(os.path.join(source, key), 'rb') as f:
+                    upload = BufferedUpload(
+                        s3_key=service.build_s3_key(f),
+                        content=f.read(),
+                        content_type='application/pdf'
+                    )
+
+            checkpoint.update(key, status=IngestionStatus.EMBEDDING, job_id=str(job.id))
+            started = time.perf_counter()
+
+            try:
+                memory = service.run_ingestion_job(job, upload=upload)
+            except Exception as e:
+                checkpoint.update(key, status=IngestionStatus.FAILED, error=str(e))
+                return checkpoint.get(key)
+
+            job.refresh_from_db()
+            checkpoint.update(
+                key,
+                status=IngestionStatus.INDEXED,
+                memory_id=str(memory.id),
+                pages=job.total_pages,
+                chunks=job.total_chunks,
+                seconds=time.perf_counter() - started,
+                error=None
+            )
+            return checkpoint.get(key)
+
+        except Exception as e:
+            checkpoint.update(key, status=IngestionStatus.FAILED, error=str(e))
+            return checkpoint.get(key)
+
+        finally:
+            # Each worker thread opens its own database connection
+            connection.close()
@@ -1,21 +1,25 @@
-from django.core.management.base import BaseCommand
-from django.db import connection
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
 from django.db.models import F
 from django.db.models.expressions import RawSQL
 from django.db.models.functions import Cast
 from django.db.models import FloatField
-from pgvector.django import CosineDistance
 
 from niva_app.models.memory import Memory
 from niva_app.models.rag import Document
-from google import genai
+from google.genai import types
 from pydantic import BaseModel, Field
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+import json
+import sys
+import time
 import uuid
 import os
-from app import config
-
-gemini_client=genai.Client(api_key=config.GOOGLE_GEMINI_API_KEY)
+from niva_app.lib.llm_gateway import generate_content
+from niva_app.services.embedding_cache import embed_query
+from niva_app.services.retrieval import search_memory
 
 class SearchResult(BaseModel):
     content: str = Field(..., description="The content of the search result")
@@ -54,45 +58,49 @@ def inspect_memory(memory_id: str):
             print("---")
 
 
-def query_memory(query: str, memory_id: str, k: int = 5) -> QueryResponse:
+@dataclass
+class QueryRun:
+    response: QueryResponse
+    documents: List[dict]
+    # Milliseconds per stage: embed, search, generate
+    timings: Dict[str, float] = field(default_factory=dict)
+
+
+def run_query(query: str, memory_id: str, k: int = 5, language: Optional[str] = None) -> QueryRun:
     """
-    Query documents using vector similarity search with Django ORM.
-    Using the pgvector <=> operator for cosine similarity.
+    Answer a query from a memory's documents, timing each stage.
+
+    Documents are found with hybrid search: full-text rank (GIN index on the
+    search vector) fused with vector similarity (HNSW index on the reduced
+    embedding). The answer is generated from the retrieved chunks only.
     """
-    query_embedding = gemini_client.models.embed_content(
-        model="gemini-embedding-exp-03-07",
-        contents=query,
-        config=types.EmbedContentConfig(task_type="RETRIEVAL_QUERY")
-    )
+    timings = {}
 
-    similar_docs = (
-        Document.objects
-        .filter(memory_id=memory_id)
-        .annotate(
-            similarity=1 - CosineDistance(
-                "embedding",
-                query_embedding
-            )
-        )
-        .order_by("-similarity")  # Order by highest similarity first
-        .values('content', 'created_at', 'similarity')
-        [:k]
-    )
+    started = time.perf_counter()
+    query_embedding = embed_query(query, task_type="RETRIEVAL_QUERY")
+    timings["embed"] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    similar_docs = search_memory(memory_id, query, query_embedding, language=language, k=k)
+    timings["search"] = (time.perf_counter() - started) * 1000
 
     if not similar_docs:
-        print(f"No documents found for query: '{query}' in memory: '{memory_id}'")
-        print("Inspecting memory:")
-        inspect_memory(memory_id)
-        return QueryResponse(
-            answer="No information found.",
-            explanation="The search did not return any relevant documents for this query. The memory may be empty or not contain relevant information.",
-            confidence=0.0
+        return QueryRun(
+            response=QueryResponse(
+                answer="No information found.",
+                explanation="The search did not return any relevant documents for this query. The memory may be empty or not contain relevant information.",
+                confidence=0.0
+            ),
+            documents=[],
+            timings=timings
         )
 
     results = [
         SearchResult(
             content=doc['content'],
-            relevance=doc['similarity']
+            # Fused scores are only comparable within one result list, so
+            # express them relative to the best match
+            relevance=doc['score'] / similar_docs[0]['score']
         )
         for doc in similar_docs
     ]
@@ -117,7 +125,8 @@ def query_memory(query: str, memory_id: str, k: int = 5) -> QueryResponse:
     6. Assign a confidence score (0-1) to your answer based on how well the search results support it.
     """
 
-    response = client.models.generate_content(
+    started = time.perf_counter()
+    response = generate_content(
         model="gemini-2.0-flash",
         config=types.GenerateContentConfig(
             system_instruction="You are a helpful assistant that answers queries based strictly on the given search results. You do not make up information or use external knowledge. If the search results are insufficient to answer the query, you clearly state this.",
@@ -126,17 +135,49 @@ def query_memory(query: str, memory_id: str, k: int = 5) -> QueryResponse:
         ),
         contents=prompt
     )
+    timings["generate"] = (time.perf_counter() - started) * 1000
+
+    parsed = response.parsed if isinstance(response.parsed, QueryResponse) else QueryResponse.model_validate_json(response.text)
+    return QueryRun(response=parsed, documents=similar_docs, timings=timings)
+
+
+def query_memory(query: str, memory_id: str, k: int = 5, language: Optional[str] = None) -> QueryResponse:
+    """
+    Answer a query from a memory's documents (see `run_query`).
+    """
+    run = run_query(query, memory_id, k=k, language=language)
 
-    return response
+    if not run.documents:
+        print(f"No documents found for query: '{query}' in memory: '{memory_id}'")
+        print("Inspecting memory:")
+        inspect_memory(memory_id)
+
+    return run.response
 
 
 class Command(BaseCommand):
-    help = 'Query a memory and its associated documents using memory ID'
+    help = (
+        'Query a memory and its associated documents using memory ID, interactively or '
+        'in batch from a JSONL file of queries'
+    )
 
     def add_arguments(self, parser):
-        parser.add_argument('memory_id', type=str, help='UUID of the memory to query')
+        parser.add_argument('memory_id', type=str, nargs='?', default=None,
+                            help='UUID of the memory to query (optional in batch mode if every line has one)')
+        parser.add_argument('--input', type=str, default=None,
+                            help='JSONL file of queries ({"query": ..., "memory_id": ..., "id": ...} per line)')
+        parser.add_argument('--output', type=str, default='-', help='JSONL results file (defaults to stdout)')
+        parser.add_argument('--concurrency', type=int, default=4, help='Queries run at once in batch mode')
+        parser.add_argument('--k', type=int, default=5, help='Chunks retrieved per query')
 
     def handle(self, *args, **options):
+        if options['input']:
+            self._run_batch(options)
+            return
+
+        if not options['memory_id']:
+            raise CommandError("A memory ID is required in interactive mode")
+
         try:
             memory_id = uuid.UUID(options['memory_id'])
         except ValueError:
@@ -177,7 +218,7 @@ class Command(BaseCommand):
                 break
 
             try:
-                query_response = query_memory(query, str(memory.id))
+                query_response = query_memory(query, str(memory.id), language=memory.course.language)
                 self.stdout.write(self.style.SUCCESS(f"Query Results:"))
                 self.stdout.write(f"Answer: {query_response.answer}")
                 self.stdout.write(f"Explanation: {query_response.explanation}")
@@ -189,4 +230,78 @@ class Command(BaseCommand):
                 import traceback
                 self.stdout.write(traceback.format_exc())
 
-        self.stdout.write(self.style.SUCCESS("Query session ended."))
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS("Query session ended."))
+
+    def _run_batch(self, options):
+        with open(options['input'], encoding='utf-8') as input_file:
+            requests = [json.loads(line) for line in input_file if line.strip()]
+
+        for line_number, request in enumerate(requests, 1):
+            request.setdefault('memory_id', options['memory_id'])
+            if not request.get('query') or not request['memory_id']:
+                raise CommandError(f"Line {line_number} needs a query and a memory_id (or pass one as an argument)")
+
+        # Malformed ids fail their own line instead of the whole lookup
+        memory_ids = {}
+        for request in requests:
+            try:
+                memory_ids[str(request['memory_id'])] = str(uuid.UUID(str(request['memory_id'])))
+            except ValueError:
+                memory_ids[str(request['memory_id'])] = None
+
+        languages = dict(
+            Memory.objects
+            .filter(id__in={memory_id for memory_id in memory_ids.values() if memory_id})
+            .values_list('id', 'course__language')
+        )
+        languages = {str(memory_id): language for memory_id, language in languages.items()}
+
+        def evaluate(request):
+            started = time.perf_counter()
+            result = {
+                'id': request.get('id'),
+                'query': request['query'],
+                'memory_id': request['memory_id'],
+            }
+            try:
+                memory_id = memory_ids[str(request['memory_id'])]
+                if memory_id is None:
+                    raise ValueError(f"Invalid memory ID format '{request['memory_id']}', expected a UUID")
+                if memory_id not in languages:
+                    raise ValueError(f"Memory '{request['memory_id']}' does not exist")
+                run = run_query(
+                    request['query'], memory_id, k=options['k'],
+                    language=languages[memory_id]
+                )
+                result.update({
+                    'chunks': [
+                        {'id': str(doc['id']), 'score': doc['score'], 'similarity': doc['similarity']}
+                        for doc in run.documents
+                    ],
+                    'answer': run.response.answer,
+                    'explanation': run.response.explanation,
+                    'confidence': run.response.confidence,
+                    'timings_ms': {stage: round(ms, 1) for stage, ms in run.timings.items()},
+                })
+            except Exception as e:
+                result['error'] = str(e)
+            finally:
+                # Pool threads keep their own connections between queries
+                close_old_connections()
+            result.setdefault('timings_ms', {})['total'] = round((time.perf_counter() - started) * 1000, 1)
+            return result
+
+        output = sys.stdout if options['output'] == '-' else open(options['output'], 'w', encoding='utf-8')
+        failed = 0
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, options['concurrency'])) as pool:
+                # map keeps results in input order
+                for result in pool.map(evaluate, requests):
+                    failed += 'error' in result
+                    output.write(json.dumps(result, ensure_ascii=False) + '\n')
+                    output.flush()
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+        self.stderr.write(f"Ran {len(requests)} queries, {failed} failed")
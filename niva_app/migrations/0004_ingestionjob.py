@@ -0,0 +1,37 @@
+# Generated by Django 5.2.1 on 2026-10-15 18:17
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('niva_app', '0003_student_user'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestionJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('name', models.CharField(help_text='Name of the memory source', max_length=255)),
+                ('s3_key', models.CharField(help_text='S3 key of the uploaded file', max_length=1024)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('uploaded', 'Uploaded'), ('extracted', 'Extracted'), ('embedding', 'Embedding'), ('indexed', 'Indexed'), ('failed', 'Failed')], default='queued', help_text='Current ingestion stage', max_length=20)),
+                ('total_chunks', models.PositiveIntegerField(default=0, help_text='Number of chunks extracted from the document')),
+                ('embedded_chunks', models.PositiveIntegerField(default=0, help_text='Number of chunks embedded so far')),
+                ('error', models.TextField(blank=True, help_text='Error message if the job failed')),
+                ('started_at', models.DateTimeField(blank=True, help_text='When the worker picked up the job', null=True)),
+                ('finished_at', models.DateTimeField(blank=True, help_text='When the job finished (indexed or failed)', null=True)),
+                ('course', models.ForeignKey(help_text='Course the document is being added to', on_delete=django.db.models.deletion.CASCADE, related_name='ingestion_jobs', to='niva_app.course')),
+                ('memory', models.ForeignKey(blank=True, help_text='Memory created for the document', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ingestion_jobs', to='niva_app.memory')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['course'], name='niva_app_in_course__99116b_idx'), models.Index(fields=['status'], name='niva_app_in_status_233464_idx')],
+            },
+        ),
+    ]
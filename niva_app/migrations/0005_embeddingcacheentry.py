@@ -0,0 +1,31 @@
+# Generated by Django 5.2.1 on 2026-10-15 18:20
+
+import pgvector.django.vector
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('niva_app', '0004_ingestionjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmbeddingCacheEntry',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('model', models.CharField(max_length=100)),
+                ('task_type', models.CharField(blank=True, default='', max_length=50)),
+                ('content_hash', models.CharField(max_length=64)),
+                ('embedding', pgvector.django.vector.VectorField()),
+            ],
+            options={
+                'db_table': 'embedding_cache',
+                'constraints': [models.UniqueConstraint(fields=('model', 'task_type', 'content_hash'), name='unique_embedding_cache_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-15 18:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('niva_app', '0005_embeddingcacheentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingestionjob',
+            name='processed_pages',
+            field=models.PositiveIntegerField(default=0, help_text='Number of pages extracted so far'),
+        ),
+        migrations.AddField(
+            model_name='ingestionjob',
+            name='total_pages',
+            field=models.PositiveIntegerField(default=0, help_text='Number of pages in the document'),
+        ),
+    ]
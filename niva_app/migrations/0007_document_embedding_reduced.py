@@ -0,0 +1,24 @@
+# Generated by Django 5.2.1 on 2026-10-15 18:24
+
+import pgvector.django.indexes
+import pgvector.django.vector
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('niva_app', '0006_ingestionjob_pages'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='embedding_reduced',
+            field=pgvector.django.vector.VectorField(blank=True, dimensions=1536, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=pgvector.django.indexes.HnswIndex(ef_construction=64, fields=['embedding_reduced'], m=16, name='documents_embedding_hnsw', opclasses=['vector_cosine_ops']),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.1 on 2026-10-15 18:26
+
+import pgvector.django.bit
+import pgvector.django.halfvec
+import pgvector.django.indexes
+import pgvector.django.vector
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('niva_app', '0007_document_embedding_reduced'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='embedding_binary',
+            field=pgvector.django.bit.BitField(blank=True, length=3072, null=True),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='embedding_half',
+            field=pgvector.django.halfvec.HalfVectorField(blank=True, dimensions=3072, null=True),
+        ),
+        migrations.AlterField(
+            model_name='document',
+            name='embedding',
+            field=pgvector.django.vector.VectorField(blank=True, dimensions=3072, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=pgvector.django.indexes.HnswIndex(ef_construction=64, fields=['embedding_half'], m=16, name='documents_embedding_half_hnsw', opclasses=['halfvec_cosine_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=pgvector.django.indexes.HnswIndex(ef_construction=64, fields=['embedding_binary'], m=16, name='documents_embedding_bin_hnsw', opclasses=['bit_hamming_ops']),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.1 on 2026-10-15 18:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('niva_app', '0008_document_quantized_embeddings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='ingestionjob',
+            name='deleted_chunks',
+            field=models.PositiveIntegerField(default=0, help_text='Chunks removed from the previous version'),
+        ),
+        migrations.AddField(
+            model_name='ingestionjob',
+            name='operation',
+            field=models.CharField(choices=[('create', 'Create'), ('update', 'Update')], default='create', help_text='Whether the job creates a new memory or updates one', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='ingestionjob',
+            name='reused_chunks',
+            field=models.PositiveIntegerField(default=0, help_text='Unchanged chunks kept from the previous version'),
+        ),
+        migrations.AlterField(
+            model_name='ingestionjob',
+            name='embedded_chunks',
+            field=models.PositiveIntegerField(default=0, help_text='Number of chunks embedded (or reused) so far'),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['memory', 'content_hash'], name='documents_memory__354e43_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.1 on 2026-10-15 19:05
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def build_search_vectors(apps, schema_editor):
+    Course = apps.get_model('niva_app', 'Course')
+    Document = apps.get_model('niva_app', 'Document')
+    configs = {'en': 'english'}
+    for course in Course.objects.only('id', 'language'):
+        Document.objects.filter(memory__course_id=course.id).update(
+            search_vector=django.contrib.postgres.search.SearchVector(
+                'content', config=configs.get(course.language, 'simple')
+            )
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('niva_app', '0010_document_chunk_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='documents_search_vector_gin'),
+        ),
+        migrations.RunPython(build_search_vectors, migrations.RunPython.noop),
+    ]
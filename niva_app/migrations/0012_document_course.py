@@ -0,0 +1,34 @@
+# Generated by Django 5.2.1 on 2026-10-15 19:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_course(apps, schema_editor):
+    Document = apps.get_model('niva_app', 'Document')
+    Memory = apps.get_model('niva_app', 'Memory')
+    Document.objects.filter(course__isnull=True).update(
+        course_id=models.Subquery(
+            Memory.objects.filter(id=models.OuterRef('memory_id')).values('course_id')[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('niva_app', '0011_document_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='course',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='documents', to='niva_app.course'),
+        ),
+        migrations.RunPython(backfill_course, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['course', 'memory'], name='documents_course__58c88a_idx'),
+        ),
+    ]
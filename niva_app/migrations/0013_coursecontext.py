@@ -0,0 +1,31 @@
+# Generated by Django 5.2.1 on 2026-10-15 19:55
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('niva_app', '0012_document_course'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseContext',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('version', models.CharField(max_length=64)),
+                ('content', models.TextField(blank=True)),
+                ('agent', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='course_contexts', to='niva_app.agent')),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='contexts', to='niva_app.course')),
+            ],
+            options={
+                'db_table': 'course_contexts',
+                'constraints': [models.UniqueConstraint(fields=('course', 'agent'), name='unique_course_context')],
+            },
+        ),
+    ]
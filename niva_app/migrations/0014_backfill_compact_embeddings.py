@@ -0,0 +1,56 @@
+import numpy as np
+from django.db import migrations
+
+BATCH_SIZE = 500
+
+# Dimensions of embedding_reduced when this migration was written
+REDUCED_DIMENSIONS = 1536
+
+
+def reduce_embedding(embedding):
+    # Matryoshka truncation re-normalized to unit length, as in
+    # niva_app.lib.embeddings at the time (copied so the migration does not
+    # depend on app code that changes, or configures API clients, on import)
+    vector = np.asarray(embedding, dtype=np.float32)[:REDUCED_DIMENSIONS]
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector = vector / norm
+    return vector.tolist()
+
+
+def backfill_reduced_embeddings(apps, schema_editor):
+    """
+    Fill embedding_reduced, the column searched in the default (full) storage
+    mode, for documents stored before it existed, which vector search would
+    skip. The halfvec and binary columns are filled by the
+    `backfill_reduced_embeddings --mode` command when switching modes.
+    """
+    Document = apps.get_model('niva_app', 'Document')
+
+    documents = Document.objects.filter(embedding__isnull=False, embedding_reduced__isnull=True)
+    last_id = None
+    while True:
+        batch_query = documents.order_by('id')
+        if last_id is not None:
+            batch_query = batch_query.filter(id__gt=last_id)
+        batch = list(batch_query.only('id', 'embedding')[:BATCH_SIZE])
+        if not batch:
+            break
+
+        for document in batch:
+            document.embedding_reduced = reduce_embedding(document.embedding)
+        Document.objects.bulk_update(batch, ['embedding_reduced'])
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+    # Batches commit as they go, so a large table isn't backfilled in one transaction
+    atomic = False
+
+    dependencies = [
+        ('niva_app', '0013_coursecontext'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_reduced_embeddings, migrations.RunPython.noop),
+    ]
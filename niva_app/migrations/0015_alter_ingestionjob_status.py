@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-15 21:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('niva_app', '0014_backfill_compact_embeddings'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ingestionjob',
+            name='status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('uploaded', 'Uploaded'), ('embedding', 'Embedding'), ('indexed', 'Indexed'), ('failed', 'Failed')], default='queued', help_text='Current ingestion stage', max_length=20),
+        ),
+    ]
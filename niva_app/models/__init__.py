@@ -8,6 +8,9 @@ from .course import Course
 from .dailycalls import DailyCall
 from .dailyrooms import DailyRooms
 from .feedback import Feedback
+from .ingestion import IngestionJob, IngestionOperation, IngestionStatus
+from .embedding_cache import EmbeddingCacheEntry
+from .course_context import CourseContext
 
 # Make all models available at the package level
 __all__ = [
@@ -25,4 +28,9 @@ __all__ = [
     'DailyCall',
     'DailyRooms',
     'Feedback',
+    'IngestionJob',
+    'IngestionOperation',
+    'IngestionStatus',
+    'EmbeddingCacheEntry',
+    'CourseContext',
 ]
\ No newline at end of file
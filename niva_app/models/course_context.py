@@ -0,0 +1,26 @@
+from django.db import models
+from niva_app.models.base import TimestampBase
+
+class CourseContext(TimestampBase):
+    """
+    Precomputed interview context extracted from a course's documents for one agent.
+
+    Regenerated in the background when the course or the memories visible to
+    the agent change, so starting a call only reads this row.
+
+    Fields:
+        course (ForeignKey): Course the context was extracted from
+        agent (ForeignKey): Agent whose visible memories were used
+        version (CharField): Hash of the course and memory state the context was built from
+        content (TextField): Extracted course context
+    """
+    course = models.ForeignKey('niva_app.Course', on_delete=models.CASCADE, related_name='contexts')
+    agent = models.ForeignKey('niva_app.Agent', on_delete=models.CASCADE, related_name='course_contexts')
+    version = models.CharField(max_length=64)
+    content = models.TextField(blank=True)
+
+    class Meta:
+        db_table = 'course_contexts'
+        constraints = [
+            models.UniqueConstraint(fields=['course', 'agent'], name='unique_course_context'),
+        ]
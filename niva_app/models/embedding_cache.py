@@ -0,0 +1,31 @@
+from django.db import models
+from niva_app.models.base import TimestampBase
+from pgvector.django import VectorField
+
+class EmbeddingCacheEntry(TimestampBase):
+    """
+    Content-addressed cache of embeddings.
+
+    Entries are keyed by (embedding model, task type, SHA-256 of the normalized
+    chunk text), so identical chunks uploaded to different courses are only
+    embedded once.
+
+    Fields:
+        model (CharField): Embedding model that produced the vector
+        task_type (CharField): Provider task type used for the embedding (blank for none)
+        content_hash (CharField): SHA-256 hex digest of the normalized text
+        embedding (VectorField): Cached embedding
+    """
+    model = models.CharField(max_length=100)
+    task_type = models.CharField(max_length=50, blank=True, default="")
+    content_hash = models.CharField(max_length=64)
+    embedding = VectorField()
+
+    class Meta:
+        db_table = 'embedding_cache'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['model', 'task_type', 'content_hash'],
+                name='unique_embedding_cache_key'
+            ),
+        ]
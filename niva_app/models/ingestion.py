@@ -0,0 +1,152 @@
+from niva_app.models.base import TimestampBase
+from django.db import models
+from django.db.models import CASCADE, SET_NULL
+
+class IngestionStatus(models.TextChoices):
+    QUEUED = "queued", "Queued"
+    UPLOADED = "uploaded", "Uploaded"
+    EMBEDDING = "embedding", "Embedding"
+    INDEXED = "indexed", "Indexed"
+    FAILED = "failed", "Failed"
+
+class IngestionOperation(models.TextChoices):
+    CREATE = "create", "Create"
+    UPDATE = "update", "Update"
+
+class IngestionJob(TimestampBase):
+    """
+    Tracks a background document-ingestion job for a course memory.
+
+    A job is created when a document is uploaded and is advanced by the
+    Celery worker through the ingestion stages:
+    queued -> uploaded -> embedding -> indexed (or failed).
+    Pages are extracted while earlier chunks are embedded, so extraction is
+    not a separate status; its progress is `processed_pages`.
+
+    Update jobs replace the document of an existing memory; only chunks whose
+    content changed are embedded and inserted, and removed chunks are deleted.
+
+    Fields:
+        course (ForeignKey): Course the document is being added to
+        memory (ForeignKey): Memory created for the document (set once processing starts),
+            or the memory being updated
+        operation (CharField): Whether the job creates a new memory or updates one
+        name (CharField): Name of the memory source
+        s3_key (CharField): S3 key of the uploaded file
+        status (CharField): Current ingestion stage
+        total_pages (IntegerField): Number of pages in the document
+        processed_pages (IntegerField): Number of pages extracted so far
+        total_chunks (IntegerField): Number of chunks extracted so far
+        embedded_chunks (IntegerField): Number of chunks embedded (or reused) so far
+        reused_chunks (IntegerField): Unchanged chunks kept from the previous version (updates only)
+        deleted_chunks (IntegerField): Chunks removed from the previous version (updates only)
+        error (TextField): Error message if the job failed
+        started_at (DateTimeField): When the worker picked up the job
+        finished_at (DateTimeField): When the job was indexed or failed
+    """
+
+    course = models.ForeignKey(
+        'niva_app.Course',
+        on_delete=CASCADE,
+        related_name="ingestion_jobs",
+        help_text="Course the document is being added to"
+    )
+
+    memory = models.ForeignKey(
+        'niva_app.Memory',
+        on_delete=SET_NULL,
+        related_name="ingestion_jobs",
+        null=True,
+        blank=True,
+        help_text="Memory created for the document"
+    )
+
+    operation = models.CharField(
+        choices=IngestionOperation.choices,
+        default=IngestionOperation.CREATE,
+        max_length=20,
+        help_text="Whether the job creates a new memory or updates one"
+    )
+
+    name = models.CharField(
+        max_length=255,
+        help_text="Name of the memory source"
+    )
+
+    s3_key = models.CharField(
+        max_length=1024,
+        help_text="S3 key of the uploaded file"
+    )
+
+    status = models.CharField(
+        choices=IngestionStatus.choices,
+        default=IngestionStatus.QUEUED,
+        max_length=20,
+        help_text="Current ingestion stage"
+    )
+
+    total_pages = models.PositiveIntegerField(
+        default=0,
+        help_text="Number of pages in the document"
+    )
+
+    processed_pages = models.PositiveIntegerField(
+        default=0,
+        help_text="Number of pages extracted so far"
+    )
+
+    total_chunks = models.PositiveIntegerField(
+        default=0,
+        help_text="Number of chunks extracted from the document"
+    )
+
+    embedded_chunks = models.PositiveIntegerField(
+        default=0,
+        help_text="Number of chunks embedded (or reused) so far"
+    )
+
+    reused_chunks = models.PositiveIntegerField(
+        default=0,
+        help_text="Unchanged chunks kept from the previous version"
+    )
+
+    deleted_chunks = models.PositiveIntegerField(
+        default=0,
+        help_text="Chunks removed from the previous version"
+    )
+
+    error = models.TextField(
+        blank=True,
+        help_text="Error message if the job failed"
+    )
+
+    started_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="When the worker picked up the job"
+    )
+
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="When the job finished (indexed or failed)"
+    )
+
+    def __str__(self):
+        return f"{self.name} ({self.status}) - {self.course_id}"
+
+    def update_progress(self, **fields):
+        """
+        Persist only the given progress fields so concurrent readers of the
+        status endpoint never see a stale full-row overwrite.
+        """
+        for field, value in fields.items():
+            setattr(self, field, value)
+        IngestionJob.objects.filter(pk=self.pk).update(**fields)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['course']),
+            models.Index(fields=['status']),
+        ]
@@ -1,14 +1,67 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from niva_app.models.base import TimestampBase
-from pgvector.django import VectorField
+from niva_app.lib.embeddings import EMBEDDING_DIMENSIONS, EMBEDDING_INDEX_DIMENSIONS
+from pgvector.django import BitField, HalfVectorField, HnswIndex, VectorField
 
 class Document(TimestampBase):
     content = models.TextField()
-    embedding = VectorField(dimensions=3072)
+    # Full-precision embedding; may be left empty when EMBEDDING_KEEP_FULL_PRECISION
+    # is off and a quantized storage mode is used
+    embedding = VectorField(dimensions=EMBEDDING_DIMENSIONS, null=True, blank=True)
+    # Matryoshka-truncated copy of `embedding` used for approximate nearest
+    # neighbour search (see niva_app.services.retrieval)
+    embedding_reduced = VectorField(dimensions=EMBEDDING_INDEX_DIMENSIONS, null=True, blank=True)
+    # Quantized copies, filled according to EMBEDDING_STORAGE_MODE
+    embedding_half = HalfVectorField(dimensions=EMBEDDING_DIMENSIONS, null=True, blank=True)
+    embedding_binary = BitField(length=EMBEDDING_DIMENSIONS, null=True, blank=True)
     memory = models.ForeignKey('niva_app.Memory', on_delete=models.CASCADE, related_name='documents')
+    # Denormalized `memory.course`, so course-scoped searches filter on a
+    # column of this table instead of joining through memories
+    course = models.ForeignKey(
+        'niva_app.Course', on_delete=models.CASCADE, related_name='documents', null=True, blank=True
+    )
+    # SHA-256 of the normalized content (niva_app.lib.embeddings.content_hash), used
+    # to diff chunks when a memory's document is replaced. Empty for legacy rows
+    # until the memory is first updated.
+    content_hash = models.CharField(max_length=64, blank=True, default='')
+    # Source location of the chunk (null for rows chunked before this was recorded).
+    # Offsets are into the document text: the extracted pages joined by newlines.
+    page_number = models.PositiveIntegerField(null=True, blank=True)
+    start_offset = models.PositiveIntegerField(null=True, blank=True)
+    end_offset = models.PositiveIntegerField(null=True, blank=True)
+    token_count = models.PositiveIntegerField(null=True, blank=True)
+    # Full-text search vector of `content`, built with the text search configuration
+    # of the course language (see niva_app.services.retrieval.get_search_config)
+    search_vector = SearchVectorField(null=True, blank=True)
 
     class Meta:
         db_table = 'documents'
         indexes = [
             models.Index(fields=['memory']),
+            models.Index(fields=['memory', 'content_hash']),
+            models.Index(fields=['course', 'memory']),
+            GinIndex(name='documents_search_vector_gin', fields=['search_vector']),
+            HnswIndex(
+                name='documents_embedding_hnsw',
+                fields=['embedding_reduced'],
+                m=16,
+                ef_construction=64,
+                opclasses=['vector_cosine_ops'],
+            ),
+            HnswIndex(
+                name='documents_embedding_half_hnsw',
+                fields=['embedding_half'],
+                m=16,
+                ef_construction=64,
+                opclasses=['halfvec_cosine_ops'],
+            ),
+            HnswIndex(
+                name='documents_embedding_bin_hnsw',
+                fields=['embedding_binary'],
+                m=16,
+                ef_construction=64,
+                opclasses=['bit_hamming_ops'],
+            ),
         ]
\ No newline at end of file
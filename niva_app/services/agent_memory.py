@@ -1,4 +1,5 @@
 import os
+import posixpath
 import uuid
 import logging
 import requests
@@ -6,8 +7,14 @@ import threading
 import shutil
 from pathlib import Path
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from io import BytesIO
 
 import rest_framework.exceptions
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import CSVLoader, PyPDFLoader, WebBaseLoader
 from langchain_community.vectorstores.chroma import Chroma
@@ -15,22 +22,44 @@ from google import genai
 from unstructured_client.models import operations, shared
 import urllib.parse
 
-from niva_app.management.commands.query_agent_memory import gemini_client
-from niva_app.models import Agent, Memory, Course, MemoryType
+from niva_app.lib.llm_gateway import generate_content
+from niva_app.models import Agent, Memory, Course, MemoryType, IngestionJob, IngestionOperation, IngestionStatus
 from niva_app.lib.utils import FileType, FileTypeInfo
+from niva_app.lib.embeddings import EmbeddingEngine, content_hash
+from niva_app.services.embedding_cache import get_embedding_engine
 from niva_app.models.rag import Document
-from niva_app.services.rag import process_pdf
+from niva_app.services.rag import get_page_count, iter_batches, iter_pdf_chunks
+from niva_app.services.retrieval import document_embedding_fields, update_search_vectors
 from niva_app.services.s3_storage import S3StorageService
+from niva_app.services.upload_buffer import (
+    BufferedUpload,
+    can_buffer_upload,
+    discard_upload,
+    get_upload,
+    stash_upload,
+)
 
 PERSIST_DIRECTORY = "./chroma_db"
 
 logger = logging.getLogger("root")
 
+# Rows per DELETE when removing chunks that disappeared from an updated document
+DELETE_BATCH_SIZE = 1000
+
+@dataclass
+class ChunkStats:
+    """Counters for one document streamed into a memory."""
+    chunks: int = 0
+    embedded: int = 0
+    reused: int = 0
+    deleted: int = 0
+
 class MemoryService:
-    def __init__(self, course: Course):
+    def __init__(self, course: Course, embedding_engine: EmbeddingEngine = None):
         self.course = course
         self.collection_name = f"course-{self.course.pk}"
         self.storage_service = S3StorageService()
+        self.embedding_engine = embedding_engine or get_embedding_engine()
 
     def delete_memory(self, id: str):
         try:
@@ -52,27 +81,335 @@ class MemoryService:
         except Exception as e:
             raise RuntimeError(f"Failed to delete memory: {e}")
 
-    def add_memory(self, memory_type: str, url: str, name: str):
+    def add_memory(self, memory_type: str, url: str, name: str, job: IngestionJob = None) -> Memory:
         try: 
             if memory_type == MemoryType.DOCUMENT:
                 file_type = FileTypeInfo.get_file_type(url)
                 if file_type == FileType.PDF:
-                    self.add_pdf_memory(url, name)  
+                    return self.add_pdf_memory(url, name, job=job)
                 else:
-                    Memory.objects.create(
+                    memory = Memory.objects.create(
                         course=self.course,
                         url=url,
                         type=MemoryType.DOCUMENT,
                         name=name
                     )
+                    if job:
+                        job.update_progress(memory=memory)
+                    return memory
         
         except Exception as e:
             logger.error(f"Failed to add memory: {e}")
             raise
 
-    def add_pdf_memory(self, s3_key: str, name: str) -> Memory: 
+    def start_document_ingestion(self, file, name: str) -> IngestionJob:
+        """
+        Queue an uploaded document for background ingestion.
+
+        PDFs up to INGESTION_BUFFER_MAX_BYTES are handed to the worker in memory:
+        the worker extracts them straight from the buffer while uploading them
+        to S3 concurrently, so the request never waits on S3 and the file is
+        never downloaded back. Larger files are uploaded to S3 first and
+        downloaded by the worker.
+
+        Returns the IngestionJob immediately; extraction, embedding and indexing
+        run on the Celery worker and are reported through the job's status.
+        """
+        return self._queue_document(file, name)
+
+    def start_memory_update(self, memory_id: str, file, name: str = None) -> IngestionJob:
+        """
+        Queue a replacement document for an existing memory.
+
+        The worker re-chunks the new file and diffs the chunks against the
+        memory's existing documents by content hash: unchanged chunks are kept
+        as they are, only new chunks are embedded and inserted, and chunks that
+        no longer appear are deleted.
+
+        Args:
+            memory_id (str): Memory whose document is replaced
+            file: Uploaded replacement PDF
+            name (str): New name for the memory (keeps the current name if omitted)
+
+        Returns:
+            IngestionJob: Update job, processed in the background
+        """
+        try:
+            memory = Memory.objects.get(course=self.course, id=memory_id)
+        except Memory.DoesNotExist:
+            raise rest_framework.exceptions.NotFound(f"Memory with id {memory_id} not found")
+
+        if FileTypeInfo.get_file_type(file.name) != FileType.PDF:
+            raise ValueError("Only PDF documents can be updated")
+
+        return self._queue_document(
+            file,
+            name or memory.name,
+            operation=IngestionOperation.UPDATE,
+            memory=memory
+        )
+
+    def _queue_document(self, file, name: str, **job_fields) -> IngestionJob:
+        # Import here to avoid circular import
+        from niva_app.tasks import ingest_document
+
+        if FileTypeInfo.get_file_type(file.name) == FileType.PDF and can_buffer_upload(file):
+            # Stashed before the job exists, so a failed stash never leaves a
+            # queued job without its file (an orphaned buffer just expires)
+            job_id = uuid.uuid4()
+            stash_upload(
+                job_id,
+                BufferedUpload(
+                    s3_key=self.build_s3_key(file),
+                    content=file.read(),
+                    content_type=getattr(file, "content_type", None) or "application/pdf"
+                )
+            )
+            job = IngestionJob.objects.create(
+                id=job_id,
+                course=self.course,
+                name=name,
+                status=IngestionStatus.QUEUED,
+                **job_fields
+            )
+        else:
+            job = IngestionJob.objects.create(
+                course=self.course,
+                name=name,
+                s3_key=self.upload_file(file, name),
+                status=IngestionStatus.UPLOADED,
+                **job_fields
+            )
+
+        transaction.on_commit(lambda: ingest_document.delay(str(job.id)))
+
+        logger.info(f"Queued ingestion job {job.id} for {name}")
+        return job
+
+    def run_ingestion_job(self, job: IngestionJob, upload: BufferedUpload = None) -> Memory:
         """
-        Process a PDF from S3 storage and store its contents with vector embeddings
+        Run a queued ingestion job to completion, recording each stage on the job.
+
+        Args:
+            job (IngestionJob): Job to run
+            upload (BufferedUpload): File contents for a job without an S3 key,
+                when they were not stashed in the upload buffer (e.g. bulk ingestion)
+        """
+        job.update_progress(started_at=timezone.now(), error="")
+
+        try:
+            if upload is None and not job.s3_key:
+                upload = get_upload(job.id)
+            if job.operation == IngestionOperation.UPDATE:
+                memory = self.update_pdf_memory(job, upload)
+            elif upload:
+                memory = self.add_buffered_pdf_memory(upload, job.name, job=job)
+            elif job.s3_key:
+                memory = self.add_memory(
+                    memory_type=MemoryType.DOCUMENT,
+                    url=job.s3_key,
+                    name=job.name,
+                    job=job
+                )
+            else:
+                raise ValueError("Uploaded file expired before it could be processed, please upload it again")
+        except Exception as e:
+            logger.error(f"Ingestion job {job.id} failed: {e}")
+            job.update_progress(
+                status=IngestionStatus.FAILED,
+                error=str(e),
+                finished_at=timezone.now()
+            )
+            raise
+
+        # Touch the memory so in-process course indexes pick up its new chunks
+        memory.save(update_fields=["updated_at"])
+        job.update_progress(status=IngestionStatus.INDEXED, finished_at=timezone.now())
+        discard_upload(job.id)
+        logger.info(f"Ingestion job {job.id} completed")
+        return memory
+
+    def add_buffered_pdf_memory(self, upload: BufferedUpload, name: str, job: IngestionJob = None) -> Memory:
+        """
+        Process a PDF held in memory while uploading it to S3 concurrently.
+
+        The memory is only kept if both the S3 upload and indexing succeed.
+        """
+        logger.info(f"Processing buffered PDF upload for: {upload.s3_key}")
+
+        memory = Memory.objects.create(
+            url=upload.s3_key,
+            type=MemoryType.DOCUMENT,
+            course=self.course,
+            name=name
+        )
+
+        if job:
+            job.update_progress(memory=memory)
+
+        upload_future = None
+
+        try:
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                upload_future = pool.submit(self._save_buffered_upload, upload)
+
+                stats = self._ingest_pdf_chunks(upload.content, memory, job=job)
+
+                if not stats.chunks:
+                    raise ValueError(f"No text content extracted from PDF: {name}")
+
+                s3_key = upload_future.result()
+
+            if job:
+                job.update_progress(s3_key=s3_key)
+
+            logger.info(f"Successfully processed PDF: {name} with {stats.chunks} chunks")
+            return memory
+
+        except Exception as e:
+            logger.error(f"Error processing PDF: {e}")
+            memory.delete()
+            self._discard_concurrent_upload(upload_future, upload.s3_key)
+            if isinstance(e, ValueError):
+                raise e
+            raise ValueError(f"Failed to process PDF: {str(e)}")
+
+    def update_pdf_memory(self, job: IngestionJob, upload: BufferedUpload = None) -> Memory:
+        """
+        Replace the document of an existing memory, re-embedding only changed chunks.
+
+        The new PDF is read from the upload buffer (while being uploaded to S3
+        concurrently) or downloaded from the job's S3 key. Chunks are matched
+        against the memory's documents by content hash; matches are kept, the
+        rest are embedded and inserted, and once the new version is fully
+        indexed the kept chunks get their new page and offsets and unmatched
+        old chunks are deleted. On failure the memory is left as it was.
+        """
+        memory = job.memory
+        if memory is None:
+            raise ValueError("The memory being updated no longer exists")
+        if not upload and not job.s3_key:
+            raise ValueError("Uploaded file expired before it could be processed, please upload it again")
+
+        logger.info(f"Updating memory {memory.id} from {upload.s3_key if upload else job.s3_key}")
+
+        existing = self._existing_chunk_ids(memory)
+        previous_url = memory.url
+        inserted_ids = []
+        reused_documents = []
+        upload_future = None
+
+        try:
+            with ThreadPoolExecutor(max_workers=1) as pool, tempfile.TemporaryDirectory() as temp_dir:
+                if upload:
+                    upload_future = pool.submit(self._save_buffered_upload, upload)
+                    source = upload.content
+                else:
+                    source = os.path.join(temp_dir, "document.pdf")
+                    self.storage_service.download_file(job.s3_key, source)
+
+                stats = self._ingest_pdf_chunks(
+                    source, memory, job=job, existing=existing, inserted_ids=inserted_ids,
+                    reused_documents=reused_documents
+                )
+
+                if not stats.chunks:
+                    raise ValueError(f"No text content extracted from PDF: {job.name}")
+
+                s3_key = upload_future.result() if upload_future else job.s3_key
+
+        except Exception as e:
+            logger.error(f"Error updating memory {memory.id}: {e}")
+            self._delete_documents(inserted_ids)
+            if upload:
+                self._discard_concurrent_upload(upload_future, upload.s3_key)
+            if isinstance(e, ValueError):
+                raise e
+            raise ValueError(f"Failed to update PDF: {str(e)}")
+
+        Document.objects.bulk_update(
+            reused_documents, ["page_number", "start_offset", "end_offset", "token_count"], batch_size=1000
+        )
+        stats.deleted = self._delete_documents(
+            [document_id for document_ids in existing.values() for document_id in document_ids]
+        )
+
+        memory.url = s3_key
+        memory.name = job.name
+        memory.save(update_fields=["url", "name", "updated_at"])
+        job.update_progress(s3_key=s3_key, deleted_chunks=stats.deleted)
+
+        if previous_url and previous_url != s3_key and not previous_url.startswith('http'):
+            try:
+                self.storage_service.delete_file(previous_url)
+            except Exception as e:
+                logger.warning(f"Failed to delete previous S3 file {previous_url}: {e}")
+
+        saved = stats.reused / stats.chunks if stats.chunks else 0.0
+        logger.info(
+            f"Updated memory {memory.id}: {stats.chunks} chunks, {stats.reused} reused, "
+            f"{stats.embedded - stats.reused} embedded, {stats.deleted} deleted "
+            f"({saved:.0%} of embedding work saved)"
+        )
+        return memory
+
+    def _existing_chunk_ids(self, memory: Memory) -> dict:
+        """
+        Map content hash -> ids of the memory's documents with that content.
+
+        Rows stored before content hashes were recorded are hashed here and
+        backfilled so later updates can skip reading their content.
+        """
+        existing = {}
+        missing_hashes = []
+
+        rows = Document.objects.filter(memory=memory).values_list("id", "content_hash")
+        for document_id, chunk_hash in rows.iterator(chunk_size=2000):
+            if chunk_hash:
+                existing.setdefault(chunk_hash, []).append(document_id)
+            else:
+                missing_hashes.append(document_id)
+
+        for batch_ids in iter_batches(missing_hashes, DELETE_BATCH_SIZE):
+            documents = list(Document.objects.filter(id__in=batch_ids).only("id", "content"))
+            for document in documents:
+                document.content_hash = content_hash(document.content)
+                existing.setdefault(document.content_hash, []).append(document.id)
+            Document.objects.bulk_update(documents, ["content_hash"])
+
+        return existing
+
+    def _delete_documents(self, document_ids: list) -> int:
+        deleted = 0
+        for batch_ids in iter_batches(document_ids, DELETE_BATCH_SIZE):
+            deleted += Document.objects.filter(id__in=batch_ids).delete()[0]
+        return deleted
+
+    def _save_buffered_upload(self, upload: BufferedUpload) -> str:
+        subdirectory, filename = posixpath.split(upload.s3_key)
+        return self.storage_service.save_file(
+            BytesIO(upload.content),
+            subdirectory=subdirectory,
+            filename=filename,
+            content_type=upload.content_type
+        )
+
+    def _discard_concurrent_upload(self, upload_future, s3_key: str):
+        """
+        Remove the S3 object of a buffered upload whose ingestion failed.
+        """
+        if upload_future is None or not upload_future.done() or upload_future.exception():
+            return
+        try:
+            self.storage_service.delete_file(s3_key)
+        except Exception as e:
+            logger.warning(f"Failed to clean up S3 upload {s3_key}: {e}")
+
+    def add_pdf_memory(self, s3_key: str, name: str, job: IngestionJob = None) -> Memory: 
+        """
+        Process a PDF from S3 storage and store its contents with vector embeddings.
+
+        Used for files too large to buffer and for re-processing existing memories.
         """
         logger.info(f"Processing PDF from S3: {s3_key}")
 
@@ -83,6 +420,9 @@ class MemoryService:
             name=name  
         )
 
+        if job:
+            job.update_progress(memory=memory)
+
         try:
             # Download file from S3 to temporary location for processing
             with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp_file:
@@ -96,38 +436,15 @@ class MemoryService:
                 
                 logger.info(f"Processing PDF from temporary path: {temp_file_path}")
 
-                # Process the PDF from temporary location
-                documents = process_pdf(temp_file_path)
+                # Stream the PDF page -> chunk -> embed -> insert so that only a
+                # rolling window of chunks and embeddings is held in memory
+                stats = self._ingest_pdf_chunks(temp_file_path, memory, job=job)
 
-                if not documents:
+                if not stats.chunks:
                     logger.warning(f"No text content extracted from PDF: {temp_file_path}")
                     raise ValueError(f"No text content extracted from PDF: {name}")
-
-                logger.info(f"Extracted {len(documents)} chunks from PDF")
-
-                # Generate embeddings
-                embeddings_response = gemini_client.models.embed_content(
-                    model="gemini-embedding-exp-03-07",
-                    contents=documents
-                )
-
-                embeddings_list = [embedding.values for embedding in embeddings_response.embeddings]
-                document_instances = [
-                    Document(
-                        id=uuid.uuid4(),
-                        content=doc_content,
-                        embedding=embedding,
-                        memory=memory
-                    )
-                    for doc_content, embedding in zip(documents, embeddings_list)
-                ]
-
-                Document.objects.bulk_create(
-                    document_instances,
-                    batch_size=1000 
-                )
                 
-                logger.info(f"Successfully processed PDF: {name} with {len(document_instances)} chunks")
+                logger.info(f"Successfully processed PDF: {name} with {stats.chunks} chunks")
                 memory.save()
                 return memory
                 
@@ -145,17 +462,138 @@ class MemoryService:
             memory.delete()
             raise ValueError(f"Failed to process PDF: {str(e)}")
 
+    def _ingest_pdf_chunks(
+        self,
+        source,
+        memory: Memory,
+        job: IngestionJob = None,
+        existing: dict = None,
+        inserted_ids: list = None,
+        reused_documents: list = None,
+    ) -> ChunkStats:
+        """
+        Extract, embed and insert a PDF's chunks (from a path or bytes) in rolling windows.
+
+        Args:
+            source: PDF path or bytes
+            memory (Memory): Memory the chunks belong to
+            job (IngestionJob): Job to report progress on
+            existing (dict): For updates, content hash -> ids of the memory's current
+                documents. Chunks found here are kept instead of re-embedded, and their
+                ids are removed from the map, leaving only the chunks that disappeared.
+            inserted_ids (list): Collects the ids of inserted documents
+            reused_documents (list): For updates, collects the kept documents with
+                their new source metadata (page and offsets), unsaved so the
+                caller can write them only once the update succeeds
+
+        Returns:
+            ChunkStats: Chunk counters for the document
+        """
+        total_pages = get_page_count(source)
+        if job:
+            job.update_progress(total_pages=total_pages)
+
+        stats = ChunkStats()
+
+        def write_batch(chunks: list, embeddings: list):
+            documents = [
+                Document(
+                    id=uuid.uuid4(),
+                    content=chunk.content,
+                    content_hash=content_hash(chunk.content),
+                    page_number=chunk.page_number,
+                    start_offset=chunk.start_offset,
+                    end_offset=chunk.end_offset,
+                    token_count=chunk.token_count,
+                    memory=memory,
+                    course_id=memory.course_id,
+                    **document_embedding_fields(embedding)
+                )
+                for chunk, embedding in zip(chunks, embeddings)
+            ]
+            Document.objects.bulk_create(documents, batch_size=1000)
+            update_search_vectors(
+                Document.objects.filter(id__in=[document.id for document in documents]),
+                memory.course.language
+            )
+            if inserted_ids is not None:
+                inserted_ids.extend(document.id for document in documents)
+            stats.embedded += len(chunks)
+            if job:
+                job.update_progress(embedded_chunks=stats.embedded)
+
+        for window in iter_batches(iter_pdf_chunks(source), settings.EMBEDDING_STREAM_WINDOW):
+            stats.chunks += len(window)
+
+            new_chunks = window
+            if existing is not None:
+                new_chunks = []
+                reused = []
+                for chunk in window:
+                    matching_ids = existing.get(content_hash(chunk.content))
+                    if matching_ids:
+                        # Same content, but it may have moved within the document
+                        reused.append(Document(
+                            id=matching_ids.pop(),
+                            page_number=chunk.page_number,
+                            start_offset=chunk.start_offset,
+                            end_offset=chunk.end_offset,
+                            token_count=chunk.token_count
+                        ))
+                    else:
+                        new_chunks.append(chunk)
+                if reused:
+                    reused_documents.extend(reused)
+                    stats.reused += len(reused)
+                    stats.embedded += len(reused)
+
+            if job:
+                job.update_progress(
+                    status=IngestionStatus.EMBEDDING,
+                    total_chunks=stats.chunks,
+                    embedded_chunks=stats.embedded,
+                    reused_chunks=stats.reused,
+                    processed_pages=window[-1].page_number
+                )
+            if new_chunks:
+                self.embedding_engine.embed(
+                    [chunk.content for chunk in new_chunks],
+                    on_batch=lambda start, batch, embeddings: write_batch(
+                        new_chunks[start:start + len(batch)], embeddings
+                    )
+                )
+
+        if job:
+            job.update_progress(processed_pages=total_pages)
+
+        logger.info(f"Stored {stats.chunks} chunks from {total_pages} pages ({stats.reused} reused)")
+        return stats
+
+    def build_s3_key(self, file) -> str:
+        """
+        Build a unique, course-scoped S3 key for an uploaded file
+        """
+        file_extension = os.path.splitext(file.name)[1]
+        return f"course_{self.course.id}/{uuid.uuid4()}{file_extension}"
+
+    def copy_s3_file(self, source_key: str) -> str:
+        """
+        Copy an object already in the bucket to a course-scoped key and return it.
+
+        Memories own their S3 object (deleting or replacing the memory deletes
+        it), so objects that belong to someone else, such as a bulk-ingested
+        corpus, are copied server-side rather than referenced.
+        """
+        s3_key = f"course_{self.course.id}/{uuid.uuid4()}{posixpath.splitext(source_key)[1]}"
+        self.storage_service.copy_file(source_key, s3_key)
+        return s3_key
+
     def upload_file(self, file, name: str) -> str:
         """
         Upload a file to S3 storage and return the S3 key
         """
         try:
-            # Generate unique filename
-            file_extension = os.path.splitext(file.name)[1]
-            unique_filename = f"{uuid.uuid4()}{file_extension}"
-            
-            # Create course-specific directory
-            course_dir = f"course_{self.course.id}"
+            course_dir, unique_filename = posixpath.split(self.build_s3_key(file))
             
             # Save file to S3
             s3_key = self.storage_service.save_file(
@@ -196,7 +634,7 @@ class MemoryService:
             Respond with just the category name.
             """
             
-            response = gemini_client.models.generate_content(
+            response = generate_content(
                 model="gemini-2.5-flash-lite",
                 contents=[categorization_prompt]
             )
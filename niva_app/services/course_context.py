@@ -0,0 +1,120 @@
+import hashlib
+import logging
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from niva_app.models import Agent, Course, CourseContext, Memory
+from niva_app.services.retrieval import course_memories
+
+logger = logging.getLogger(__name__)
+
+AGENT_CONTEXT_VERSION_PREFIX = "agent-context-version"
+REFRESH_PENDING_PREFIX = "course-context-refresh"
+
+def course_context_version(course: Course, agent_id) -> str:
+    """
+    Hash of the state a course context is extracted from: the course and the
+    active memories visible to the agent (re-ingesting a memory touches it).
+
+    Args:
+        course (Course): Course
+        agent_id: ID of the agent
+
+    Returns:
+        str: 64-character hex digest
+    """
+    digest = hashlib.sha256(f"{course.id}:{course.name}:{course.updated_at.isoformat()}".encode("utf-8"))
+    memories = course_memories(course.id, agent_id).order_by("id").values_list("id", "updated_at")
+    for memory_id, updated_at in memories:
+        digest.update(f"|{memory_id}:{updated_at.isoformat()}".encode("utf-8"))
+    return digest.hexdigest()
+
+def _agent_context_version_key(course_id) -> str:
+    return f"{AGENT_CONTEXT_VERSION_PREFIX}:{course_id}"
+
+async def get_agent_context_version(course_id) -> str:
+    """
+    Version of the agent system instructions built for a course, shared by all
+    workers through Redis. Changes whenever the course, its memories, its
+    agents or its precomputed contexts change.
+    """
+    key = _agent_context_version_key(course_id)
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, uuid.uuid4().hex, timeout=None)
+        version = await cache.aget(key)
+    return version
+
+def bump_agent_context_version(course_id):
+    """
+    Invalidate the cached agent system instructions of a course.
+    """
+    try:
+        cache.set(_agent_context_version_key(course_id), uuid.uuid4().hex, timeout=None)
+    except Exception as e:
+        logger.warning(f"Failed to invalidate agent context cache for course {course_id}: {e}")
+
+def schedule_course_context_refresh(course_id, agent_id=None):
+    """
+    Queue regeneration of the course's contexts for each of its active agents
+    (or only for `agent_id`) once the current transaction commits.
+
+    Refreshes are debounced: they run COURSE_CONTEXT_REFRESH_DELAY seconds
+    after the first change, and further changes within that window are picked
+    up by the refresh already queued instead of queueing another LLM extraction.
+    """
+    # Import here to avoid circular import
+    from niva_app.tasks import build_course_context
+
+    delay = settings.COURSE_CONTEXT_REFRESH_DELAY
+
+    pending_key = f"{REFRESH_PENDING_PREFIX}:{course_id}" + (f":{agent_id}" if agent_id else "")
+
+    def enqueue():
+        try:
+            if not cache.add(pending_key, 1, timeout=delay):
+                return
+        except Exception as e:
+            logger.warning(f"Failed to check pending course context refresh for course {course_id}: {e}")
+
+        if agent_id:
+            agent_ids = [agent_id]
+        else:
+            agent_ids = Agent.objects.filter(courses=course_id, is_active=True).values_list("id", flat=True)
+        for agent_id in agent_ids:
+            try:
+                build_course_context.apply_async((str(course_id), str(agent_id)), countdown=delay)
+            except Exception as e:
+                # The context is rebuilt on the next call start instead
+                logger.warning(f"Failed to queue course context refresh for course {course_id}: {e}")
+
+    transaction.on_commit(enqueue)
+
+def _refresh_for_memory(sender, instance: Memory, created: bool = False, **kwargs):
+    # A new memory has no chunks yet; ingestion saves it again once they are
+    # stored (see MemoryService.run_ingestion_job)
+    if created:
+        return
+    bump_agent_context_version(instance.course_id)
+    schedule_course_context_refresh(instance.course_id)
+
+def _refresh_for_course(sender, instance: Course, **kwargs):
+    bump_agent_context_version(instance.id)
+    schedule_course_context_refresh(instance.id)
+
+def _invalidate_for_course_context(sender, instance: CourseContext, **kwargs):
+    bump_agent_context_version(instance.course_id)
+
+def _invalidate_for_agent(sender, instance: Agent, **kwargs):
+    for course_id in instance.courses.values_list("id", flat=True):
+        bump_agent_context_version(course_id)
+
+post_save.connect(_refresh_for_memory, sender=Memory, dispatch_uid="course_context_memory_saved")
+post_delete.connect(_refresh_for_memory, sender=Memory, dispatch_uid="course_context_memory_deleted")
+post_save.connect(_refresh_for_course, sender=Course, dispatch_uid="course_context_course_saved")
+post_save.connect(_invalidate_for_course_context, sender=CourseContext, dispatch_uid="course_context_saved")
+post_save.connect(_invalidate_for_agent, sender=Agent, dispatch_uid="course_context_agent_saved")
@@ -0,0 +1,275 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+
+from niva_app.lib.diversity import duplicate_tokens_avoided, mmr_select
+from niva_app.lib.embeddings import reduce_embedding
+from niva_app.models import Memory
+from niva_app.services.retrieval import course_documents
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY_PREFIX = "course-index-version"
+# Per-chunk fields kept next to the matrix, named like the search_course rows
+ROW_FIELDS = ("id", "content", "memory__name", "page_number")
+# Matrix rows converted to float32 per step when scoring (2048 x 1536 dims = 12 MB)
+SCORE_BLOCK_ROWS = 2048
+
+# Keyed on (course ID, agent ID or "" for the whole course)
+_indexes: Dict[Tuple[str, str], "CourseEmbeddingIndex"] = {}
+# Guards the two dicts; each index is (re)loaded under its own lock so one
+# course's rebuild doesn't hold up lookups of the others
+_indexes_lock = threading.Lock()
+_load_locks: Dict[Tuple[str, str], threading.Lock] = {}
+
+def _version_key(course_id) -> str:
+    return f"{VERSION_KEY_PREFIX}:{course_id}"
+
+def get_index_version(course_id) -> str:
+    """
+    Current version of a course's index, shared by all workers through Redis.
+    """
+    key = _version_key(course_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        version = cache.get(key)
+    return version
+
+def invalidate_course_index(course_id):
+    """
+    Mark a course's indexes (for every agent) stale in every worker and drop this worker's copies.
+    """
+    cache.set(_version_key(course_id), uuid.uuid4().hex, timeout=None)
+    with _indexes_lock:
+        for key in [key for key in _indexes if key[0] == str(course_id)]:
+            del _indexes[key]
+
+def _invalidate_for_memory(sender, instance: Memory, **kwargs):
+    try:
+        invalidate_course_index(instance.course_id)
+    except Exception as e:
+        logger.warning(f"Failed to invalidate course index for course {instance.course_id}: {e}")
+
+post_save.connect(_invalidate_for_memory, sender=Memory, dispatch_uid="course_index_memory_saved")
+post_delete.connect(_invalidate_for_memory, sender=Memory, dispatch_uid="course_index_memory_deleted")
+
+class CourseEmbeddingIndex:
+    """
+    In-process index of the chunk embeddings of one course, or of the part
+    of it visible to one agent (see `course_documents`).
+
+    Embeddings are Matryoshka-reduced to COURSE_INDEX_DIMENSIONS, normalized
+    and stored as a contiguous float16 matrix in a local cache file, which is
+    memory-mapped so workers on the same host share its pages. A search is a
+    matrix-vector product, computed in float32 blocks, followed by a partial
+    sort.
+    """
+
+    def __init__(self, course_id, version: str, matrix: np.ndarray, rows: List[dict], agent_id=None):
+        self.course_id = str(course_id)
+        self.agent_id = str(agent_id) if agent_id else None
+        self.version = version
+        self.matrix = matrix
+        self.rows = rows
+        self.checked_at = time.monotonic()
+
+    @classmethod
+    def load(cls, course_id, version: str, agent_id=None) -> "CourseEmbeddingIndex":
+        """
+        Load a course's index from the local cache file, building it from the database if missing.
+
+        Args:
+            course_id: ID of the course
+            version (str): Index version, part of the cache file name
+            agent_id: Only index the memories visible to this agent
+
+        Returns:
+            CourseEmbeddingIndex: The loaded index
+        """
+        prefix = f"course_{course_id}_{agent_id or 'all'}_"
+        base_path = os.path.join(settings.COURSE_INDEX_DIR, f"{prefix}{version}")
+        if not os.path.exists(f"{base_path}.npy"):
+            cls._build(course_id, agent_id, base_path)
+
+        try:
+            matrix, rows = cls._read(base_path)
+        except FileNotFoundError:
+            # Removed by a worker that built a newer version in the meantime
+            cls._build(course_id, agent_id, base_path)
+            matrix, rows = cls._read(base_path)
+        return cls(course_id, version, matrix, rows, agent_id=agent_id)
+
+    @staticmethod
+    def _read(base_path: str):
+        matrix = np.load(f"{base_path}.npy", mmap_mode="r")
+        with open(f"{base_path}.json", encoding="utf-8") as rows_file:
+            rows = json.load(rows_file)
+        return matrix, rows
+
+    @staticmethod
+    def _remove_other_versions(base_path: str, prefix: str):
+        """
+        Delete the files of older versions of the same (course, agent) index.
+        Workers that still have one memory-mapped keep reading it until they
+        reload; the pages are freed once they unmap it.
+        """
+        current = os.path.basename(base_path)
+        for name in os.listdir(settings.COURSE_INDEX_DIR):
+            stem, extension = os.path.splitext(name)
+            if stem.startswith(prefix) and stem != current and extension in (".npy", ".json"):
+                try:
+                    os.remove(os.path.join(settings.COURSE_INDEX_DIR, name))
+                except FileNotFoundError:
+                    pass
+
+    @staticmethod
+    def _build(course_id, agent_id, base_path: str):
+        started = time.perf_counter()
+        dimensions = settings.COURSE_INDEX_DIMENSIONS
+
+        vectors = []
+        rows = []
+        documents = (
+            course_documents(course_id, agent_id)
+            .exclude(embedding__isnull=True, embedding_half__isnull=True)
+            .values(*ROW_FIELDS, "embedding", "embedding_half")
+        )
+        for document in documents.iterator(chunk_size=500):
+            embedding = document.pop("embedding")
+            embedding_half = document.pop("embedding_half")
+            if embedding is None:
+                embedding = embedding_half.to_numpy()
+            vectors.append(reduce_embedding(embedding, dimensions))
+            document["id"] = str(document["id"])
+            rows.append(document)
+
+        matrix = np.asarray(vectors, dtype=np.float16).reshape(len(vectors), dimensions)
+
+        # Written under temporary names and renamed, so a worker loading the
+        # same version concurrently never sees a partial file
+        os.makedirs(settings.COURSE_INDEX_DIR, exist_ok=True)
+        suffix = uuid.uuid4().hex
+        with open(f"{base_path}.json.{suffix}", "w", encoding="utf-8") as rows_file:
+            json.dump(rows, rows_file)
+        with open(f"{base_path}.npy.{suffix}", "wb") as matrix_file:
+            np.save(matrix_file, np.ascontiguousarray(matrix))
+        os.replace(f"{base_path}.json.{suffix}", f"{base_path}.json")
+        os.replace(f"{base_path}.npy.{suffix}", f"{base_path}.npy")
+        CourseEmbeddingIndex._remove_other_versions(base_path, f"course_{course_id}_{agent_id or 'all'}_")
+
+        logger.info(
+            f"Built course index for course {course_id} (agent {agent_id or 'all'}): {len(rows)} chunks "
+            f"in {(time.perf_counter() - started) * 1000:.0f}ms"
+        )
+
+    def score(self, query_embedding) -> np.ndarray:
+        """
+        Cosine similarity of every chunk to a query embedding.
+
+        float16 is only the storage format: numpy has no BLAS kernel for it,
+        so a float16 product runs as a slow scalar loop and accumulates in
+        half precision. Blocks of the matrix are converted to float32 instead.
+
+        Args:
+            query_embedding: Full-dimensional query embedding
+
+        Returns:
+            np.ndarray: float32 similarity per row
+        """
+        query = np.asarray(reduce_embedding(query_embedding, self.matrix.shape[1]), dtype=np.float32)
+        scores = np.empty(len(self.rows), dtype=np.float32)
+        for start in range(0, len(self.rows), SCORE_BLOCK_ROWS):
+            block = self.matrix[start:start + SCORE_BLOCK_ROWS]
+            np.dot(block.astype(np.float32), query, out=scores[start:start + len(block)])
+        return scores
+
+    def search(self, query_embedding, k: int = 5) -> List[dict]:
+        """
+        Top-k chunks by cosine similarity to a query embedding.
+
+        The best MMR_CANDIDATES chunks are diversified with Maximal Marginal
+        Relevance, dropping near-duplicates.
+
+        Args:
+            query_embedding: Full-dimensional query embedding
+            k (int): Number of results
+
+        Returns:
+            List[dict]: Chunk rows with a `similarity`, best first
+        """
+        if not self.rows:
+            return []
+
+        scores = self.score(query_embedding)
+
+        candidates = min(max(settings.MMR_CANDIDATES, k), len(self.rows))
+        top = np.argpartition(-scores, candidates - 1)[:candidates]
+        top = top[np.argsort(-scores[top])]
+
+        texts = [self.rows[i]["content"] for i in top]
+        selection = mmr_select(
+            scores[top],
+            self.matrix[top].astype(np.float32),
+            texts,
+            k,
+            lambda_mult=settings.MMR_LAMBDA,
+            embedding_threshold=settings.DEDUP_EMBEDDING_THRESHOLD,
+            text_threshold=settings.DEDUP_TEXT_THRESHOLD
+        )
+
+        avoided = duplicate_tokens_avoided(texts, selection, k)
+        if avoided:
+            logger.info(f"Diversified {len(top)} candidates to {len(selection.selected)} chunks, avoiding {avoided} duplicate tokens")
+        return [{**self.rows[top[i]], "similarity": float(scores[top[i]])} for i in selection.selected]
+
+def get_course_index(course_id, agent_id=None) -> CourseEmbeddingIndex:
+    """
+    This worker's index for a course (or an agent's view of it), (re)loaded when its version changed.
+
+    The shared version is checked at most every COURSE_INDEX_REFRESH_SECONDS,
+    so lookups in between never leave the process.
+
+    Args:
+        course_id: ID of the course
+        agent_id: Only search the memories visible to this agent
+
+    Returns:
+        CourseEmbeddingIndex: The course's index
+    """
+    key = (str(course_id), str(agent_id) if agent_id else "")
+    index = _indexes.get(key)
+    if index and time.monotonic() - index.checked_at < settings.COURSE_INDEX_REFRESH_SECONDS:
+        return index
+
+    version = get_index_version(course_id)
+    if index and index.version == version:
+        index.checked_at = time.monotonic()
+        return index
+
+    with _indexes_lock:
+        load_lock = _load_locks.setdefault(key, threading.Lock())
+
+    with load_lock:
+        index = _indexes.get(key)
+        if not index or index.version != version:
+            index = CourseEmbeddingIndex.load(course_id, version, agent_id=agent_id)
+            with _indexes_lock:
+                _indexes[key] = index
+        index.checked_at = time.monotonic()
+        return index
+
+def search_course_index(course_id, query_embedding, k: int = 5, agent_id=None) -> List[dict]:
+    """
+    Top-k chunks of a course (visible to an agent) from the in-process index.
+    """
+    return get_course_index(course_id, agent_id).search(query_embedding, k=k)
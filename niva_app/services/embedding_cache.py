@@ -0,0 +1,256 @@
+import logging
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from niva_app.lib.embeddings import EMBEDDING_MODEL, EmbeddingEngine, content_hash, get_embedder
+from niva_app.models import EmbeddingCacheEntry
+
+logger = logging.getLogger(__name__)
+
+# Hashes per lookup query, to keep the IN (...) list bounded for large documents
+LOOKUP_BATCH_SIZE = 1000
+
+STATS_KEY_PREFIX = "embedding-cache"
+STATS_COUNTERS = ("hits", "misses", "embed_ms", "saved_chars")
+
+QUERY_KEY_PREFIX = "query-embedding"
+QUERY_STATS_KEY_PREFIX = "query-embedding-stats"
+QUERY_STATS_COUNTERS = ("hits", "misses", "embed_ms")
+# Longest backoff before retrying a query embedding, in seconds
+QUERY_RETRY_DELAY = 0.2
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache stored in Postgres.
+
+    Used by EmbeddingEngine to skip re-embedding chunks whose normalized text
+    has already been embedded with the same model and task type. Hit/miss
+    counters are kept in Redis (django cache) so they are shared by all workers.
+    """
+
+    def get_many(self, model: str, task_type: Optional[str], hashes: List[str]) -> Dict[str, list]:
+        """
+        Look up cached embeddings.
+
+        Args:
+            model (str): Embedding model name
+            task_type (str): Provider task type (None for none)
+            hashes (List[str]): Content hashes to look up
+
+        Returns:
+            Dict[str, list]: Embeddings keyed by content hash, for hashes that were found
+        """
+        unique_hashes = list(dict.fromkeys(hashes))
+        found = {}
+        for start in range(0, len(unique_hashes), LOOKUP_BATCH_SIZE):
+            rows = EmbeddingCacheEntry.objects.filter(
+                model=model,
+                task_type=task_type or "",
+                content_hash__in=unique_hashes[start:start + LOOKUP_BATCH_SIZE]
+            ).values_list("content_hash", "embedding")
+            found.update(rows)
+        return found
+
+    def set_many(self, model: str, task_type: Optional[str], entries: Dict[str, list]):
+        """
+        Store embeddings keyed by content hash. Existing entries are left untouched.
+        """
+        if not entries:
+            return
+        EmbeddingCacheEntry.objects.bulk_create(
+            [
+                EmbeddingCacheEntry(
+                    model=model,
+                    task_type=task_type or "",
+                    content_hash=content_hash,
+                    embedding=embedding
+                )
+                for content_hash, embedding in entries.items()
+            ],
+            ignore_conflicts=True,
+            batch_size=500
+        )
+
+    def record_usage(self, hits: int, misses: int, embed_seconds: float, saved_chars: int = 0):
+        """
+        Add one engine run to the shared hit/miss counters.
+        """
+        increments = {
+            "hits": hits,
+            "misses": misses,
+            "embed_ms": int(embed_seconds * 1000),
+            "saved_chars": saved_chars,
+        }
+        try:
+            for name, value in increments.items():
+                if not value:
+                    continue
+                key = f"{STATS_KEY_PREFIX}:{name}"
+                cache.add(key, 0, timeout=None)
+                cache.incr(key, value)
+        except Exception as e:
+            # Stats are best effort; never fail ingestion because Redis is unavailable
+            logger.warning(f"Failed to record embedding cache stats: {e}")
+
+    @staticmethod
+    def get_stats() -> dict:
+        """
+        Return cache counters and the estimated embedding time saved by hits.
+
+        The saving is estimated from the average provider time per embedded
+        (missed) text, applied to every hit.
+        """
+        counters = cache.get_many([f"{STATS_KEY_PREFIX}:{name}" for name in STATS_COUNTERS])
+        hits, misses, embed_ms, saved_chars = (
+            int(counters.get(f"{STATS_KEY_PREFIX}:{name}", 0)) for name in STATS_COUNTERS
+        )
+        lookups = hits + misses
+        avg_embed_seconds = (embed_ms / 1000) / misses if misses else 0.0
+
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "entries": EmbeddingCacheEntry.objects.count(),
+            "embedding_seconds_spent": round(embed_ms / 1000, 2),
+            "estimated_seconds_saved": round(hits * avg_embed_seconds, 2),
+            "characters_not_embedded": saved_chars,
+        }
+
+class QueryEmbeddingCache:
+    """
+    Short-lived Redis cache of query embeddings.
+
+    Sits in front of the Postgres embedding cache for query strings, which
+    repeat across calls on the same course. Entries are keyed on model, task
+    type and the hash of the normalized text, stored as raw float16 bytes and
+    evicted after QUERY_EMBEDDING_CACHE_TTL seconds.
+    """
+
+    @staticmethod
+    def _key(model: str, task_type: Optional[str], text: str) -> str:
+        return f"{QUERY_KEY_PREFIX}:{model}:{task_type or ''}:{content_hash(text)}"
+
+    def get(self, model: str, task_type: Optional[str], text: str) -> Optional[List[float]]:
+        """
+        Look up a query embedding, None on a miss or if Redis is unavailable.
+        """
+        try:
+            value = cache.get(self._key(model, task_type, text))
+        except Exception as e:
+            logger.warning(f"Failed to read query embedding cache: {e}")
+            return None
+        if value is None:
+            return None
+        return np.frombuffer(value, dtype=np.float16).astype(np.float32).tolist()
+
+    def set(self, model: str, task_type: Optional[str], text: str, embedding):
+        """
+        Store a query embedding for QUERY_EMBEDDING_CACHE_TTL seconds.
+        """
+        try:
+            cache.set(
+                self._key(model, task_type, text),
+                np.asarray(embedding, dtype=np.float16).tobytes(),
+                timeout=settings.QUERY_EMBEDDING_CACHE_TTL
+            )
+        except Exception as e:
+            logger.warning(f"Failed to write query embedding cache: {e}")
+
+    @staticmethod
+    def record_usage(hit: bool, embed_seconds: float = 0.0):
+        """
+        Count one lookup in the shared hit/miss counters.
+        """
+        increments = {"hits" if hit else "misses": 1, "embed_ms": int(embed_seconds * 1000)}
+        try:
+            for name, value in increments.items():
+                if not value:
+                    continue
+                key = f"{QUERY_STATS_KEY_PREFIX}:{name}"
+                cache.add(key, 0, timeout=None)
+                cache.incr(key, value)
+        except Exception as e:
+            logger.warning(f"Failed to record query embedding cache stats: {e}")
+
+    @staticmethod
+    def get_stats() -> dict:
+        """
+        Return query cache counters and the estimated embedding latency saved by hits.
+        """
+        counters = cache.get_many([f"{QUERY_STATS_KEY_PREFIX}:{name}" for name in QUERY_STATS_COUNTERS])
+        hits, misses, embed_ms = (
+            int(counters.get(f"{QUERY_STATS_KEY_PREFIX}:{name}", 0)) for name in QUERY_STATS_COUNTERS
+        )
+        lookups = hits + misses
+        avg_embed_ms = embed_ms / misses if misses else 0.0
+
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "avg_embed_ms": round(avg_embed_ms, 1),
+            "estimated_seconds_saved": round(hits * avg_embed_ms / 1000, 2),
+        }
+
+def get_embedding_engine(**kwargs) -> EmbeddingEngine:
+    """
+    Build an EmbeddingEngine backed by the shared embedding cache.
+    """
+    kwargs.setdefault("cache", EmbeddingCache())
+    return EmbeddingEngine(**kwargs)
+
+def embed_query(
+    text: str,
+    task_type: Optional[str] = None,
+    model: str = EMBEDDING_MODEL,
+    max_retries: Optional[int] = None,
+    timeout_ms: Optional[int] = None,
+) -> List[float]:
+    """
+    Embed a single query string, consulting the Redis query cache and then
+    the Postgres embedding cache first.
+
+    Queries are embedded while someone waits, so unlike ingestion they get
+    few, short retries and a per-request timeout.
+
+    Args:
+        text (str): Query text
+        task_type (str): Optional provider task type (e.g. RETRIEVAL_QUERY)
+        model (str): Embedding model name
+        max_retries (int): Retries on transient errors (defaults to QUERY_EMBEDDING_MAX_RETRIES)
+        timeout_ms (int): HTTP timeout per request (defaults to QUERY_EMBEDDING_TIMEOUT_MS)
+
+    Returns:
+        List[float]: Query embedding
+    """
+    embedder = get_embedder(model, timeout_ms=timeout_ms or settings.QUERY_EMBEDDING_TIMEOUT_MS)
+    # Keyed on the backend's model, so fake (offline) vectors never mix with real ones
+    model = embedder.model
+
+    query_cache = QueryEmbeddingCache()
+    cached = query_cache.get(model, task_type, text)
+    if cached is not None:
+        query_cache.record_usage(hit=True)
+        return cached
+
+    started = time.perf_counter()
+    engine = get_embedding_engine(
+        embedder=embedder,
+        batch_size=1,
+        max_concurrency=1,
+        max_retries=settings.QUERY_EMBEDDING_MAX_RETRIES if max_retries is None else max_retries,
+        base_delay=QUERY_RETRY_DELAY,
+        max_delay=QUERY_RETRY_DELAY
+    )
+    embedding = engine.embed([text], task_type=task_type)[0]
+    # Cache hits come back from pgvector as numpy arrays
+    embedding = embedding.tolist() if hasattr(embedding, "tolist") else list(embedding)
+
+    query_cache.set(model, task_type, text, embedding)
+    query_cache.record_usage(hit=False, embed_seconds=time.perf_counter() - started)
+    return embedding
@@ -7,7 +7,7 @@ import datetime
 from typing import Optional, Dict, Any, Union
 from django.db import transaction
 from django.core.exceptions import ObjectDoesNotExist
-from niva_app.lib.llm import gemini_client
+from niva_app.lib.llm_gateway import agenerate_content
 from niva_app.services.daily_service import DailyService
 from niva_app.models.dailycalls import DailyCall
 from niva_app.models.course import Course
@@ -233,7 +233,7 @@ class AgentCallProcessor:
             
             if student_details is None and transcript_content:
                 logger.info("No student details provided, extracting from transcript")
-                student_details = AgentCallProcessor.populate_student_details(transcript_content).dict()
+                student_details = (await AgentCallProcessor.populate_student_details(transcript_content)).dict()
             
             print("Fallback mechanism: "+str(student_details))
 
@@ -253,7 +253,7 @@ class AgentCallProcessor:
                 agent_name = await get_agent_name(agent_id)
                 logger.info(f"Generating call summary with agent name: {agent_name}")
                 
-                call_summary = AgentCallProcessor.generate_call_summary(
+                call_summary = await AgentCallProcessor.generate_call_summary(
                     transcript_content, 
                     agent_name=agent_name
                 )
@@ -397,7 +397,7 @@ class AgentCallProcessor:
                 course_info = "Generic interview assessment"
 
             # Generate AI feedback
-            feedback_data = AgentCallProcessor.analyze_interview_transcript(
+            feedback_data = await AgentCallProcessor.analyze_interview_transcript(
                 transcript_content, course_info
             )
             
@@ -464,7 +464,7 @@ class AgentCallProcessor:
             return False
 
     @staticmethod
-    def analyze_interview_transcript(transcript_content: str, course_info: str = "") -> Optional[InterviewFeedback]:
+    async def analyze_interview_transcript(transcript_content: str, course_info: str = "") -> Optional[InterviewFeedback]:
         """
         Analyze interview transcript using AI and generate structured feedback
         
@@ -515,7 +515,7 @@ class AgentCallProcessor:
             Return your analysis in JSON format with the specified fields.
             """
 
-            response = gemini_client.models.generate_content(
+            response = await agenerate_content(
                 model="gemini-2.5-flash-lite",
                 contents=[prompt],
                 config={
@@ -680,7 +680,7 @@ class AgentCallProcessor:
             return None
     
     @staticmethod
-    def generate_call_summary(transcript_content: str, agent_name: str = "Agent") -> str:
+    async def generate_call_summary(transcript_content: str, agent_name: str = "Agent") -> str:
         """
         Generate a call summary using Gemini based on the transcript content.
         """
@@ -697,7 +697,7 @@ class AgentCallProcessor:
                 f"{transcript_content}"
             )
 
-            response = gemini_client.models.generate_content(
+            response = await agenerate_content(
                 model="gemini-2.5-flash-lite",
                 contents=[prompt],
                 config={
@@ -736,7 +736,7 @@ class AgentCallProcessor:
             return f"Hi there, this is {agent_name}. A student called for assistance with interview preparation."
     
     @staticmethod
-    def populate_student_details(transcript_content: str, agent_name: str = "Agent") -> Student_details:
+    async def populate_student_details(transcript_content: str, agent_name: str = "Agent") -> Student_details:
         """
         Populate student details from the transcript using Gemini.
         Returns a Student_details object with extracted fields.
@@ -760,7 +760,7 @@ class AgentCallProcessor:
         )
 
         try:
-            response = gemini_client.models.generate_content(
+            response = await agenerate_content(
                 model="gemini-2.5-flash-lite",
                 contents=[prompt],
                 config={
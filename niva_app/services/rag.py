@@ -1,36 +1,205 @@
+import bisect
 import logging
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import islice
+from typing import Iterable, Iterator, List, Tuple, Union
+
 import fitz
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-
-logger = logging.getLogger("__name__")
-
-def process_pdf(pdf_path: str):
-    """Process pdf with improved memory management."""
-    try:
-        doc = fitz.open(pdf_path)
-        documents = []
-        
-        # Initialize text splitter
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1500,
-            chunk_overlap=200,
-            length_function=len
-        )
-        
-        for page_num in range(len(doc)):
-            page = doc.load_page(page_num)
-            text = page.get_text()
-            
-            if text.strip():
-                # Split page text into chunks
-                chunks = text_splitter.split_text(text)
-                for chunk in chunks:
-                    if chunk.strip():
-                        documents.append(chunk.strip())
-        
-        doc.close()
-        return documents
-            
-    except Exception as e:
-        logger.error(f"Error processing PDF with PyMuPDF: {e}")
-        return []
+from django.conf import settings
+
+from niva_app.lib.tokens import SENTENCE_END_TOKENS, iter_tokens
+
+logger = logging.getLogger(__name__)
+
+# A PDF on disk (path) or held in memory (raw bytes from an upload buffer)
+PdfSource = Union[str, bytes]
+
+# Separator inserted between pages when they are chunked as one text stream
+PAGE_SEPARATOR = "\n"
+
+@dataclass
+class Chunk:
+    """
+    A chunk of document text.
+
+    Attributes:
+        content (str): Chunk text
+        page_number (int): Page the chunk starts on (1-based)
+        start_offset (int): Character offset of the chunk in the document text
+            (the extracted pages joined with PAGE_SEPARATOR)
+        end_offset (int): Character offset just past the end of the chunk
+        token_count (int): Number of tokens in the chunk
+    """
+    content: str
+    page_number: int
+    start_offset: int
+    end_offset: int
+    token_count: int
+
+def open_pdf(source: PdfSource) -> fitz.Document:
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return fitz.open(stream=source, filetype="pdf")
+    return fitz.open(source)
+
+def get_page_count(source: PdfSource) -> int:
+    with open_pdf(source) as doc:
+        return doc.page_count
+
+def _extract_page_range(pdf_path: str, start: int, end: int) -> List[str]:
+    """Extract the text of pages [start, end). Runs inside process-pool workers."""
+    with fitz.open(pdf_path) as doc:
+        return [doc.load_page(page_num).get_text() for page_num in range(start, end)]
+
+def _iter_pages_sequential(source: PdfSource) -> Iterator[Tuple[int, str]]:
+    with open_pdf(source) as doc:
+        for page_num in range(doc.page_count):
+            yield page_num + 1, doc.load_page(page_num).get_text()
+
+def _iter_pages_parallel(pdf_path: str, page_count: int) -> Iterator[Tuple[int, str]]:
+    pages_per_task = settings.PDF_PAGES_PER_TASK
+    ranges = [
+        (start, min(start + pages_per_task, page_count))
+        for start in range(0, page_count, pages_per_task)
+    ]
+
+    with ProcessPoolExecutor(max_workers=settings.PDF_EXTRACTION_WORKERS) as pool:
+        # Keep only a bounded window of page ranges in flight so extracted
+        # text never piles up ahead of the embedding stage.
+        window = settings.PDF_EXTRACTION_WORKERS * 2
+        range_iter = iter(ranges)
+        in_flight = [
+            (start, pool.submit(_extract_page_range, pdf_path, start, end))
+            for start, end in islice(range_iter, window)
+        ]
+        while in_flight:
+            start, future = in_flight.pop(0)
+            for offset, text in enumerate(future.result()):
+                yield start + offset + 1, text
+            for next_start, next_end in islice(range_iter, 1):
+                in_flight.append((next_start, pool.submit(_extract_page_range, pdf_path, next_start, next_end)))
+
+def iter_pdf_pages(source: PdfSource) -> Iterator[Tuple[int, str]]:
+    """
+    Yield (page_number, text) for every page of a PDF, in order.
+
+    PDFs on disk with at least PDF_PROCESS_POOL_MIN_PAGES pages are extracted
+    in a process pool; smaller ones, in-memory PDFs (which would have to be
+    pickled to every worker) and environments where a pool can't be started,
+    such as daemonic Celery prefork children, are read sequentially.
+    """
+    if isinstance(source, str) and settings.PDF_EXTRACTION_WORKERS > 1:
+        page_count = get_page_count(source)
+        if page_count >= settings.PDF_PROCESS_POOL_MIN_PAGES:
+            try:
+                yield from _iter_pages_parallel(source, page_count)
+                return
+            except AssertionError as e:
+                # "daemonic processes are not allowed to have children"
+                logger.warning(f"Process pool unavailable for PDF extraction, falling back to sequential: {e}")
+
+    yield from _iter_pages_sequential(source)
+
+def _chunk_end(tokens: List, text: str, end: int, min_end: int) -> int:
+    """
+    Move a chunk end back to the last sentence or line break in [min_end, end].
+    """
+    for index in range(end, min_end - 1, -1):
+        token = tokens[index - 1]
+        if token.group() in SENTENCE_END_TOKENS:
+            return index
+        if index < len(tokens) and "\n" in text[token.end():tokens[index].start()]:
+            return index
+    return end
+
+def iter_chunks(
+    pages: Iterable[Tuple[int, str]],
+    chunk_tokens: int = None,
+    overlap_tokens: int = None,
+) -> Iterator[Chunk]:
+    """
+    Split a stream of (page_number, text) pages into token-sized chunks.
+
+    Pages are chunked as one continuous text, so a chunk can span a page
+    break. Chunks hold up to `chunk_tokens` tokens, end on a sentence or line
+    break when one falls in the last quarter of the window, and consecutive
+    chunks share `overlap_tokens` tokens. Only the text not yet emitted (plus
+    the overlap) is kept in memory.
+
+    Args:
+        pages (Iterable[Tuple[int, str]]): Page numbers and texts, in order
+        chunk_tokens (int): Maximum tokens per chunk (defaults to CHUNK_TOKENS)
+        overlap_tokens (int): Tokens shared by consecutive chunks (defaults to CHUNK_OVERLAP_TOKENS)
+
+    Returns:
+        Iterator[Chunk]: Chunks in document order
+    """
+    chunk_tokens = chunk_tokens or settings.CHUNK_TOKENS
+    overlap_tokens = settings.CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+    if overlap_tokens >= chunk_tokens:
+        raise ValueError("overlap_tokens must be smaller than chunk_tokens")
+
+    buffer = ""
+    buffer_offset = 0  # document offset of buffer[0]
+    page_offsets: List[int] = []  # document offset where each buffered page starts
+    page_numbers: List[int] = []
+
+    def emit(final: bool) -> Iterator[Chunk]:
+        nonlocal buffer, buffer_offset
+        tokens = list(iter_tokens(buffer))
+        position = 0
+
+        # Until the last page is in, only emit windows followed by at least one
+        # more token, so chunk boundaries don't depend on where pages break
+        while position < len(tokens) and (final or len(tokens) - position > chunk_tokens):
+            end = min(position + chunk_tokens, len(tokens))
+            if end < len(tokens):
+                end = _chunk_end(tokens, buffer, end, position + (chunk_tokens * 3) // 4)
+
+            start_char = tokens[position].start()
+            end_char = tokens[end - 1].end()
+            start_offset = buffer_offset + start_char
+            page_index = bisect.bisect_right(page_offsets, start_offset) - 1
+
+            yield Chunk(
+                content=buffer[start_char:end_char],
+                page_number=page_numbers[max(page_index, 0)],
+                start_offset=start_offset,
+                end_offset=buffer_offset + end_char,
+                token_count=end - position
+            )
+
+            if end == len(tokens):
+                position = end
+                break
+            position = max(end - overlap_tokens, position + 1)
+
+        # Drop emitted text and the pages that are no longer referenced
+        cut = tokens[position].start() if position < len(tokens) else len(buffer)
+        buffer = buffer[cut:]
+        buffer_offset += cut
+        first_page = max(bisect.bisect_right(page_offsets, buffer_offset) - 1, 0)
+        del page_offsets[:first_page]
+        del page_numbers[:first_page]
+
+    for page_number, text in pages:
+        if page_offsets or buffer:
+            buffer += PAGE_SEPARATOR
+        page_offsets.append(buffer_offset + len(buffer))
+        page_numbers.append(page_number)
+        buffer += text
+        yield from emit(final=False)
+
+    if page_numbers:
+        yield from emit(final=True)
+
+def iter_pdf_chunks(source: PdfSource) -> Iterator[Chunk]:
+    """
+    Stream chunks from a PDF (path or bytes) without materialising the whole document.
+    """
+    return iter_chunks(iter_pdf_pages(source))
+
+def iter_batches(items: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
@@ -0,0 +1,495 @@
+import logging
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import reduce
+from typing import List, Optional
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F, Q, QuerySet
+from pgvector import HalfVector
+from pgvector.django import CosineDistance, HammingDistance
+
+from niva_app.lib.diversity import duplicate_tokens_avoided, mmr_select, normalize_rows
+from niva_app.lib.embeddings import quantize_binary, reduce_embedding
+from niva_app.models import Document, Memory
+
+logger = logging.getLogger(__name__)
+
+STORAGE_FULL = "full"
+STORAGE_HALFVEC = "halfvec"
+STORAGE_BINARY = "binary"
+STORAGE_MODES = (STORAGE_FULL, STORAGE_HALFVEC, STORAGE_BINARY)
+
+# Indexed column searched for candidates in each storage mode
+CANDIDATE_FIELDS = {
+    STORAGE_FULL: "embedding_reduced",
+    STORAGE_HALFVEC: "embedding_half",
+    STORAGE_BINARY: "embedding_binary",
+}
+# HNSW operator class of each candidate column
+CANDIDATE_OPCLASSES = {
+    STORAGE_FULL: "vector_cosine_ops",
+    STORAGE_HALFVEC: "halfvec_cosine_ops",
+    STORAGE_BINARY: "bit_hamming_ops",
+}
+
+# Postgres text search configuration per course language. Hindi, Tamil and
+# Malayalam have no built-in configuration, so they are indexed with "simple"
+# (lower-cased words, no stemming or stop words).
+SEARCH_CONFIGS = {"en": "english"}
+DEFAULT_SEARCH_CONFIG = "simple"
+
+QUERY_TERM_PATTERN = re.compile(r"\w+")
+
+# Threads that run the lexical and vector halves of a hybrid search in parallel
+SEARCH_WORKERS = 8
+
+_search_pool: Optional[ThreadPoolExecutor] = None
+_search_pool_lock = threading.Lock()
+
+def _get_search_pool() -> ThreadPoolExecutor:
+    # Created on first use rather than at import, so prefork workers (Celery,
+    # gunicorn) each start their own threads
+    global _search_pool
+    with _search_pool_lock:
+        if _search_pool is None:
+            _search_pool = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="hybrid-search")
+        return _search_pool
+
+def course_memories(course_id, agent_id=None) -> QuerySet:
+    """
+    Active memories of a course visible to an agent: shared ones (no agent)
+    and the agent's own. Without an agent, all active memories of the course.
+    """
+    memories = Memory.objects.filter(course_id=course_id, is_active=True)
+    if agent_id:
+        memories = memories.filter(Q(agent_id=agent_id) | Q(agent__isnull=True))
+    return memories
+
+def course_documents(course_id, agent_id=None) -> QuerySet:
+    """
+    Documents of the memories returned by `course_memories`, filtered in the same query.
+    """
+    documents = Document.objects.filter(course_id=course_id, memory__is_active=True)
+    if agent_id:
+        documents = documents.filter(Q(memory__agent_id=agent_id) | Q(memory__agent__isnull=True))
+    return documents
+
+def get_search_config(language: Optional[str]) -> str:
+    return SEARCH_CONFIGS.get(language, DEFAULT_SEARCH_CONFIG)
+
+def update_search_vectors(documents: QuerySet, language: Optional[str]) -> int:
+    """
+    (Re)build the full-text search vector of documents.
+
+    Args:
+        documents (QuerySet): Documents to update
+        language (str): Course language code
+
+    Returns:
+        int: Number of rows updated
+    """
+    return documents.update(search_vector=SearchVector("content", config=get_search_config(language)))
+
+def get_storage_mode(mode: Optional[str] = None) -> str:
+    mode = mode or settings.EMBEDDING_STORAGE_MODE
+    if mode not in STORAGE_MODES:
+        raise ImproperlyConfigured(
+            f"EMBEDDING_STORAGE_MODE must be one of {', '.join(STORAGE_MODES)}, got '{mode}'"
+        )
+    return mode
+
+def document_embedding_fields(embedding, mode: Optional[str] = None) -> dict:
+    """
+    Build the embedding columns to store on a Document for a storage mode.
+
+    Args:
+        embedding: Full-dimensional embedding
+        mode (str): Storage mode (defaults to EMBEDDING_STORAGE_MODE)
+
+    Returns:
+        dict: Document field values
+    """
+    mode = get_storage_mode(mode)
+
+    fields = {}
+    if mode == STORAGE_FULL or settings.EMBEDDING_KEEP_FULL_PRECISION:
+        fields["embedding"] = embedding
+    if mode == STORAGE_FULL:
+        fields["embedding_reduced"] = reduce_embedding(embedding)
+    else:
+        # halfvec is also what binary candidates are rescored against when
+        # no float32 copy is kept
+        fields["embedding_half"] = HalfVector(embedding)
+    if mode == STORAGE_BINARY:
+        fields["embedding_binary"] = quantize_binary(embedding)
+    return fields
+
+def _candidate_distance(mode: str, query_embedding):
+    field = CANDIDATE_FIELDS[mode]
+    if mode == STORAGE_FULL:
+        return field, CosineDistance(field, reduce_embedding(query_embedding))
+    if mode == STORAGE_HALFVEC:
+        return field, CosineDistance(field, HalfVector(query_embedding))
+    return field, HammingDistance(field, quantize_binary(query_embedding))
+
+def _rescore_field(mode: str) -> Optional[str]:
+    """Column holding the most precise vectors available to rescore candidates of a mode."""
+    if mode == STORAGE_FULL or settings.EMBEDDING_KEEP_FULL_PRECISION:
+        return "embedding"
+    if mode == STORAGE_BINARY:
+        return "embedding_half"
+    # halfvec candidates are already compared at the best precision stored
+    return None
+
+def search_documents(
+    documents: QuerySet,
+    query_embedding,
+    k: int = 5,
+    fields=("content", "created_at"),
+    mode: Optional[str] = None,
+    rescore: Optional[bool] = None,
+    timeout_ms: Optional[int] = None,
+) -> List[dict]:
+    """
+    Return the top-k documents most similar to a query embedding.
+
+    Candidates come from the HNSW index on the storage mode's compact column
+    (reduced float32, halfvec or binary), so the search is approximate and
+    sub-linear in the number of chunks. When rescoring, k * EMBEDDING_RESCORE_FACTOR
+    candidates are re-ranked by exact cosine distance on the most precise
+    vectors stored. Binary candidates are always rescored, since Hamming
+    distance is not a cosine similarity. Either way the search is a single
+    SQL statement.
+
+    The index covers the whole table and `documents` is filtered afterwards,
+    so for a small course or memory most index candidates belong to other
+    rows. With pgvector 0.8+ the scan continues until enough filtered rows are
+    found (hnsw.iterative_scan, see HNSW_ITERATIVE_SCAN). If the search still
+    returns fewer than k rows, an exact scan of the filtered set is used
+    instead. Rows whose compact column is empty (a storage mode switched
+    without running `backfill_reduced_embeddings`) are only found by that scan.
+
+    Args:
+        documents (QuerySet): Document queryset to search (e.g. filtered by memory)
+        query_embedding: Full-dimensional query embedding
+        k (int): Number of results
+        fields (tuple): Document fields to return alongside `similarity`
+        mode (str): Storage mode to search (defaults to EMBEDDING_STORAGE_MODE)
+        rescore (bool): Rescore candidates (defaults to EMBEDDING_RESCORE_FACTOR > 0)
+        timeout_ms (int): Cancel the query if it runs longer than this (Postgres
+            statement_timeout; raises django.db.OperationalError)
+
+    Returns:
+        List[dict]: Matching rows with a `similarity` (1 - cosine distance), best first
+    """
+    mode = get_storage_mode(mode)
+    if rescore is None:
+        rescore = settings.EMBEDDING_RESCORE_FACTOR > 0
+    rescore_field = _rescore_field(mode) if rescore or mode == STORAGE_BINARY else None
+    candidate_count = k * max(settings.EMBEDDING_RESCORE_FACTOR, 1) if rescore_field else k
+
+    field, distance = _candidate_distance(mode, query_embedding)
+
+    with transaction.atomic():
+        # Only affects this transaction; raises the HNSW candidate list so
+        # filtered searches still find enough rows
+        with connection.cursor() as cursor:
+            cursor.execute(f"SET LOCAL hnsw.ef_search = {int(max(settings.HNSW_EF_SEARCH, candidate_count))}")
+            if settings.HNSW_ITERATIVE_SCAN and _supports_iterative_scan():
+                cursor.execute(f"SET LOCAL hnsw.iterative_scan = {settings.HNSW_ITERATIVE_SCAN}")
+            if timeout_ms:
+                cursor.execute(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+
+        # The index is only used when ordering by ascending distance, so
+        # similarity is derived from it rather than sorted on directly
+        candidates = (
+            documents
+            .filter(**{f"{field}__isnull": False})
+            .annotate(distance=distance)
+            .order_by("distance")
+        )
+
+        if not rescore_field:
+            rows = list(
+                candidates
+                .annotate(similarity=1 - F("distance"))
+                .values(*fields, "similarity")
+                [:k]
+            )
+            # A relaxed iterative scan may return rows slightly out of order
+            rows.sort(key=lambda row: row["similarity"], reverse=True)
+        else:
+            # Candidates are selected in a subquery so rescoring stays one round trip
+            rescore_query = query_embedding if rescore_field == "embedding" else HalfVector(query_embedding)
+            rows = list(
+                Document.objects
+                .filter(id__in=candidates.values("id")[:candidate_count])
+                .annotate(distance=CosineDistance(rescore_field, rescore_query))
+                .annotate(similarity=1 - F("distance"))
+                .order_by("distance")
+                .values(*fields, "similarity")
+                [:k]
+            )
+
+        if len(rows) < k:
+            # Too few candidates survived the filter: the filtered set is
+            # small, so scan it exactly
+            rows = _exact_search(documents, query_embedding, k, fields, mode)
+        return rows
+
+def _exact_search(documents: QuerySet, query_embedding, k: int, fields, mode: str) -> List[dict]:
+    """Exact top-k on the most precise embedding column stored in a storage mode."""
+    if mode == STORAGE_FULL or settings.EMBEDDING_KEEP_FULL_PRECISION:
+        field, query = "embedding", query_embedding
+    else:
+        field, query = "embedding_half", HalfVector(query_embedding)
+    return list(
+        documents
+        .filter(**{f"{field}__isnull": False})
+        .annotate(distance=CosineDistance(field, query))
+        .annotate(similarity=1 - F("distance"))
+        .order_by("distance")
+        .values(*fields, "similarity")
+        [:k]
+    )
+
+_iterative_scan_supported: Optional[bool] = None
+
+def _supports_iterative_scan() -> bool:
+    """Whether the installed pgvector (0.8+) has hnsw.iterative_scan; checked once per process."""
+    global _iterative_scan_supported
+    if _iterative_scan_supported is None:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+            row = cursor.fetchone()
+        version = tuple(int(part) for part in re.findall(r"\d+", row[0])[:2]) if row else (0, 0)
+        _iterative_scan_supported = version >= (0, 8)
+    return _iterative_scan_supported
+
+def exact_search_documents(documents: QuerySet, query_embedding, k: int = 5, fields=("content", "created_at")) -> List[dict]:
+    """
+    Exact top-k by cosine distance on the full-precision embedding (sequential scan).
+
+    Used as the ground truth when benchmarking the approximate search.
+    """
+    return list(
+        documents
+        .filter(embedding__isnull=False)
+        .annotate(distance=CosineDistance("embedding", query_embedding))
+        .annotate(similarity=1 - F("distance"))
+        .order_by("distance")
+        .values(*fields, "similarity")
+        [:k]
+    )
+
+def lexical_search_documents(
+    documents: QuerySet,
+    query: str,
+    language: Optional[str] = None,
+    k: int = 5,
+    fields=("content", "created_at"),
+    timeout_ms: Optional[int] = None,
+) -> List[dict]:
+    """
+    Top-k documents by full-text rank (GIN index on `Document.search_vector`).
+
+    Query terms are OR-ed together, so a chunk matching only the exact term
+    that matters (an article number, an acronym) is still found, and chunks
+    matching more terms rank higher.
+
+    Args:
+        documents (QuerySet): Document queryset to search
+        query (str): Query text
+        language (str): Course language code, selects the text search configuration
+        k (int): Number of results
+        fields (tuple): Document fields to return alongside `rank`
+        timeout_ms (int): Postgres statement_timeout for the query
+
+    Returns:
+        List[dict]: Matching rows with a `rank`, best first
+    """
+    config = get_search_config(language)
+    terms = QUERY_TERM_PATTERN.findall(query)
+    if not terms:
+        return []
+    search_query = reduce(
+        lambda combined, term: combined | term,
+        (SearchQuery(term, config=config, search_type="plain") for term in terms)
+    )
+
+    with transaction.atomic():
+        if timeout_ms:
+            with connection.cursor() as cursor:
+                cursor.execute(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+
+        return list(
+            documents
+            .filter(search_vector=search_query)
+            .annotate(rank=SearchRank(F("search_vector"), search_query, cover_density=True))
+            .order_by("-rank")
+            .values(*fields, "rank")
+            [:k]
+        )
+
+def diversity_field(mode: Optional[str] = None) -> str:
+    """Compact embedding column compared between candidates when diversifying results."""
+    return "embedding_reduced" if get_storage_mode(mode) == STORAGE_FULL else "embedding_half"
+
+def diversify_rows(rows: List[dict], k: int, relevance_key: str, embedding_key: Optional[str] = None) -> List[dict]:
+    """
+    Reduce candidate rows to k by Maximal Marginal Relevance, dropping near-duplicates.
+
+    Uses MMR_LAMBDA, DEDUP_EMBEDDING_THRESHOLD and DEDUP_TEXT_THRESHOLD, and
+    logs how many prompt tokens of duplicate chunks the plain top-k would
+    have contained.
+
+    Args:
+        rows (List[dict]): Candidates with `content`, most relevant first
+        k (int): Number of results
+        relevance_key (str): Row key holding the relevance score
+        embedding_key (str): Row key holding the candidate embedding (removed
+            from the returned rows); without it only text duplicates are dropped
+
+    Returns:
+        List[dict]: Selected rows, in selection order
+    """
+    if not rows:
+        return rows
+
+    texts = [row["content"] for row in rows]
+    vectors = [
+        row.pop(embedding_key, None) if embedding_key else None
+        for row in rows
+    ]
+    vectors = [
+        vector.to_numpy() if hasattr(vector, "to_numpy") else vector
+        for vector in vectors
+    ]
+    selection = mmr_select(
+        [row[relevance_key] for row in rows],
+        normalize_rows(vectors),
+        texts,
+        k,
+        lambda_mult=settings.MMR_LAMBDA,
+        embedding_threshold=settings.DEDUP_EMBEDDING_THRESHOLD,
+        text_threshold=settings.DEDUP_TEXT_THRESHOLD
+    )
+
+    avoided = duplicate_tokens_avoided(texts, selection, k)
+    if avoided:
+        logger.info(f"Diversified {len(rows)} candidates to {len(selection.selected)} chunks, avoiding {avoided} duplicate tokens")
+    return [rows[i] for i in selection.selected]
+
+def _in_search_thread(function, *args, **kwargs):
+    # Pool threads live outside Django's request cycle: drop connections that
+    # broke since the thread last ran, and close the thread's connection when
+    # done so idle pool threads don't each hold one (CONN_MAX_AGE would keep
+    # it open for an hour)
+    close_old_connections()
+    try:
+        return function(*args, **kwargs)
+    finally:
+        connection.close()
+
+def hybrid_search_documents(
+    documents: QuerySet,
+    query: str,
+    query_embedding,
+    language: Optional[str] = None,
+    k: int = 5,
+    fields=("content", "created_at"),
+    timeout_ms: Optional[int] = None,
+) -> List[dict]:
+    """
+    Top-k documents by reciprocal-rank fusion of full-text and vector search.
+
+    The lexical and vector queries run in parallel, each returning
+    HYBRID_CANDIDATES rows, and every document is scored
+    sum(1 / (HYBRID_RRF_K + rank)) over the lists it appears in. The fused
+    candidates are then diversified (see `diversify_rows`).
+
+    Args:
+        documents (QuerySet): Document queryset to search
+        query (str): Query text
+        query_embedding: Full-dimensional query embedding
+        language (str): Course language code, selects the text search configuration
+        k (int): Number of results
+        fields (tuple): Document fields to return
+        timeout_ms (int): Postgres statement_timeout for each query
+
+    Returns:
+        List[dict]: Rows with `score` (fused), `similarity` (cosine, None if only
+            matched lexically) and `lexical_rank`, best first
+    """
+    candidates = max(settings.HYBRID_CANDIDATES, k)
+    embedding_field = diversity_field()
+    fields = tuple(dict.fromkeys(("id", "content", *fields, embedding_field)))
+
+    search_pool = _get_search_pool()
+    vector_future = search_pool.submit(
+        _in_search_thread, search_documents,
+        documents, query_embedding, k=candidates, fields=fields, timeout_ms=timeout_ms
+    )
+    lexical_future = search_pool.submit(
+        _in_search_thread, lexical_search_documents,
+        documents, query, language=language, k=candidates, fields=fields, timeout_ms=timeout_ms
+    )
+    vector_rows = vector_future.result()
+    lexical_rows = lexical_future.result()
+
+    fused = {}
+    for rank, row in enumerate(vector_rows, start=1):
+        entry = fused.setdefault(row["id"], {**row, "score": 0.0, "lexical_rank": None})
+        entry["score"] += 1 / (settings.HYBRID_RRF_K + rank)
+    for rank, row in enumerate(lexical_rows, start=1):
+        entry = fused.setdefault(row["id"], {**row, "score": 0.0, "similarity": None})
+        entry.pop("rank", None)
+        entry["lexical_rank"] = rank
+        entry["score"] += 1 / (settings.HYBRID_RRF_K + rank)
+
+    ranked = sorted(fused.values(), key=lambda entry: entry["score"], reverse=True)
+    return diversify_rows(ranked, k, "score", embedding_field)
+
+def search_course(
+    course_id,
+    query: str,
+    query_embedding,
+    language: Optional[str] = None,
+    k: int = 5,
+    fields=("content", "created_at"),
+    timeout_ms: Optional[int] = None,
+    agent_id=None,
+) -> List[dict]:
+    """
+    Hybrid top-k chunks across the memories of a course visible to an agent
+    (see `course_documents`).
+
+    Filters on the denormalized `Document.course_id`, so a per-course partial
+    HNSW index (see `create_course_vector_index`) is used when one exists.
+    """
+    return hybrid_search_documents(
+        course_documents(course_id, agent_id),
+        query,
+        query_embedding,
+        language=language,
+        k=k,
+        fields=fields,
+        timeout_ms=timeout_ms
+    )
+
+def search_memory(memory_id, query: str, query_embedding, language: Optional[str] = None, k: int = 5) -> List[dict]:
+    """
+    Hybrid top-k chunks of a single memory.
+    """
+    return hybrid_search_documents(
+        Document.objects.filter(memory_id=memory_id),
+        query,
+        query_embedding,
+        language=language,
+        k=k
+    )
@@ -0,0 +1,58 @@
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+BUFFER_KEY_PREFIX = "ingestion-buffer"
+
+# Cache alias backed by its own Redis database (see CACHES in settings)
+BUFFER_CACHE = "ingestion_buffer"
+
+@dataclass
+class BufferedUpload:
+    """An uploaded file held in Redis until the ingestion worker has stored it in S3."""
+    s3_key: str
+    content: bytes
+    content_type: str
+
+def _buffer_key(job_id) -> str:
+    return f"{BUFFER_KEY_PREFIX}:{job_id}"
+
+def can_buffer_upload(file) -> bool:
+    """
+    Check whether an uploaded file is small enough to be handed to the worker in memory.
+    """
+    size = getattr(file, "size", None)
+    return size is not None and size <= settings.INGESTION_BUFFER_MAX_BYTES
+
+def stash_upload(job_id, upload: BufferedUpload):
+    """
+    Store an uploaded file for the ingestion worker.
+
+    Args:
+        job_id: IngestionJob id the upload belongs to
+        upload (BufferedUpload): Upload contents and destination S3 key
+    """
+    caches[BUFFER_CACHE].set(_buffer_key(job_id), upload, timeout=settings.INGESTION_BUFFER_TTL)
+
+def get_upload(job_id) -> Optional[BufferedUpload]:
+    """
+    Fetch a stashed upload, or None if it was never buffered or has expired.
+
+    The buffer is kept until `discard_upload` so a redelivered task can reuse it.
+    """
+    try:
+        return caches[BUFFER_CACHE].get(_buffer_key(job_id))
+    except Exception as e:
+        logger.warning(f"Failed to read upload buffer for job {job_id}: {e}")
+        return None
+
+def discard_upload(job_id):
+    try:
+        caches[BUFFER_CACHE].delete(_buffer_key(job_id))
+    except Exception as e:
+        logger.warning(f"Failed to discard upload buffer for job {job_id}: {e}")
@@ -0,0 +1,55 @@
+import logging
+
+from celery import shared_task
+from django.utils import timezone
+
+from niva_app.models import IngestionJob, IngestionStatus
+
+logger = logging.getLogger(__name__)
+
+@shared_task(name="niva_app.tasks.ingest_document")
+def ingest_document(job_id: str) -> str:
+    """
+    Extract, embed and index an uploaded document for an IngestionJob.
+
+    Progress and failures are recorded on the job itself, so the task result
+    is only the final job status.
+    """
+    # Import here to avoid circular import
+    from niva_app.services.agent_memory import MemoryService
+
+    try:
+        job = IngestionJob.objects.select_related("course").get(id=job_id)
+    except IngestionJob.DoesNotExist:
+        logger.error(f"Ingestion job {job_id} not found")
+        return IngestionStatus.FAILED
+
+    if job.status == IngestionStatus.INDEXED:
+        logger.info(f"Ingestion job {job_id} already indexed, skipping")
+        return job.status
+
+    try:
+        MemoryService(job.course).run_ingestion_job(job)
+    except Exception as e:
+        logger.error(f"Ingestion job {job_id} failed: {e}")
+        # Failures inside the pipeline are already stored on the job
+        if job.status != IngestionStatus.FAILED:
+            job.update_progress(
+                status=IngestionStatus.FAILED,
+                error=str(e),
+                finished_at=timezone.now()
+            )
+
+    return job.status
+
+@shared_task(name="niva_app.tasks.build_course_context")
+def build_course_context(course_id: str, agent_id: str) -> bool:
+    """
+    Regenerate the precomputed interview context of a course for an agent.
+
+    Returns whether a new context was stored (False if it was already current).
+    """
+    # Import here to avoid circular import
+    from pipecat_agents.services.agent_context import AgentContextService
+
+    return AgentContextService.refresh_course_context(course_id, agent_id)
@@ -0,0 +1,28 @@
+import unicodedata
+from unittest import TestCase
+
+from niva_app.lib.tokens import count_tokens, iter_tokens
+
+
+class CountTokensTests(TestCase):
+    def assert_no_lone_marks(self, text):
+        for token in iter_tokens(text):
+            self.assertFalse(
+                unicodedata.category(token.group()[0]).startswith("M"),
+                f"Token {token.group()!r} starts with a combining mark"
+            )
+
+    def test_devanagari_vowel_signs_stay_with_their_letters(self):
+        self.assertEqual(count_tokens("नमस्ते दुनिया"), 3)
+        self.assert_no_lone_marks("नमस्ते दुनिया")
+
+    def test_malayalam_vowel_signs_stay_with_their_letters(self):
+        self.assertEqual(count_tokens("നമസ്കാരം ലോകം"), 3)
+        self.assert_no_lone_marks("നമസ്കാരം ലോകം")
+
+    def test_tamil_vowel_signs_stay_with_their_letters(self):
+        self.assertEqual(count_tokens("வணக்கம் உலகம்"), 4)
+        self.assert_no_lone_marks("வணக்கம் உலகம்")
+
+    def test_latin_words_numbers_and_punctuation(self):
+        self.assertEqual(count_tokens("Hello, world! 12345"), 6)
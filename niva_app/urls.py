@@ -14,6 +14,9 @@ from niva_app.api.agents.views import (
 
 from niva_app.api.agent_memory.views import (
     AddMemory,
+    UpdateMemory,
+    IngestionJobStatus,
+    EmbeddingCacheStats,
     MemoryDelete,
     MemoryContent,
     MemorySummary,
@@ -79,6 +82,9 @@ agent_routes = [
 # Agent Memory routes
 agent_memory_routes = [
     path('<uuid:course_id>/add-memory/', AddMemory.as_view(), name='add-memory'),
+    path('<uuid:course_id>/update-memory/<uuid:memory_id>/', UpdateMemory.as_view(), name='update-memory'),
+    path('<uuid:course_id>/ingestion-jobs/<uuid:job_id>/', IngestionJobStatus.as_view(), name='ingestion-job-status'),
+    path('embedding-cache/stats/', EmbeddingCacheStats.as_view(), name='embedding-cache-stats'),
     path('<uuid:course_id>/delete-memory/<uuid:memory_id>/', MemoryDelete.as_view(), name='delete-memory'),
     path('<uuid:course_id>/memory/<uuid:memory_id>/content/', MemoryContent.as_view(), name='memory-content'),
     path('<uuid:course_id>/memory/<uuid:memory_id>/summary/', MemorySummary.as_view(), name='memory-summary'),
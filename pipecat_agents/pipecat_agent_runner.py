@@ -42,6 +42,7 @@ from pipecat_agents.services.agent_llm_service import (
     inbound_handlers_register,
     configure_language_services
 )
+from pipecat_agents.services.call_bootstrap import CallBootstrap, load_call_bootstrap
 
 logger = logging.getLogger(__name__)
 
@@ -392,14 +393,16 @@ class PipecatAgentRunner:
             await self.cleanup_temp_files()
     
     async def run_inbound_agent(self, room_url: str, token: str, call_id: str, 
-                            sip_uri: str, session_id: str, course_id: str, agent_id: str, caller_number: str = None, student_id: str = None):
+                            sip_uri: str, session_id: str, course_id: str, agent_id: str, caller_number: str = None, student_id: str = None,
+                            bootstrap: CallBootstrap = None):
         """
         Entry point for voice conversations with flow management.
         Routes to LLM agent based on agent language and model.
         """
         try:
             await self.run_inbound_agent_llm(
-                    room_url, token, call_id, sip_uri, session_id, course_id, agent_id, caller_number, student_id
+                    room_url, token, call_id, sip_uri, session_id, course_id, agent_id, caller_number, student_id,
+                    bootstrap
                 )
         except ObjectDoesNotExist:
             logger.error(f"Agent with ID {agent_id} not found")
@@ -409,9 +412,12 @@ class PipecatAgentRunner:
             raise
     
     async def run_inbound_agent_llm(self, room_url: str, token: str, call_id: str, 
-                            sip_uri: str, session_id: str, course_id: str, agent_id: str, caller_number: str = None, student_id: str = None):
+                            sip_uri: str, session_id: str, course_id: str, agent_id: str, caller_number: str = None, student_id: str = None,
+                            bootstrap: CallBootstrap = None):
         """
         Entry point for inbound voice conversations with flow management for agent_llm.
+        The bootstrap (agent, course, language) is loaded here unless the agent
+        service already loaded it, and shared by the rest of the call setup.
         """
         logger.info(f"Starting inbound agent for session: {session_id}, course: {course_id}, agent: {agent_id}")
         
@@ -419,8 +425,16 @@ class PipecatAgentRunner:
         
         self.session_start_time = datetime.datetime.now()
 
+        if bootstrap is None:
+            try:
+                bootstrap = await load_call_bootstrap(course_id, agent_id)
+            except Exception as e:
+                logger.error(f"Failed to load call bootstrap: {e}")
+
         try:
-            agent_system_instruction = await get_inbound_agent_context(course_id, agent_id)
+            if bootstrap is None:
+                raise ValueError("Agent or course not found or not active")
+            agent_system_instruction = await get_inbound_agent_context(course_id, agent_id, bootstrap)
             logger.info(f"✅ Successfully loaded agent context for agent {agent_id}, course {course_id}")
             logger.info(f"Context preview (first 500 chars): {agent_system_instruction[:500]}...")
             print("Successfully loaded agent context for agent {agent_id}")
@@ -432,10 +446,13 @@ class PipecatAgentRunner:
             print(e)
             # Try to get at least the agent and course names for the fallback
             try:
-                from niva_app.models.agents import Agent
-                from niva_app.models.course import Course
-                agent = await sync_to_async(Agent.objects.get)(id=agent_id)
-                course = await sync_to_async(Course.objects.get)(id=course_id)
+                if bootstrap is not None:
+                    agent, course = bootstrap.agent, bootstrap.course
+                else:
+                    from niva_app.models.agents import Agent
+                    from niva_app.models.course import Course
+                    agent = await sync_to_async(Agent.objects.get)(id=agent_id)
+                    course = await sync_to_async(Course.objects.get)(id=course_id)
                 agent_name = agent.name
                 course_name = course.name
                 logger.info(f"Retrieved agent name: {agent_name}, course name: {course_name}")
@@ -489,7 +506,7 @@ class PipecatAgentRunner:
             )
         )
 
-        stt, tts= await configure_language_services(agent_id)
+        stt, tts= await configure_language_services(agent_id, bootstrap.language if bootstrap else None)
 
         # Setup the conversational context
         context = OpenAILLMContext()
@@ -537,6 +554,10 @@ class PipecatAgentRunner:
             flow_config=self.flow_config,
         )
         
+        # Used by the lookup_course_material handler
+        self.flow_manager.state["course_id"] = course_id
+        self.flow_manager.state["agent_id"] = agent_id
+
         logger.info(f"✅ FlowManager initialized with flow config: {list(self.flow_config.get('nodes', {}).keys())}")
 
         # Register all inbound function handlers
@@ -1,15 +1,48 @@
+import asyncio
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import close_old_connections, connection
 from asgiref.sync import sync_to_async
 from niva_app.models.agents import Agent
 from niva_app.models.course import Course
-from niva_app.models.memory import Memory
-from niva_app.models.rag import Document
-from niva_app.management.commands.query_agent_memory import gemini_client
+from niva_app.models.course_context import CourseContext
+from niva_app.lib.llm_gateway import generate_content
+from niva_app.lib.packing import pack_chunks
+from niva_app.services.embedding_cache import embed_query
+from niva_app.services.course_context import course_context_version, schedule_course_context_refresh
+from niva_app.services.course_index import search_course_index
+from niva_app.services.retrieval import (
+    course_documents,
+    course_memories,
+    diversify_rows,
+    diversity_field,
+    search_course,
+    search_documents,
+)
 import numpy as np
 
 logger = logging.getLogger(__name__)
 
+# Threads for live-call course lookups
+LOOKUP_WORKERS = 4
+
+_lookup_pool: Optional[ThreadPoolExecutor] = None
+_lookup_pool_lock = threading.Lock()
+
+def _get_lookup_pool() -> ThreadPoolExecutor:
+    # Created on first use, so forked workers get their own threads
+    global _lookup_pool
+    with _lookup_pool_lock:
+        if _lookup_pool is None:
+            _lookup_pool = ThreadPoolExecutor(max_workers=LOOKUP_WORKERS, thread_name_prefix="course-lookup")
+        return _lookup_pool
+
 class AgentContextService:
     """Service to fetch and build agent context dynamically for interview preparation."""
 
@@ -70,15 +103,7 @@ class AgentContextService:
             logger.info(f"Agent found: {agent.name}, language: {agent.language}")
             logger.info(f"Course found: {course.name}, type: Interview Preparation")
             
-            # Get dynamic context from course documents
-            logger.info("Extracting dynamic context from course documents...")
-            dynamic_context = AgentContextService._get_dynamic_context_for_course(course)
-            context = AgentContextService._build_interview_context(agent, course, dynamic_context)
-            
-            logger.info(f"Final context length: {len(context)} characters")
-            logger.info(f"Context preview (first 500 chars): {context[:500]}...")
-            
-            return context
+            return AgentContextService._build_agent_context(agent, course)
                 
         except ObjectDoesNotExist:
             logger.error(f"Agent {agent_id} not found or course {course_id} not found")
@@ -89,7 +114,104 @@ class AgentContextService:
             raise ValueError(f"Failed to load agent context: {str(e)}")
     
     @staticmethod
-    def _get_dynamic_context_for_course(course: Course) -> str:
+    @sync_to_async
+    def build_agent_context(agent: Agent, course: Course) -> str:
+        """
+        Build the system instruction for an agent and course that are already loaded
+        (e.g. by the call bootstrap), without looking them up again.
+
+        Args:
+            agent: Agent
+            course: Course
+
+        Returns:
+            str: System instruction/context for the interview agent
+        """
+        try:
+            return AgentContextService._build_agent_context(agent, course)
+        except Exception as e:
+            logger.error(f"Error building agent context: {e}")
+            logger.exception("Full traceback:")
+            raise ValueError(f"Failed to load agent context: {str(e)}")
+
+    @staticmethod
+    def _build_agent_context(agent: Agent, course: Course) -> str:
+        # Precomputed in the background whenever the course or its memories change
+        dynamic_context = AgentContextService._get_course_context(course, agent)
+        context = AgentContextService._build_interview_context(agent, course, dynamic_context)
+
+        logger.info(f"Final context length: {len(context)} characters")
+        logger.info(f"Context preview (first 500 chars): {context[:500]}...")
+
+        return context
+
+    @staticmethod
+    def _get_course_context(course: Course, agent: Agent) -> str:
+        """
+        Get the precomputed course context for the agent.
+
+        Never extracts it at call start: if the stored context is out of date
+        (or missing), a background refresh is scheduled and the stale context
+        (or a generic one) is served in the meantime.
+        """
+        stored = CourseContext.objects.filter(course=course, agent=agent).values("version", "content").first()
+        if stored is not None and stored["version"] == course_context_version(course, agent.id):
+            return stored["content"]
+
+        logger.info(f"Course context for course {course.id}, agent {agent.id} is out of date, scheduling a refresh")
+        schedule_course_context_refresh(course.id, agent.id)
+        if stored is not None:
+            return stored["content"]
+        return f"Interview agent for {course.name}. Focus on evaluating candidate knowledge and skills according to the exam requirements."
+
+    @staticmethod
+    def refresh_course_context(course_id: str, agent_id: str) -> bool:
+        """
+        Regenerate the stored course context for an agent unless it is already current.
+
+        Args:
+            course_id: ID of the course
+            agent_id: ID of the agent
+
+        Returns:
+            bool: True if a new context was stored
+        """
+        try:
+            course = Course.objects.get(id=course_id)
+            agent = Agent.objects.get(id=agent_id)
+        except ObjectDoesNotExist:
+            logger.warning(f"Course {course_id} or agent {agent_id} no longer exists, skipping context refresh")
+            return False
+
+        version = course_context_version(course, agent.id)
+        if CourseContext.objects.filter(course=course, agent=agent, version=version).exists():
+            return False
+
+        _, stored = AgentContextService._extract_course_context_for_agent(course, agent, version)
+        return stored
+
+    @staticmethod
+    def _extract_course_context_for_agent(course: Course, agent: Agent, version: Optional[str] = None) -> Tuple[str, bool]:
+        """Extract the course context with the LLM and store it if the course did not change meanwhile."""
+        version = version or course_context_version(course, agent.id)
+        dynamic_context = AgentContextService._get_dynamic_context_for_course(course, agent)
+
+        # A refresh queued by a later change may already be running; only the
+        # extraction of the latest state is kept
+        current_course = Course.objects.filter(id=course.id).first()
+        if not dynamic_context or not current_course or course_context_version(current_course, agent.id) != version:
+            return dynamic_context, False
+
+        CourseContext.objects.update_or_create(
+            course=course,
+            agent=agent,
+            defaults={"version": version, "content": dynamic_context}
+        )
+        logger.info(f"Stored course context for course {course.id}, agent {agent.id}")
+        return dynamic_context, True
+
+    @staticmethod
+    def _get_dynamic_context_for_course(course: Course, agent: Optional[Agent] = None) -> str:
         """Get dynamic context for interview agents from course documents."""
         logger.info(f"Getting interview context for course: {course.name}")
         
@@ -110,7 +232,7 @@ class AgentContextService:
             - Common mistakes to avoid during the interview
             """
             
-            dynamic_context = AgentContextService._query_course_documents(course, exam_query)
+            dynamic_context = AgentContextService._query_course_documents(course, exam_query, agent)
             logger.info(f"Retrieved {len(dynamic_context)} characters of course context")
             return dynamic_context
             
@@ -119,31 +241,39 @@ class AgentContextService:
             return f"Interview agent for {course.name}. Focus on evaluating candidate knowledge and skills according to the exam requirements."
     
     @staticmethod
-    def _query_course_documents(course: Course, query: str) -> str:
+    def _query_course_documents(course: Course, query: str, agent: Optional[Agent] = None) -> str:
         """Query course documents for relevant information."""
         try:
-            # Get all memories for the course
-            memories = Memory.objects.filter(course=course)
+            # Get the active memories of the course visible to the agent
+            memories = course_memories(course.id, agent.id if agent else None)
             logger.info(f"Found {memories.count()} memories for course")
             
             if not memories.exists():
                 logger.warning("No memories found for course")
                 return ""
             
-            # Get documents from all memories
-            documents = Document.objects.filter(
-                memory__in=memories
-            ).order_by('-created_at')[:50]  # Limit to recent documents
+            # Get the chunks most similar to the query from all memories
+            documents = course_documents(course.id, agent.id if agent else None)
+            candidates = AgentContextService._query_candidates(documents, query)
             
-            logger.info(f"Found {documents.count()} documents across all memories")
+            logger.info(f"Found {len(candidates)} candidate documents across all memories")
             
-            if not documents.exists():
+            if not candidates:
                 logger.warning("No documents found in memories")
                 return ""
             
-            # Extract content from documents
-            all_content = "\n".join([doc.content for doc in documents])
-            logger.info(f"Total content length: {len(all_content)} characters")
+            # Fill the prompt's token budget with the most relevant chunks
+            packed = pack_chunks(
+                [row["content"] for row in candidates],
+                [row["similarity"] for row in candidates],
+                settings.CONTEXT_PACK_TOKEN_BUDGET
+            )
+            stats = packed.stats
+            logger.info(
+                f"Packed {stats.packed}/{stats.candidates} chunks ({stats.packed_tokens}/{stats.budget} tokens), "
+                f"dropped {stats.dropped} ({stats.dropped_tokens} tokens)"
+            )
+            all_content = packed.text
             
             # Use AI to extract relevant information based on the query
             logger.info("Analyzing document content with AI...")
@@ -157,6 +287,31 @@ class AgentContextService:
             logger.exception("Full traceback:")
             return ""
     
+    @staticmethod
+    def _query_candidates(documents, query: str) -> List[dict]:
+        """
+        Up to CONTEXT_PACK_CANDIDATES chunks most similar to the query, with their
+        `similarity`, near-duplicates removed (see `diversify_rows`) so they
+        don't fill the packing budget with the same passage.
+        """
+        try:
+            query_embedding = embed_query(query, task_type="RETRIEVAL_QUERY")
+            embedding_field = diversity_field()
+            rows = search_documents(
+                documents, query_embedding, k=settings.CONTEXT_PACK_CANDIDATES, fields=("content", embedding_field)
+            )
+            return diversify_rows(rows, len(rows), "similarity", embedding_field)
+        except Exception as e:
+            # Without a query embedding, fall back to the most recent chunks
+            logger.warning(f"Vector search of course documents failed, using recent documents: {e}")
+            contents = documents.order_by('-created_at').values_list('content', flat=True)
+            rows = [
+                {"content": content, "similarity": 0.0}
+                for content in contents[:settings.CONTEXT_PACK_CANDIDATES]
+            ]
+            # Text duplicates only, without embeddings
+            return diversify_rows(rows, len(rows), "similarity")
+
     @staticmethod
     def _analyze_documents_for_query(content: str, course_name: str, query: str) -> str:
         """Use AI to analyze document content and extract information relevant to the query."""
@@ -167,7 +322,7 @@ class AgentContextService:
             Query: {query}
 
             Course Documents:
-            {content[:8000]}  # Limit content length
+            {content}
 
             Please provide a comprehensive but concise summary of the relevant information that would help an interview agent conduct effective interviews. 
             Focus on actionable information including:
@@ -180,7 +335,7 @@ class AgentContextService:
             If no relevant information is found, return "No specific information available."
             """
             
-            response = gemini_client.models.generate_content(
+            response = generate_content(
                 model="gemini-2.5-flash-lite",
                 contents=[prompt]
             )
@@ -302,183 +457,135 @@ class AgentContextService:
         return full_context.strip()
     
     @staticmethod
-    def _extract_course_context(course: Course) -> dict:
-        """Extract relevant course information from uploaded documents."""
-        logger.info(f"Extracting context for course: {course.name}")
-        
-        context_data = {
-            "syllabus_details": "",
-            "evaluation_criteria": "",
-            "sample_questions": "",
-            "key_concepts": "",
-            "preparation_tips": "",
-            "current_affairs": ""
-        }
-        
-        try:
-            # Get all memories for the course
-            memories = Memory.objects.filter(course=course)
-            logger.info(f"Found {memories.count()} memories for course")
-            
-            if not memories.exists():
-                logger.warning("No memories found for course")
-                return context_data
-            
-            # Get documents from all memories
-            documents = Document.objects.filter(
-                memory__in=memories
-            ).order_by('-created_at')[:50]  # Limit to recent documents
-            
-            logger.info(f"Found {documents.count()} documents across all memories")
-            
-            if not documents.exists():
-                logger.warning("No documents found in memories")
-                return context_data
-            
-            # Extract content from documents
-            all_content = "\n".join([doc.content for doc in documents])
-            logger.info(f"Total content length: {len(all_content)} characters")
-            
-            # Use AI to extract structured information
-            logger.info("Analyzing document content with AI...")
-            context_data = AgentContextService._analyze_course_content(all_content, course.name)
-            
-            logger.info("Document analysis completed")
-            for key, value in context_data.items():
-                logger.info(f"{key}: {len(value)} characters")
-            
-        except Exception as e:
-            logger.error(f"Error extracting course context: {e}")
-            logger.exception("Full traceback:")
-        
-        return context_data
-    
-    @staticmethod
-    def _analyze_course_content(content: str, course_name: str) -> dict:
-        """Use AI to analyze course content and extract structured information for interviews."""
-        try:
-            prompt = f"""
-            Analyze the following course documents for {course_name} and extract key information for an AI interview agent. 
-            Organize the information into these categories:
-
-            1. SYLLABUS_DETAILS: Detailed syllabus, topics, and subtopics to cover
-            2. EVALUATION_CRITERIA: How to assess and score candidates
-            3. SAMPLE_QUESTIONS: Example interview questions and expected answers
-            4. KEY_CONCEPTS: Important concepts, theories, and principles
-            5. PREPARATION_TIPS: Guidance for candidates and interview best practices
-            6. CURRENT_AFFAIRS: Relevant current events and updates
-
-            Content to analyze:
-            {content[:8000]}  # Limit content length
-
-            Provide a structured response in the following format:
-            SYLLABUS_DETAILS: [extracted info]
-            EVALUATION_CRITERIA: [extracted info]
-            SAMPLE_QUESTIONS: [extracted info] 
-            KEY_CONCEPTS: [extracted info]
-            PREPARATION_TIPS: [extracted info]
-            CURRENT_AFFAIRS: [extracted info]
-            """
-            
-            response = gemini_client.models.generate_content(
-                model="gemini-2.5-flash-lite",
-                contents=[prompt]
-            )
-            
-            # Parse the response
-            response_text = response.text
-            context_data = AgentContextService._parse_ai_response(response_text)
-            
-            return context_data
-            
-        except Exception as e:
-            logger.error(f"Error analyzing course content with AI: {e}")
-            return {
-                "syllabus_details": f"Course: {course_name} - Standard curriculum",
-                "evaluation_criteria": "Standard assessment criteria",
-                "sample_questions": "",
-                "key_concepts": "",
-                "preparation_tips": "",
-                "current_affairs": ""
-            }
-    
-    @staticmethod
-    def _parse_ai_response(response_text: str) -> dict:
-        """Parse AI response into structured data for course context."""
-        context_data = {
-            "syllabus_details": "",
-            "evaluation_criteria": "",
-            "sample_questions": "",
-            "key_concepts": "",
-            "preparation_tips": "",
-            "current_affairs": ""
-        }
-        
+    async def get_relevant_context_for_query(
+        course_id: str,
+        query: str,
+        k: Optional[int] = None,
+        timeout_ms: Optional[int] = None,
+        agent_id: Optional[str] = None,
+    ) -> List[dict]:
+        """
+        Get the course document chunks most relevant to a query.
+
+        Only active memories shared by the course or belonging to `agent_id`
+        are searched.
+
+        Runs a hybrid (full-text + pgvector) search over the course's documents,
+        or, with COURSE_INDEX_ENABLED, a vector search on this worker's
+        in-process course index. The embedding call and the search run on a
+        dedicated lookup thread pool, not the shared sync_to_async thread, so
+        neither the call's event loop nor its other database work waits on
+        them. The whole lookup is bounded by `timeout_ms`: on timeout (or any
+        error) no chunks are returned rather than stalling the conversation.
+        The embedding request itself is not retried and times out within the
+        same budget, and the search has a statement timeout, so an abandoned
+        lookup doesn't hold its thread for long either.
+
+        Args:
+            course_id: ID of the course
+            query: Text to find course material for
+            k: Number of chunks (defaults to RETRIEVAL_TOP_K)
+            timeout_ms: Latency budget in milliseconds (defaults to RETRIEVAL_TIMEOUT_MS)
+            agent_id: ID of the agent whose memories are included
+
+        Returns:
+            List[dict]: Chunks with `content`, `score` (hybrid rank fusion, or
+                the similarity for the in-process index), `similarity`,
+                `memory_name` and `page_number`, most relevant first
+        """
+        k = k or settings.RETRIEVAL_TOP_K
+        timeout_ms = timeout_ms or settings.RETRIEVAL_TIMEOUT_MS
+        started = time.perf_counter()
+
         try:
-            sections = response_text.split('\n')
-            current_section = None
-            
-            for line in sections:
-                line = line.strip()
-                if line.startswith('SYLLABUS_DETAILS:'):
-                    current_section = 'syllabus_details'
-                    context_data[current_section] = line.replace('SYLLABUS_DETAILS:', '').strip()
-                elif line.startswith('EVALUATION_CRITERIA:'):
-                    current_section = 'evaluation_criteria'
-                    context_data[current_section] = line.replace('EVALUATION_CRITERIA:', '').strip()
-                elif line.startswith('SAMPLE_QUESTIONS:'):
-                    current_section = 'sample_questions'
-                    context_data[current_section] = line.replace('SAMPLE_QUESTIONS:', '').strip()
-                elif line.startswith('KEY_CONCEPTS:'):
-                    current_section = 'key_concepts'
-                    context_data[current_section] = line.replace('KEY_CONCEPTS:', '').strip()
-                elif line.startswith('PREPARATION_TIPS:'):
-                    current_section = 'preparation_tips'
-                    context_data[current_section] = line.replace('PREPARATION_TIPS:', '').strip()
-                elif line.startswith('CURRENT_AFFAIRS:'):
-                    current_section = 'current_affairs'
-                    context_data[current_section] = line.replace('CURRENT_AFFAIRS:', '').strip()
-                elif current_section and line:
-                    context_data[current_section] += f" {line}"
-        
+            chunks = await AgentContextService.search_course_chunks(course_id, query, k, timeout_ms, agent_id)
+        except asyncio.TimeoutError:
+            logger.warning(f"Course context lookup exceeded {timeout_ms}ms for course {course_id}")
+            return []
         except Exception as e:
-            logger.error(f"Error parsing AI response: {e}")
-        
-        return context_data
-    
+            logger.error(f"Error getting relevant context: {e}")
+            return []
+
+        logger.info(
+            f"Retrieved {len(chunks)} chunks for course {course_id} "
+            f"in {(time.perf_counter() - started) * 1000:.0f}ms"
+        )
+        return chunks
+
     @staticmethod
-    @sync_to_async
-    def get_relevant_context_for_query(course_id: str, query: str) -> str:
+    async def search_course_chunks(
+        course_id: str,
+        query: str,
+        k: int,
+        timeout_ms: int,
+        agent_id: Optional[str] = None,
+    ) -> List[dict]:
         """
-        Get relevant context from course documents based on a specific query.
-        This can be used during interviews for real-time information retrieval.
+        The lookup behind `get_relevant_context_for_query`, run on the lookup
+        thread pool, without its fallbacks: a lookup exceeding `timeout_ms`
+        raises asyncio.TimeoutError and other errors propagate.
         """
+        search = sync_to_async(
+            AgentContextService._search_course_chunks,
+            thread_sensitive=False,
+            executor=_get_lookup_pool()
+        )
+        return await asyncio.wait_for(
+            search(course_id, query, k, timeout_ms, agent_id),
+            timeout=timeout_ms / 1000
+        )
+
+    @staticmethod
+    def _search_course_chunks(course_id: str, query: str, k: int, timeout_ms: int, agent_id: Optional[str] = None) -> List[dict]:
+        # Lookup threads live outside Django's request cycle, so they don't
+        # keep a connection open between lookups
+        close_old_connections()
         try:
-            # Create embedding for the query
-            query_embedding = gemini_client.models.embed_content(
-                model="gemini-embedding-exp-03-07",
-                contents=[query]
-            ).embeddings[0]
-            
-            # Get course documents
-            course = Course.objects.get(id=course_id)
-            memories = Memory.objects.filter(course=course)
-            documents = Document.objects.filter(memory__in=memories)
-            
-            if not documents.exists():
-                return "No relevant information found in course documents."
-            
-            # Find most similar documents (simplified version)
-            # In production, you might want to use pgvector's similarity operators
-            relevant_docs = documents[:5]  # Get top 5 for now
-            
-            context = "\n".join([doc.content for doc in relevant_docs])
-            return context[:2000]  # Limit context length
-            
-        except Exception as e:
-            logger.error(f"Error getting relevant context: {e}")
-            return "Unable to retrieve relevant information at this time."
-    
+            return AgentContextService._search_course_chunks_in_thread(course_id, query, k, timeout_ms, agent_id)
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _search_course_chunks_in_thread(course_id: str, query: str, k: int, timeout_ms: int, agent_id: Optional[str] = None) -> List[dict]:
+        # No retries: a retried embedding could not finish within the budget anyway
+        query_embedding = embed_query(query, task_type="RETRIEVAL_QUERY", max_retries=0, timeout_ms=timeout_ms)
+        if settings.COURSE_INDEX_ENABLED:
+            rows = search_course_index(course_id, query_embedding, k=k, agent_id=agent_id)
+            return [
+                {
+                    "content": row["content"],
+                    "score": round(row["similarity"], 4),
+                    "similarity": round(row["similarity"], 4),
+                    "memory_name": row["memory__name"],
+                    "page_number": row["page_number"],
+                }
+                for row in rows
+            ]
+
+        language = Course.objects.filter(id=course_id).values_list("language", flat=True).first()
+        rows = search_course(
+            course_id,
+            query,
+            query_embedding,
+            language=language,
+            k=k,
+            fields=("content", "memory__name", "page_number"),
+            agent_id=agent_id,
+            # The database gives up on its own so a slow query doesn't hold
+            # the connection after the caller has timed out
+            timeout_ms=timeout_ms
+        )
+        return [
+            {
+                "content": row["content"],
+                "score": round(row["score"], 4),
+                "similarity": round(row["similarity"], 4) if row["similarity"] is not None else None,
+                "memory_name": row["memory__name"],
+                "page_number": row["page_number"],
+            }
+            for row in rows
+        ]
+
     @staticmethod
     @sync_to_async
     def validate_agent_course_relationship(course_id: str, agent_id: str) -> bool:
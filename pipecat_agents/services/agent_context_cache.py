@@ -0,0 +1,105 @@
+import asyncio
+import logging
+import time
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from pipecat_agents.services.agent_context import AgentContextService
+from pipecat_agents.services.call_bootstrap import CallBootstrap
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "agent-context"
+# Seconds between checks while another worker builds the entry
+WAIT_INTERVAL = 0.05
+
+async def get_cached_agent_context(bootstrap: CallBootstrap) -> str:
+    """
+    Agent system instruction from Redis, built at most once per content version.
+
+    Entries are keyed by course, agent and the course's agent context version
+    (see niva_app.services.course_context), so any change to the course, its
+    memories or agents makes them unreachable. On a miss, the worker that takes
+    the build lock builds the entry; the others return the previous version
+    if there is one, or wait up to AGENT_CONTEXT_LOCK_WAIT seconds for the
+    builder before building it themselves. Redis errors fall back to building
+    without the cache.
+
+    Args:
+        bootstrap: Agent, course and context version loaded at call start
+
+    Returns:
+        str: System instruction/context for the interview agent
+    """
+    agent, course = bootstrap.agent, bootstrap.course
+    course_id, agent_id = course.id, agent.id
+
+    if bootstrap.context_version is None:
+        return await AgentContextService.build_agent_context(agent, course)
+
+    try:
+        key = f"{KEY_PREFIX}:{course_id}:{agent_id}:{bootstrap.context_version}"
+        context = await cache.aget(key)
+    except Exception as e:
+        logger.warning(f"Agent context cache unavailable: {e}")
+        return await AgentContextService.build_agent_context(agent, course)
+
+    if context is not None:
+        logger.info(f"Agent context cache hit for agent {agent_id}, course {course_id}")
+        return context
+
+    latest_key = f"{KEY_PREFIX}-latest:{course_id}:{agent_id}"
+    lock_key = f"{key}:lock"
+
+    try:
+        owns_lock, context = await _acquire_or_wait(key, latest_key, lock_key, agent_id)
+    except Exception as e:
+        logger.warning(f"Agent context cache unavailable: {e}")
+        owns_lock, context = False, None
+    if context is not None:
+        return context
+
+    try:
+        context = await AgentContextService.build_agent_context(agent, course)
+        try:
+            await cache.aset_many(
+                {key: context, latest_key: context},
+                timeout=settings.AGENT_CONTEXT_CACHE_TTL
+            )
+        except Exception as e:
+            logger.warning(f"Failed to cache agent context: {e}")
+        return context
+    finally:
+        if owns_lock:
+            try:
+                await cache.adelete(lock_key)
+            except Exception as e:
+                # The lock expires after AGENT_CONTEXT_LOCK_TIMEOUT anyway
+                logger.warning(f"Failed to release agent context build lock: {e}")
+
+async def _acquire_or_wait(key: str, latest_key: str, lock_key: str, agent_id) -> Tuple[bool, Optional[str]]:
+    """
+    Take the build lock, or get a context built by the worker holding it.
+
+    Returns:
+        Tuple[bool, Optional[str]]: Whether this worker owns the lock, and the
+            context to use if no build is needed here
+    """
+    if await cache.aadd(lock_key, 1, timeout=settings.AGENT_CONTEXT_LOCK_TIMEOUT):
+        return True, None
+
+    stale = await cache.aget(latest_key)
+    if stale is not None:
+        logger.info(f"Agent context being rebuilt elsewhere, using previous version for agent {agent_id}")
+        return False, stale
+
+    deadline = time.monotonic() + settings.AGENT_CONTEXT_LOCK_WAIT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(WAIT_INTERVAL)
+        context = await cache.aget(key)
+        if context is not None:
+            return False, context
+    logger.warning(f"Timed out waiting for agent context of agent {agent_id}, building it here")
+    return False, None
@@ -1,10 +1,14 @@
 import logging
 import os
+from typing import Optional
 from pipecat_agents.services.agent_context import AgentContextService
+from pipecat_agents.services.agent_context_cache import get_cached_agent_context
+from pipecat_agents.services.call_bootstrap import CallBootstrap, load_call_bootstrap
 
 from pipecat_agents.services.inbound_flow_service import (
     interview_progress_tracked,
-    interview_completed
+    interview_completed,
+    lookup_course_material
 )
 from pipecat.services.deepgram.stt import DeepgramSTTService
 from deepgram import LiveOptions
@@ -28,6 +32,12 @@ CONVERSATION TRACKING:
   - Note the quality of responses and any observations
   - Don't use this for every single exchange - only when there's something worth noting
 
+COURSE MATERIAL:
+• lookup_course_material(query):
+  - Use when the student brings up a topic, term or question your instructions don't cover
+  - Returns short excerpts from the course material; base follow-up questions on them
+  - Never read the excerpts out verbatim
+
 INTERVIEW COMPLETION:
 • interview_completed(overall_assessment, key_observations, interview_summary):
   - Use when you feel the conversation has reached a natural conclusion
@@ -53,16 +63,18 @@ def inbound_handlers_register(llm):
     # Only register the simplified handlers
     llm.register_function("interview_progress_tracked", interview_progress_tracked)
     llm.register_function("interview_completed", interview_completed)
+    llm.register_function("lookup_course_material", lookup_course_material)
     
     logger.info("Natural interview function handlers registered successfully")
 
-async def get_inbound_agent_context(course_id: str, agent_id: str) -> str:
+async def get_inbound_agent_context(course_id: str, agent_id: str, bootstrap: Optional[CallBootstrap] = None) -> str:
     """
     Returns the dynamic context for interview agents with natural conversation approach.
     
     Args:
         course_id: ID of the course
         agent_id: ID of the agent
+        bootstrap: Call data loaded at call start, loaded here if not given
         
     Returns:
         str: System instruction/context for the natural interview agent
@@ -70,18 +82,13 @@ async def get_inbound_agent_context(course_id: str, agent_id: str) -> str:
     logger.info(f"Getting natural interview agent context for agent_id: {agent_id}, course_id: {course_id}")
     
     try:
-        # Validate the relationship first
-        logger.info("Validating agent-course relationship...")
-        is_valid = await AgentContextService.validate_agent_course_relationship(course_id, agent_id)
-        if not is_valid:
-            logger.error(f"Invalid agent-course relationship: agent {agent_id}, course {course_id}")
-            raise ValueError("Invalid agent-course relationship")
-        
-        logger.info("Agent-course relationship validated successfully")
+        # Loading the bootstrap validates that the agent and course exist and are active
+        if bootstrap is None:
+            bootstrap = await load_call_bootstrap(course_id, agent_id)
         
-        # Get dynamic context for natural interview
+        # Get dynamic context for natural interview (shared by concurrent calls)
         logger.info("Fetching dynamic interview context...")
-        context = await AgentContextService.get_agent_context(course_id, agent_id)
+        context = await get_cached_agent_context(bootstrap)
         
         # Add natural conversation guidelines
         tools_description = get_inbound_tools_description()
@@ -183,13 +190,15 @@ def get_language_config(agent_language: str):
     
     return language_map.get(agent_language, language_map['en'])
 
-async def configure_language_services(agent_id: str):
+async def configure_language_services(agent_id: str, agent_language: Optional[str] = None):
     """
     Configure Deepgram STT and Deepgram TTS services based on agent's language
+    (looked up when not already known from the call bootstrap)
     """
     try:
         # Get agent's language
-        agent_language = await AgentContextService.get_default_lang(agent_id)
+        if agent_language is None:
+            agent_language = await AgentContextService.get_default_lang(agent_id)
         lang_config = get_language_config(agent_language)
         
         logger.info(f"Configuring services for language: {agent_language}")
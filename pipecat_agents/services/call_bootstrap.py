@@ -0,0 +1,92 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+from asgiref.sync import sync_to_async
+
+from niva_app.models.agents import Agent
+from niva_app.models.course import Course
+from niva_app.services.course_context import get_agent_context_version
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class CallBootstrap:
+    """Everything a call needs about its agent and course, loaded once at call start."""
+    agent: Agent
+    course: Course
+    # False when the agent is not linked to the course (allowed, but logged)
+    is_associated: bool
+    # Agent context version of the course (see niva_app.services.course_context),
+    # None when the cache is unavailable
+    context_version: Optional[str]
+
+    @property
+    def agent_name(self) -> str:
+        return self.agent.name
+
+    @property
+    def language(self) -> str:
+        return self.agent.language
+
+@sync_to_async
+def _load_agent_and_course(course_id: str, agent_id: str):
+    # Agent and course joined through the agent-course link: one round trip
+    # for the usual case of an agent serving its own course
+    link = (
+        Agent.courses.through.objects
+        .select_related("agent", "course")
+        .filter(agent_id=agent_id, course_id=course_id, agent__is_active=True, course__is_active=True)
+        .first()
+    )
+    if link:
+        return link.agent, link.course, True
+
+    try:
+        agent = Agent.objects.get(id=agent_id, is_active=True)
+        course = Course.objects.get(id=course_id, is_active=True)
+    except (Agent.DoesNotExist, Course.DoesNotExist):
+        logger.error(f"Agent {agent_id} or course {course_id} not found or not active")
+        raise ValueError("Agent or course not found or not active")
+
+    logger.warning(f"Agent {agent.name} is not directly associated with course {course.name}")
+    return agent, course, False
+
+async def _load_context_version(course_id: str) -> Optional[str]:
+    try:
+        return await get_agent_context_version(course_id)
+    except Exception as e:
+        logger.warning(f"Agent context version unavailable: {e}")
+        return None
+
+async def load_call_bootstrap(course_id: str, agent_id: str) -> CallBootstrap:
+    """
+    Load the agent, course, language and agent context version for a call.
+
+    The database lookup and the Redis version read run concurrently. The result
+    is shared by the agent service, the runner, context building and language
+    configuration for the rest of the call instead of each looking the rows up
+    again.
+
+    Args:
+        course_id: ID of the course
+        agent_id: ID of the agent
+
+    Returns:
+        CallBootstrap: Loaded call data
+
+    Raises:
+        ValueError: If the agent or course is not found or not active
+    """
+    (agent, course, is_associated), context_version = await asyncio.gather(
+        _load_agent_and_course(course_id, agent_id),
+        _load_context_version(course_id),
+    )
+    logger.info(f"Loaded call bootstrap: agent {agent.name} ({agent.language}), course {course.name}")
+    return CallBootstrap(
+        agent=agent,
+        course=course,
+        is_associated=is_associated,
+        context_version=context_version,
+    )
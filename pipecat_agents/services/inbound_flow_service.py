@@ -6,10 +6,14 @@ import os
 import time
 from datetime import datetime
 
+from django.conf import settings
 from pipecat_flows import (
     FlowArgs, FlowManager, FlowResult, NodeConfig, FlowsFunctionSchema
 )
 
+from niva_app.lib.tokens import count_tokens, iter_tokens
+from pipecat_agents.services.agent_context import AgentContextService
+
 logger = logging.getLogger(__name__)
 
 # Simplified result models
@@ -114,6 +118,84 @@ async def interview_completed(
     logger.info(f"✅ Interview completed with assessment: {overall_assessment}")
     return result, next_node
 
+def _trim_to_token_budget(chunks: list, budget: int) -> list:
+    """Keep the best chunks that fit in `budget` tokens, cutting the last one short."""
+    trimmed = []
+    remaining = budget
+    for chunk in chunks:
+        if remaining <= 0:
+            break
+        content = chunk["content"]
+        tokens = count_tokens(content)
+        if tokens > remaining:
+            cut = None
+            for index, token in enumerate(iter_tokens(content)):
+                if index == remaining:
+                    break
+                cut = token.end()
+            content = content[:cut] if cut else ""
+            tokens = remaining
+        if content:
+            trimmed.append({**chunk, "content": content})
+        remaining -= tokens
+    return trimmed
+
+async def lookup_course_material(
+    args: FlowArgs,
+    flow_manager: FlowManager
+) -> Tuple[FlowResult, Optional[NodeConfig]]:
+    """Look up course material relevant to what the student brought up."""
+    query = args.get("query", "").strip()
+    course_id = flow_manager.state.get("course_id")
+    if not query or not course_id:
+        return {"status": "error", "material": [], "message": "No course material available"}, None
+
+    started = time.perf_counter()
+    # Bounded by RETRIEVAL_TIMEOUT_MS and run off the event loop, so the audio
+    # pipeline keeps flowing while the lookup is in progress
+    chunks = await AgentContextService.get_relevant_context_for_query(
+        course_id, query, agent_id=flow_manager.state.get("agent_id")
+    )
+    latency_ms = (time.perf_counter() - started) * 1000
+
+    material = _trim_to_token_budget(chunks, settings.LOOKUP_TOOL_TOKEN_BUDGET)
+
+    flow_manager.state.setdefault("course_lookups", []).append({
+        "timestamp": time.time(),
+        "query": query,
+        "latency_ms": round(latency_ms, 1),
+        "chunks": len(material),
+    })
+    logger.info(f"✅ Course material lookup returned {len(material)} chunks in {latency_ms:.0f}ms")
+
+    result = {
+        "status": "found" if material else "not_found",
+        "material": [
+            {"content": chunk["content"], "source": chunk["memory_name"], "page": chunk["page_number"]}
+            for chunk in material
+        ],
+    }
+    # Stay on the current node
+    return result, None
+
+def create_lookup_course_material_function() -> FlowsFunctionSchema:
+    """Function schema for looking up course material mid-conversation."""
+    return FlowsFunctionSchema(
+        name="lookup_course_material",
+        description=(
+            "Look up the course material on a topic, term or question the student brings up "
+            "that is not covered by your instructions"
+        ),
+        properties={
+            "query": {
+                "type": "string",
+                "description": "Topic, term or question to look up in the course material"
+            }
+        },
+        required=["query"],
+        handler=lookup_course_material,
+    )
+
 # Simplified node creation functions
 def create_natural_conversation_node() -> NodeConfig:
     """Create a natural conversation node that allows free-flowing dialogue."""
@@ -190,7 +272,8 @@ If you feel you've gathered enough information or the student seems ready to wra
                 },
                 required=["overall_assessment", "key_observations"],
                 handler=interview_completed,
-            )
+            ),
+            create_lookup_course_material_function()
         ],
     )
 
@@ -237,7 +320,8 @@ You must speak first and initiate the conversation with a warm greeting that ref
                 },
                 required=["topic_discussed"],
                 handler=interview_progress_tracked,
-            )
+            ),
+            create_lookup_course_material_function()
         ],
     )
 
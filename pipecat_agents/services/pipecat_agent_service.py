@@ -2,14 +2,13 @@ import asyncio
 import logging
 import subprocess
 import threading
-from typing import Dict, Optional, Tuple
+from typing import Dict, Optional
 from dataclasses import dataclass
 import json
 
 from pipecat.transports.services.daily import DailyTransport
 from pipecat.pipeline.pipeline import Pipeline
 from pipecat.pipeline.task import PipelineTask
-from asgiref.sync import sync_to_async
 
 logger = logging.getLogger(__name__)
 
@@ -167,8 +166,9 @@ class PipecatAgentService:
             
             session_id = f"session_{daily_call_id}"
             
-            # Determine agent type
-            agent_name = await self._get_agent_name(course_id, agent_id)
+            # Agent, course and language are loaded once and handed to the runner
+            bootstrap = await self._load_bootstrap(course_id, agent_id)
+            agent_name = bootstrap.agent_name if bootstrap else "Unknown Agent"
             
             logger.info(f"Starting bot process for session: {session_id}")
             
@@ -206,6 +206,7 @@ class PipecatAgentService:
                             agent_id=agent_id,
                             caller_number=phone_number,
                             student_id=student_id,
+                            bootstrap=bootstrap,
                         )
                     )
                 except Exception as e:
@@ -242,26 +243,17 @@ class PipecatAgentService:
             logger.error(f"Failed to start bot process for call {daily_call_id}: {e}")
             raise
     
-    async def _get_agent_name(self, course_id: str, agent_id: str) -> Tuple[str, str]:
+    async def _load_bootstrap(self, course_id: str, agent_id: str):
         """
-        Determine agent name.
+        Load the call bootstrap (agent, course, language), or None if it cannot be loaded.
         """
-        @sync_to_async
-        def _get_agent_sync():
-            # Lazy import to avoid Django initialization issues
-            from niva_app.models.agents import Agent
-            try:
-                agent = Agent.objects.filter(id=agent_id, courses__id=course_id, is_active=True).first()
-                if agent:
-                    return agent.name
-                else:
-                    logger.warning(f"Agent with id {agent_id} not found for course {course_id}")
-                    return "Unknown Agent"
-            except Exception as e:
-                logger.error(f"Error determining agent type: {e}")
-                return "Unknown Agent"
-
-        return await _get_agent_sync()
+        # Lazy import to avoid Django initialization issues
+        from pipecat_agents.services.call_bootstrap import load_call_bootstrap
+        try:
+            return await load_call_bootstrap(course_id, agent_id)
+        except Exception as e:
+            logger.warning(f"Could not load agent {agent_id} for course {course_id}: {e}")
+            return None
     
     def get_active_processes(self) -> Dict[str, dict]:
         """